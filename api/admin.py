@@ -18,6 +18,10 @@ from .models import (
     ProductoSalidaRuta,
     AjusteInventario,
     DevolucionSalidaRuta,
+    FolioSecuencia,
+    ReservaFolios,
+    VentaResumenDiario,
+    MovimientoInventario,
 )
 
 
@@ -225,6 +229,47 @@ class ProductoVentaAdmin(admin.ModelAdmin):
         return obj.VENTA.CIUDAD_REGISTRO
 
 
+class FolioSecuenciaAdmin(admin.ModelAdmin):
+    list_display = ("TIPO", "ULTIMO_FOLIO", "CIUDAD_REGISTRO")
+
+    list_filter = ("TIPO", "CIUDAD_REGISTRO")
+
+
+class ReservaFoliosAdmin(admin.ModelAdmin):
+    list_display = ("TIPO", "PRIMER_FOLIO", "ULTIMO_FOLIO", "USUARIO", "FECHA", "CIUDAD_REGISTRO")
+
+    list_filter = ("TIPO", "CIUDAD_REGISTRO")
+
+
+class VentaResumenDiarioAdmin(admin.ModelAdmin):
+    list_display = (
+        "FECHA",
+        "TIPO_VENTA",
+        "TIPO_PAGO",
+        "STATUS",
+        "VENDEDOR",
+        "MONTO",
+        "NUMERO_VENTAS",
+        "CIUDAD_REGISTRO",
+    )
+
+    list_filter = ("TIPO_VENTA", "STATUS", "CIUDAD_REGISTRO")
+
+
+class MovimientoInventarioAdmin(admin.ModelAdmin):
+    list_display = (
+        "PRODUCTO_NOMBRE",
+        "TIPO",
+        "CANTIDAD",
+        "CANTIDAD_RESULTANTE",
+        "REFERENCIA",
+        "FECHA",
+        "CIUDAD_REGISTRO",
+    )
+
+    list_filter = ("TIPO", "CIUDAD_REGISTRO")
+
+
 admin.site.register(Producto, ProductoAdmin)
 admin.site.register(Cliente, ClienteAdmin)
 admin.site.register(PrecioCliente, PrecioClienteAdmin)
@@ -233,6 +278,10 @@ admin.site.register(ProductoVenta, ProductoVentaAdmin)
 admin.site.register(Direccion, DireccionAdmin)
 admin.site.register(Empleado, EmpleadoAdmin)
 admin.site.register(AjusteInventario, AjusteInventarioAdmin)
+admin.site.register(FolioSecuencia, FolioSecuenciaAdmin)
+admin.site.register(ReservaFolios, ReservaFoliosAdmin)
+admin.site.register(VentaResumenDiario, VentaResumenDiarioAdmin)
+admin.site.register(MovimientoInventario, MovimientoInventarioAdmin)
 
 # Ruta
 
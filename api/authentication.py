@@ -0,0 +1,62 @@
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from django.utils.translation import gettext_lazy as _
+
+from api.models import Empleado
+from api.views.utilis.general import CIUDAD_REGISTRO_DEFAULT
+
+
+# Autenticacion JWT que resuelve la ciudad y el rol del empleado una sola vez por request.
+# Los tokens traen CIUDAD_REGISTRO y ROLE como claims (ver MyTokenObtainPairSerializer), pero no se confia en ellos:
+# el token dura hasta un dia (una semana renovandolo) y el empleado puede cambiar de ciudad o de rol mientras tanto.
+# Los valores salen del empleado que get_user ya trae con select_related, y si no coinciden con los claims el token se rechaza
+# para que el cliente inicie sesion de nuevo. Los tokens emitidos antes de los claims no traen ciudad_registro y solo usan el empleado.
+class EmpleadoJWTAuthentication(JWTAuthentication):
+    def authenticate(self, request):
+        resultado = super().authenticate(request)
+
+        if resultado is None:
+            return None
+
+        user, validated_token = resultado
+
+        try:
+            ciudad_registro = user.empleado.CIUDAD_REGISTRO
+            role = user.empleado.ROLE
+        except Empleado.DoesNotExist:
+            ciudad_registro = CIUDAD_REGISTRO_DEFAULT
+            role = None
+
+        if "ciudad_registro" in validated_token and (
+            validated_token.get("ciudad_registro") != ciudad_registro
+            or validated_token.get("role") != role
+        ):
+            raise AuthenticationFailed(
+                "La ciudad o el rol del empleado cambiaron, inicia sesion de nuevo",
+                code="token_desactualizado",
+            )
+
+        request.ciudad_registro = ciudad_registro
+        request.role = role
+
+        return user, validated_token
+
+    def get_user(self, validated_token):
+        # Igual que JWTAuthentication.get_user pero trae al empleado en el mismo query
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        try:
+            user = self.user_model.objects.select_related("empleado").get(
+                **{api_settings.USER_ID_FIELD: user_id}
+            )
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        return user
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+
+
+@register()
+def revisar_cache_etiquetas(app_configs, **kwargs):
+    # Sin Redis las vistas en cache y los ETag por etiquetas se desactivan y el indice de sugerencias expira (ver CACHE_ETIQUETAS en settings.py)
+    if settings.CACHE_ETIQUETAS:
+        return []
+
+    return [
+        Warning(
+            "La cache de catalogos y los ETag por etiquetas estan desactivados y el indice de sugerencias de clientes tarda "
+            "hasta 30 segundos en ver los cambios de otros procesos porque no hay una cache compartida entre procesos",
+            hint="Configura REDIS_URL, o CACHE_UN_PROCESO=1 si corre un solo proceso",
+            id="api.W001",
+        )
+    ]
@@ -0,0 +1,497 @@
+import random
+from datetime import date, datetime, time, timedelta
+
+import pytz
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from api.models import (
+    Cliente,
+    ClienteSalidaRuta,
+    Direccion,
+    Empleado,
+    FolioSecuencia,
+    MovimientoInventario,
+    PrecioCliente,
+    Producto,
+    ProductoSalidaRuta,
+    ProductoVenta,
+    Ruta,
+    RutaDia,
+    SalidaRuta,
+    Venta,
+)
+from api.views.utilis.busqueda import indexar
+from api.views.utilis.cache_ciudad import (
+    ETIQUETA_CLIENTES,
+    ETIQUETA_PRECIOS,
+    ETIQUETA_PRODUCTOS,
+    ETIQUETA_RUTAS,
+    invalidar_etiquetas,
+)
+from api.views.utilis.folios import formatear_folio
+from api.views.utilis.general import (
+    copiar_imagen_producto_default,
+    obtener_nombre_con_sufijo,
+)
+from api.views.utilis.resumen_ventas import reconstruir_resumen_ventas
+from api.views.utilis.salida_ruta import recalcular_contadores
+
+# Datos sinteticos para medir el rendimiento con volumenes de produccion (ver los comandos generar_datos_sinteticos y benchmark_endpoints)
+# Con la misma escala y semilla se generan exactamente los mismos datos, asi los resultados se pueden comparar entre commits
+# Todo se inserta con bulk_create, por lo que el indice de busqueda, el resumen de ventas, los contadores de las salidas ruta,
+# las secuencias de folios y las etiquetas de cache se actualizan aqui directamente
+
+# Por ciudad. ventas_dia y salidas_dia son promedios, cada dia varia +-30%
+ESCALAS = {
+    "pequena": {
+        "productos": 12,
+        "clientes": 200,
+        "rutas": 4,
+        "dias": 90,
+        "ventas_dia": 40,
+        "salidas_dia": 3,
+    },
+    "mediana": {
+        "productos": 25,
+        "clientes": 1500,
+        "rutas": 10,
+        "dias": 365,
+        "ventas_dia": 150,
+        "salidas_dia": 8,
+    },
+    "grande": {
+        "productos": 40,
+        "clientes": 5000,
+        "rutas": 20,
+        "dias": 3 * 365,
+        "ventas_dia": 400,
+        "salidas_dia": 15,
+    },
+}
+
+CIUDADES = ["LAZARO", "URUAPAN"]
+
+DIAS_SEMANA = ["LUNES", "MARTES", "MIERCOLES", "JUEVES", "VIERNES", "SABADO", "DOMINGO"]
+
+PRODUCTOS_BASE = [
+    ("HIELO ROLITO 5KG", 35),
+    ("HIELO ROLITO 10KG", 60),
+    ("HIELO ROLITO 15KG", 85),
+    ("HIELO EN BARRA", 120),
+    ("HIELO FRAPPE 5KG", 40),
+    ("HIELO CUBO 3KG", 25),
+    ("AGUA 20L", 30),
+    ("AGUA 1L", 12),
+    ("AGUA 600ML", 8),
+]
+
+NOMBRES = [
+    "ABARROTES", "TIENDA", "MISCELANEA", "CREMERIA", "PALETERIA", "NEVERIA",
+    "RESTAURANTE", "MARISCOS", "CARNICERIA", "FRUTERIA", "DEPOSITO", "BAR",
+]
+APELLIDOS = [
+    "LOPEZ", "GARCIA", "HERNANDEZ", "MARTINEZ", "PEREZ", "RAMIREZ", "SANCHEZ",
+    "TORRES", "FLORES", "RIVERA", "GOMEZ", "DIAZ", "CRUZ", "MORALES", "REYES",
+]
+COLONIAS = ["CENTRO", "LA MORA", "SAN JOSE", "EL VERGEL", "LAS AMERICAS", "INDEPENDENCIA"]
+
+LOTE = 2000
+
+mexico_tz = pytz.timezone("America/Mexico_City")
+
+
+def nombre_usuario(ciudad_registro, nombre):
+    return obtener_nombre_con_sufijo(ciudad_registro, f"sintetico_{nombre}")
+
+
+def _fecha_hora(generador, dia):
+    # Horario de la planta: de 7:00 a 19:00 hora de Mexico
+    segundos = generador.randrange(7 * 3600, 19 * 3600)
+    return mexico_tz.localize(datetime.combine(dia, time())) + timedelta(
+        seconds=segundos
+    )
+
+
+def _empleados(ciudad_registro, rutas):
+    # Un administrador para el benchmark y un repartidor por ruta. Sin contraseña utilizable y sin imagen
+    nombres = ["admin"] + [f"repartidor_{numero}" for numero in range(1, rutas + 1)]
+    usuarios = User.objects.bulk_create(
+        [
+            User(
+                username=nombre_usuario(ciudad_registro, nombre),
+                password=make_password(None),
+            )
+            for nombre in nombres
+        ]
+    )
+    empleados = Empleado.objects.bulk_create(
+        [
+            Empleado(
+                USUARIO=usuario,
+                ROLE="GERENTE" if indice == 0 else "REPARTIDOR",
+                CIUDAD_REGISTRO=ciudad_registro,
+            )
+            for indice, usuario in enumerate(usuarios)
+        ]
+    )
+    return empleados[1:]
+
+
+def _productos(generador, ciudad_registro, cantidad, inicio):
+    productos = []
+    for indice in range(cantidad):
+        nombre, precio = PRODUCTOS_BASE[indice % len(PRODUCTOS_BASE)]
+        if indice >= len(PRODUCTOS_BASE):
+            nombre = f"{nombre} {indice // len(PRODUCTOS_BASE) + 1}"
+        productos.append(
+            Producto(
+                NOMBRE=nombre,
+                # Suficiente para que el benchmark registre ventas y salidas ruta sin quedarse sin stock
+                CANTIDAD=float(generador.randrange(50000, 100000)),
+                PRECIO=float(precio),
+                IMAGEN=copiar_imagen_producto_default(),
+                CIUDAD_REGISTRO=ciudad_registro,
+            )
+        )
+    productos = Producto.objects.bulk_create(productos)
+
+    # El kardex empieza con una ALTA por producto para que el stock en cualquier fecha coincida con CANTIDAD
+    MovimientoInventario.objects.bulk_create(
+        [
+            MovimientoInventario(
+                PRODUCTO=producto,
+                PRODUCTO_NOMBRE=producto.NOMBRE,
+                CANTIDAD=producto.CANTIDAD,
+                CANTIDAD_RESULTANTE=producto.CANTIDAD,
+                TIPO="ALTA",
+                REFERENCIA="DATOS_SINTETICOS",
+                FECHA=mexico_tz.localize(datetime.combine(inicio, time())),
+                CIUDAD_REGISTRO=ciudad_registro,
+            )
+            for producto in productos
+        ]
+    )
+    return productos
+
+
+def _rutas(ciudad_registro, repartidores):
+    rutas = Ruta.objects.bulk_create(
+        [
+            Ruta(
+                NOMBRE=obtener_nombre_con_sufijo(ciudad_registro, f"RUTA {numero}"),
+                REPARTIDOR=repartidor,
+                REPARTIDOR_NOMBRE=repartidor.USUARIO.username.upper(),
+                CIUDAD_REGISTRO=ciudad_registro,
+            )
+            for numero, repartidor in enumerate(repartidores, start=1)
+        ]
+    )
+    # Igual que la señal create_rutadia: una ruta dia por cada dia de la semana
+    return RutaDia.objects.bulk_create(
+        [
+            RutaDia(
+                RUTA=ruta,
+                REPARTIDOR=ruta.REPARTIDOR,
+                REPARTIDOR_NOMBRE=ruta.REPARTIDOR_NOMBRE,
+                DIA=dia,
+            )
+            for ruta in rutas
+            for dia in DIAS_SEMANA
+        ]
+    )
+
+
+def _clientes(generador, ciudad_registro, cantidad, productos, rutas_dia):
+    # MOSTRADOR y RUTA son los clientes que usan las vistas de venta y salida ruta, siempre con el precio publico
+    nombres = ["MOSTRADOR", "RUTA"] + [
+        f"{generador.choice(NOMBRES)} {generador.choice(APELLIDOS)} {numero}"
+        for numero in range(1, cantidad + 1)
+    ]
+
+    direcciones = Direccion.objects.bulk_create(
+        [
+            Direccion(
+                CALLE=f"CALLE {generador.randrange(1, 200)}",
+                NUMERO=str(generador.randrange(1, 2000)),
+                COLONIA=generador.choice(COLONIAS),
+                CIUDAD=ciudad_registro,
+                MUNICIPIO=ciudad_registro,
+                CP=generador.randrange(58000, 61000),
+            )
+            for _ in nombres
+        ],
+        batch_size=LOTE,
+    )
+    clientes = Cliente.objects.bulk_create(
+        [
+            Cliente(
+                NOMBRE=nombre,
+                CONTACTO=f"{generador.choice(APELLIDOS)} {generador.choice(APELLIDOS)}",
+                DIRECCION=direccion,
+                TELEFONO=str(generador.randrange(4430000000, 4529999999)),
+                TIPO_PAGO="CREDITO"
+                if indice > 1 and generador.random() < 0.15
+                else "EFECTIVO",
+                CIUDAD_REGISTRO=ciudad_registro,
+            )
+            for indice, (nombre, direccion) in enumerate(zip(nombres, direcciones))
+        ],
+        batch_size=LOTE,
+    )
+    indexar(clientes, nuevas=True)
+
+    # Solo se guardan los precios distintos al publico: un tercio de los clientes tiene descuento en 1 a 3 productos
+    precios = []
+    for cliente in clientes[2:]:
+        if generador.random() < 0.33:
+            for producto in generador.sample(productos, min(len(productos), generador.randint(1, 3))):
+                descuento = generador.choice([0.05, 0.1, 0.15, 0.2])
+                precios.append(
+                    PrecioCliente(
+                        CLIENTE=cliente,
+                        PRODUCTO=producto,
+                        PRECIO=round(producto.PRECIO * (1 - descuento), 2),
+                        DESCUENTO=descuento,
+                    )
+                )
+    PrecioCliente.objects.bulk_create(precios, batch_size=LOTE)
+
+    # Cada cliente visitado en ruta queda en 1 o 2 dias de una misma ruta
+    rutas_por_ruta = {}
+    for ruta_dia in rutas_dia:
+        rutas_por_ruta.setdefault(ruta_dia.RUTA_id, []).append(ruta_dia)
+    Asignacion = Cliente.RUTAS.through
+    asignaciones = []
+    for cliente in clientes[2:]:
+        if rutas_por_ruta and generador.random() < 0.8:
+            dias = generador.choice(list(rutas_por_ruta.values()))
+            for ruta_dia in generador.sample(dias, generador.randint(1, 2)):
+                asignaciones.append(
+                    Asignacion(cliente_id=cliente.id, rutadia_id=ruta_dia.id)
+                )
+    Asignacion.objects.bulk_create(asignaciones, batch_size=LOTE)
+
+    return clientes
+
+
+def _ventas(generador, ciudad_registro, parametros, inicio, productos, clientes):
+    mostrador, ruta = clientes[0], clientes[1]
+    descuentos = {}
+    for cliente_id, producto_id, descuento in PrecioCliente.objects.filter(
+        CLIENTE__CIUDAD_REGISTRO=ciudad_registro
+    ).values_list("CLIENTE_id", "PRODUCTO_id", "DESCUENTO"):
+        descuentos[(cliente_id, producto_id)] = descuento
+
+    folios = {"MOSTRADOR": 0, "RUTA": 0}
+    ventas_pendientes = []
+
+    def guardar():
+        with transaction.atomic():
+            ventas = Venta.objects.bulk_create([venta for venta, _ in ventas_pendientes])
+            # Las ventas ya tienen id despues del bulk_create
+            productos = []
+            for venta, productos_venta in ventas_pendientes:
+                for producto_venta in productos_venta:
+                    producto_venta.VENTA = venta
+                    productos.append(producto_venta)
+            ProductoVenta.objects.bulk_create(productos)
+            indexar(ventas, nuevas=True)
+        ventas_pendientes.clear()
+
+    for numero_dia in range(parametros["dias"]):
+        dia = inicio + timedelta(days=numero_dia)
+        ventas_dia = round(parametros["ventas_dia"] * generador.uniform(0.7, 1.3))
+        for _ in range(ventas_dia):
+            tipo_venta = "MOSTRADOR" if generador.random() < 0.6 else "RUTA"
+            if tipo_venta == "MOSTRADOR":
+                cliente = mostrador if generador.random() < 0.7 else generador.choice(clientes[2:])
+            else:
+                cliente = ruta if generador.random() < 0.2 else generador.choice(clientes[2:])
+
+            status = generador.choices(
+                ["REALIZADO", "CANCELADO", "PENDIENTE"], weights=[92, 5, 3]
+            )[0]
+            if cliente.TIPO_PAGO == "CREDITO" and generador.random() < 0.5:
+                tipo_pago = "CREDITO"
+            else:
+                tipo_pago = "CORTESIA" if generador.random() < 0.01 else "CONTADO"
+
+            productos_venta = []
+            for producto in generador.sample(productos, min(len(productos), generador.randint(1, 3))):
+                descuento = descuentos.get((cliente.id, producto.id), 0.0)
+                productos_venta.append(
+                    ProductoVenta(
+                        PRODUCTO=producto,
+                        NOMBRE_PRODUCTO=producto.NOMBRE,
+                        CANTIDAD_VENTA=float(generador.randint(1, 20)),
+                        PRECIO_VENTA=round(producto.PRECIO * (1 - descuento), 2),
+                    )
+                )
+
+            folios[tipo_venta] += 1
+            monto = sum(
+                producto_venta.CANTIDAD_VENTA * producto_venta.PRECIO_VENTA
+                for producto_venta in productos_venta
+            )
+            fecha = _fecha_hora(generador, dia)
+            ventas_pendientes.append(
+                (
+                    Venta(
+                        VENDEDOR=f"VENDEDOR {generador.randint(1, 4)}",
+                        CLIENTE=cliente,
+                        NOMBRE_CLIENTE=cliente.NOMBRE,
+                        FECHA=fecha,
+                        MONTO=0 if status == "CANCELADO" else monto,
+                        TIPO_VENTA=tipo_venta,
+                        TIPO_PAGO=tipo_pago,
+                        STATUS=status,
+                        OBSERVACIONES="",
+                        DESCUENTO=0,
+                        CIUDAD_REGISTRO=ciudad_registro,
+                        FOLIO=formatear_folio(tipo_venta, folios[tipo_venta]),
+                        MODIFICADO=fecha,
+                    ),
+                    productos_venta,
+                )
+            )
+
+            if len(ventas_pendientes) >= LOTE:
+                guardar()
+
+    guardar()
+    return folios
+
+
+def _salidas_ruta(generador, ciudad_registro, parametros, inicio, productos, rutas_dia, ruta):
+    clientes_ruta_dia = {}
+    for cliente_id, rutadia_id, nombre in Cliente.RUTAS.through.objects.filter(
+        rutadia__in=rutas_dia
+    ).values_list("cliente_id", "rutadia_id", "cliente__NOMBRE"):
+        clientes_ruta_dia.setdefault(rutadia_id, []).append((cliente_id, nombre))
+
+    hoy = inicio + timedelta(days=parametros["dias"] - 1)
+    folio = 0
+    for numero_dia in range(parametros["dias"]):
+        dia = inicio + timedelta(days=numero_dia)
+        del_dia = [
+            ruta_dia for ruta_dia in rutas_dia if ruta_dia.DIA == DIAS_SEMANA[dia.weekday()]
+        ]
+        cantidad = min(
+            len(del_dia), round(parametros["salidas_dia"] * generador.uniform(0.7, 1.3))
+        )
+
+        salidas = []
+        detalles = []
+        for ruta_dia in generador.sample(del_dia, cantidad):
+            folio += 1
+            # Las salidas de dias anteriores ya terminaron, las del ultimo dia siguen en curso
+            en_curso = dia == hoy
+            fecha = _fecha_hora(generador, dia)
+            salidas.append(
+                SalidaRuta(
+                    ATIENDE=f"CAJERO {generador.randint(1, 3)}",
+                    RUTA=ruta_dia,
+                    RUTA_NOMBRE=ruta_dia.RUTA.NOMBRE,
+                    REPARTIDOR=ruta_dia.REPARTIDOR,
+                    REPARTIDOR_NOMBRE=ruta_dia.REPARTIDOR_NOMBRE,
+                    OBSERVACIONES="",
+                    STATUS=generador.choice(["PENDIENTE", "PROGRESO"]) if en_curso else "REALIZADO",
+                    CIUDAD_REGISTRO=ciudad_registro,
+                    FOLIO=folio,
+                    MODIFICADO=fecha,
+                )
+            )
+            detalles.append((fecha, ruta_dia, en_curso))
+
+        if not salidas:
+            continue
+
+        with transaction.atomic():
+            salidas = SalidaRuta.objects.bulk_create(salidas)
+
+            productos_salida = []
+            clientes_salida = []
+            for salida, (fecha, ruta_dia, en_curso) in zip(salidas, detalles):
+                # FECHA tiene auto_now, bulk_create la pone en el momento actual y se corrige abajo con bulk_update
+                salida.FECHA = fecha
+                for producto in generador.sample(productos, min(len(productos), generador.randint(3, 6))):
+                    cantidad_ruta = float(generador.randrange(20, 200, 10))
+                    vendido = not en_curso or generador.random() < 0.3
+                    productos_salida.append(
+                        ProductoSalidaRuta(
+                            SALIDA_RUTA=salida,
+                            PRODUCTO_RUTA=producto,
+                            PRODUCTO_NOMBRE=producto.NOMBRE,
+                            CANTIDAD_RUTA=cantidad_ruta,
+                            CANTIDAD_DISPONIBLE=0 if vendido else cantidad_ruta,
+                            STATUS="VENDIDO" if vendido else "CARGADO",
+                        )
+                    )
+                for cliente_id, nombre in clientes_ruta_dia.get(ruta_dia.id, []):
+                    visitado = not en_curso or generador.random() < 0.4
+                    clientes_salida.append(
+                        ClienteSalidaRuta(
+                            SALIDA_RUTA=salida,
+                            CLIENTE_RUTA_id=cliente_id,
+                            CLIENTE_NOMBRE=nombre,
+                            STATUS="VISITADO" if visitado else "PENDIENTE",
+                        )
+                    )
+                clientes_salida.append(
+                    ClienteSalidaRuta(
+                        SALIDA_RUTA=salida,
+                        CLIENTE_RUTA=ruta,
+                        CLIENTE_NOMBRE="RUTA",
+                        STATUS="VISITADO",
+                    )
+                )
+
+            SalidaRuta.objects.bulk_update(salidas, ["FECHA"])
+            ProductoSalidaRuta.objects.bulk_create(productos_salida, batch_size=LOTE)
+            ClienteSalidaRuta.objects.bulk_create(clientes_salida, batch_size=LOTE)
+            indexar(salidas, nuevas=True)
+
+    return folio
+
+
+def generar_ciudad(ciudad_registro, parametros, semilla, escribir=lambda mensaje: None):
+    # Misma semilla y ciudad, mismos datos. Cada ciudad tiene su propio generador, generar una sola ciudad da los mismos datos que generar las dos
+    generador = random.Random(f"{semilla}:{ciudad_registro}")
+    inicio = date.today() - timedelta(days=parametros["dias"] - 1)
+
+    with transaction.atomic():
+        repartidores = _empleados(ciudad_registro, parametros["rutas"])
+        productos = _productos(generador, ciudad_registro, parametros["productos"], inicio)
+        rutas_dia = _rutas(ciudad_registro, repartidores)
+        clientes = _clientes(
+            generador, ciudad_registro, parametros["clientes"], productos, rutas_dia
+        )
+    escribir(
+        f"{ciudad_registro}: {len(productos)} productos, {len(clientes)} clientes, {len(rutas_dia)} rutas dia"
+    )
+
+    folios = _ventas(generador, ciudad_registro, parametros, inicio, productos, clientes)
+    escribir(f"{ciudad_registro}: {folios['MOSTRADOR'] + folios['RUTA']} ventas")
+
+    folios["SALIDA_RUTA"] = _salidas_ruta(
+        generador, ciudad_registro, parametros, inicio, productos, rutas_dia, clientes[1]
+    )
+    escribir(f"{ciudad_registro}: {folios['SALIDA_RUTA']} salidas ruta")
+
+    with transaction.atomic():
+        # Las secuencias continuan despues de los folios generados
+        for tipo, ultimo in folios.items():
+            FolioSecuencia.objects.update_or_create(
+                CIUDAD_REGISTRO=ciudad_registro, TIPO=tipo, defaults={"ULTIMO_FOLIO": ultimo}
+            )
+        recalcular_contadores(SalidaRuta.objects.filter(CIUDAD_REGISTRO=ciudad_registro))
+        reconstruir_resumen_ventas(inicio, date.today(), ciudad_registro)
+        invalidar_etiquetas(
+            ciudad_registro,
+            ETIQUETA_PRODUCTOS,
+            ETIQUETA_RUTAS,
+            ETIQUETA_CLIENTES,
+            ETIQUETA_PRECIOS,
+        )
@@ -0,0 +1,248 @@
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils.timezone import now
+from rest_framework.test import APIClient
+
+from api.datos_sinteticos import CIUDADES, ESCALAS, generar_ciudad, nombre_usuario
+from api.metricas import PRESUPUESTOS_QUERIES
+from api.models import Cliente, Producto, SalidaRuta
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide p50, p95 y queries de los endpoints mas usados sobre datos sinteticos (ver generar_datos_sinteticos). "
+        "Corre sobre una base temporal con el motor configurado y escribe los resultados en JSON para compararlos entre commits"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--escala",
+            choices=list(ESCALAS),
+            default="pequena",
+            help="Volumen de datos por ciudad (por defecto pequena)",
+        )
+        parser.add_argument("--semilla", type=int, default=1, help="Semilla del generador")
+        parser.add_argument(
+            "--ciudad",
+            choices=CIUDADES,
+            default="URUAPAN",
+            help="Ciudad del usuario que hace las solicitudes (se generan las dos)",
+        )
+        parser.add_argument(
+            "--repeticiones", type=int, default=50, help="Solicitudes medidas por endpoint"
+        )
+        parser.add_argument(
+            "--calentamiento",
+            type=int,
+            default=5,
+            help="Solicitudes sin medir por endpoint antes de medir",
+        )
+        parser.add_argument("--salida", help="Archivo JSON (por defecto la salida estandar)")
+
+    def handle(self, *args, **options):
+        # Las imagenes por defecto de los productos se copian a una carpeta temporal y no a media/
+        carpeta = tempfile.mkdtemp()
+        shutil.copytree(
+            os.path.join(settings.MEDIA_ROOT, "imagenes", "default"),
+            os.path.join(carpeta, "media", "imagenes", "default"),
+        )
+
+        if connection.vendor == "sqlite":
+            # Base en archivo como en produccion, no en memoria
+            connection.settings_dict["TEST"]["NAME"] = os.path.join(
+                carpeta, "benchmark.sqlite3"
+            )
+        nombre_original = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+
+        try:
+            # Cache propia para no mezclar las metricas ni las versiones de las etiquetas con las de produccion
+            # Las solicitudes se hacen desde este proceso, por lo que la cache en memoria se puede usar para las etiquetas
+            with override_settings(
+                CACHE_ETIQUETAS=True,
+                MEDIA_ROOT=os.path.join(carpeta, "media"),
+                ALLOWED_HOSTS=["testserver"],
+                CACHES={
+                    "default": {
+                        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                        "LOCATION": "benchmark_endpoints",
+                    }
+                },
+            ):
+                resultado = self.medir(options)
+        finally:
+            connection.creation.destroy_test_db(nombre_original, verbosity=0)
+            connection.settings_dict["TEST"]["NAME"] = None
+            shutil.rmtree(carpeta, ignore_errors=True)
+
+        contenido = json.dumps(resultado, indent=2, ensure_ascii=False)
+        if options["salida"]:
+            with open(options["salida"], "w") as archivo:
+                archivo.write(contenido + "\n")
+            self.stderr.write(self.style.SUCCESS(f"Resultados en {options['salida']}"))
+        else:
+            self.stdout.write(contenido)
+
+    def medir(self, options):
+        ciudad = options["ciudad"]
+        parametros = ESCALAS[options["escala"]]
+
+        inicio = time.perf_counter()
+        for ciudad_generada in CIUDADES:
+            generar_ciudad(ciudad_generada, parametros, options["semilla"])
+        self.stderr.write(f"Datos generados en {time.perf_counter() - inicio:.1f}s")
+
+        client = APIClient()
+        client.force_authenticate(
+            user=User.objects.get(username=nombre_usuario(ciudad, "admin"))
+        )
+        endpoints = self.endpoints(client, ciudad, options["semilla"])
+
+        resultados = {}
+        for nombre, solicitud in endpoints.items():
+            for _ in range(options["calentamiento"]):
+                solicitud()
+
+            latencias = []
+            queries = []
+            for _ in range(options["repeticiones"]):
+                with CaptureQueriesContext(connection) as capturados:
+                    inicio = time.perf_counter()
+                    response = solicitud()
+                    latencias.append(time.perf_counter() - inicio)
+                if response.status_code >= 400:
+                    raise RuntimeError(
+                        f"{nombre} respondio {response.status_code}: {response.content[:200]!r}"
+                    )
+                queries.append(len(capturados))
+
+            latencias.sort()
+            resultados[nombre] = {
+                "p50_ms": round(statistics.median(latencias) * 1000, 2),
+                "p95_ms": round(
+                    latencias[min(len(latencias) - 1, int(len(latencias) * 0.95))] * 1000, 2
+                ),
+                "max_ms": round(latencias[-1] * 1000, 2),
+                "queries": max(queries),
+                "presupuesto_queries": PRESUPUESTOS_QUERIES.get(nombre),
+            }
+
+        return {
+            "commit": self.commit(),
+            "fecha": now().isoformat(),
+            "motor": connection.vendor,
+            "escala": options["escala"],
+            "parametros": parametros,
+            "semilla": options["semilla"],
+            "ciudad": ciudad,
+            "repeticiones": options["repeticiones"],
+            "endpoints": resultados,
+        }
+
+    def endpoints(self, client, ciudad, semilla):
+        # Las solicitudes que cambian datos eligen sus clientes y productos con su propio generador para que cada corrida haga lo mismo
+        generador = random.Random(f"{semilla}:benchmark")
+
+        productos = list(
+            Producto.objects.filter(CIUDAD_REGISTRO=ciudad).values_list("id", "PRECIO")
+        )
+        clientes = list(
+            Cliente.objects.filter(CIUDAD_REGISTRO=ciudad)
+            .exclude(NOMBRE__in=["MOSTRADOR", "RUTA"])
+            .values_list("id", "NOMBRE")
+        )
+        # Una salida ruta del ultimo dia, la que el repartidor consulta mientras vende
+        salida_ruta = (
+            SalidaRuta.objects.filter(CIUDAD_REGISTRO=ciudad)
+            .exclude(STATUS="REALIZADO")
+            .order_by("-id")
+            .first()
+            or SalidaRuta.objects.filter(CIUDAD_REGISTRO=ciudad).order_by("-id").first()
+        )
+        # Busqueda por la primera palabra del nombre, como al escribir en la venta
+        busquedas = sorted({nombre.split()[0] for _, nombre in clientes})
+
+        def crear_venta():
+            cliente_id, nombre = generador.choice(clientes)
+            productos_venta = [
+                {"productoId": producto_id, "cantidadVenta": 1, "precioVenta": precio}
+                for producto_id, precio in generador.sample(productos, min(len(productos), 3))
+            ]
+            return client.post(
+                "/api/crear-venta/",
+                {
+                    "CLIENTE": cliente_id,
+                    "NOMBRE_CLIENTE": nombre,
+                    "VENDEDOR": "BENCHMARK",
+                    "TIPO_VENTA": "MOSTRADOR",
+                    "TIPO_PAGO": "CONTADO",
+                    "STATUS": "REALIZADO",
+                    "MONTO": sum(producto["precioVenta"] for producto in productos_venta),
+                    "DESCUENTO": 0,
+                    "OBSERVACIONES": "",
+                    "productosVenta": productos_venta,
+                },
+                format="json",
+            )
+
+        def crear_salida_ruta():
+            return client.post(
+                "/api/crear-salida-ruta/",
+                {
+                    "ATIENDE": "BENCHMARK",
+                    "REPARTIDOR_NOMBRE": "BENCHMARK",
+                    "STATUS": "PENDIENTE",
+                    "OBSERVACIONES": "",
+                    "salidaRutaProductos": [
+                        {"productoId": producto_id, "cantidadSalidaRuta": 10}
+                        for producto_id, _ in generador.sample(
+                            productos, min(len(productos), 5)
+                        )
+                    ],
+                    "salidaRutaClientes": [
+                        {"clienteId": cliente_id}
+                        for cliente_id, _ in generador.sample(
+                            clientes, min(len(clientes), 30)
+                        )
+                    ],
+                },
+                format="json",
+            )
+
+        return {
+            "venta_list": lambda: client.get("/api/ventas/"),
+            "cliente_venta_lista": lambda: client.get(
+                "/api/clientes-venta/", {"nombre": generador.choice(busquedas)}
+            ),
+            "salida_ruta_venta": lambda: client.get(
+                f"/api/salida-rutas-venta/{salida_ruta.id}/"
+            ),
+            "crear_venta": crear_venta,
+            "crear_salida_ruta": crear_salida_ruta,
+        }
+
+    def commit(self):
+        # Commit medido, si el proyecto esta en un repositorio git
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                cwd=settings.BASE_DIR,
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
@@ -0,0 +1,224 @@
+import os
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test.utils import override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.models import Cliente, Producto
+from api.views.views_ventas import crear_venta, venta_list
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide las lecturas de venta_list mientras varios hilos registran ventas con crear_venta. "
+        "Corre sobre una base SQLite temporal, una vez con el journal por defecto y otra con WAL"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--modo",
+            choices=["ambos", "delete", "wal"],
+            default="ambos",
+            help="Journal a medir (por defecto ambos para compararlos)",
+        )
+        parser.add_argument(
+            "--escritores", type=int, default=2, help="Hilos que registran ventas"
+        )
+        parser.add_argument(
+            "--ventas", type=int, default=100, help="Ventas por cada escritor"
+        )
+        parser.add_argument(
+            "--lectores", type=int, default=4, help="Hilos que consultan venta_list"
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("Este benchmark solo aplica a SQLite")
+
+        modos = ["delete", "wal"] if options["modo"] == "ambos" else [options["modo"]]
+
+        # Las imagenes por defecto de productos y empleados se copian a una carpeta temporal y no a media/
+        carpeta = tempfile.mkdtemp()
+        shutil.copytree(
+            os.path.join(settings.MEDIA_ROOT, "imagenes", "default"),
+            os.path.join(carpeta, "media", "imagenes", "default"),
+        )
+
+        try:
+            for modo in modos:
+                with override_settings(MEDIA_ROOT=os.path.join(carpeta, "media")):
+                    with self.motor(modo):
+                        resultado = self.medir(carpeta, options)
+
+                self.reportar(resultado)
+        finally:
+            shutil.rmtree(carpeta, ignore_errors=True)
+
+    @contextmanager
+    def motor(self, modo):
+        # WAL usa el motor backend.sqlite_wal (ver settings.py). Las conexiones de este hilo y de los hilos nuevos se crean con el motor del modo
+        configuracion = connections.settings[connection.alias]
+        motor_original = configuracion["ENGINE"]
+        configuracion["ENGINE"] = (
+            "backend.sqlite_wal" if modo == "wal" else "django.db.backends.sqlite3"
+        )
+        connection.close()
+        del connections[connection.alias]
+        try:
+            yield
+        finally:
+            connection.close()
+            del connections[connection.alias]
+            configuracion["ENGINE"] = motor_original
+
+    def medir(self, carpeta, options):
+        # Base temporal en archivo (no en memoria) para que cada hilo abra su propia conexion como en produccion
+        connection.settings_dict["TEST"]["NAME"] = os.path.join(
+            carpeta, "benchmark.sqlite3"
+        )
+        nombre_original = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("PRAGMA journal_mode")
+                journal = cursor.fetchone()[0]
+
+            usuario, cliente, producto = self.crear_datos(options)
+            connection.close()
+
+            return {
+                "journal": journal,
+                **self.correr_hilos(usuario, cliente, producto, options),
+            }
+        finally:
+            connection.creation.destroy_test_db(nombre_original, verbosity=0)
+            connection.settings_dict["TEST"]["NAME"] = None
+
+    def crear_datos(self, options):
+        usuario = User.objects.create_user(username="benchmark_urp", password="x")
+        cliente = Cliente.objects.create(
+            NOMBRE="MOSTRADOR",
+            TELEFONO="0",
+            TIPO_PAGO="EFECTIVO",
+            CIUDAD_REGISTRO="URUAPAN",
+        )
+        producto = Producto.objects.create(
+            NOMBRE="BENCHMARK",
+            CANTIDAD=options["escritores"] * options["ventas"],
+            PRECIO=10,
+            CIUDAD_REGISTRO="URUAPAN",
+        )
+        return usuario, cliente, producto
+
+    def correr_hilos(self, usuario, cliente, producto, options):
+        factory = APIRequestFactory()
+        venta = {
+            "CLIENTE": cliente.id,
+            "NOMBRE_CLIENTE": cliente.NOMBRE,
+            "VENDEDOR": "BENCHMARK",
+            "TIPO_VENTA": "MOSTRADOR",
+            "TIPO_PAGO": "CONTADO",
+            "STATUS": "REALIZADO",
+            "MONTO": 10,
+            "DESCUENTO": 0,
+            "OBSERVACIONES": "",
+            "productosVenta": [
+                {"productoId": producto.id, "cantidadVenta": 1, "precioVenta": 10}
+            ],
+        }
+
+        escribiendo = threading.Event()
+        escribiendo.set()
+        candado = threading.Lock()
+        resultados = {
+            "ventas": 0,
+            "errores_escritura": 0,
+            "latencias": [],
+            "errores_lectura": 0,
+        }
+
+        def escritor():
+            try:
+                for _ in range(options["ventas"]):
+                    request = factory.post("/api/crear-venta/", venta, format="json")
+                    force_authenticate(request, user=usuario)
+                    try:
+                        creada = crear_venta(request).status_code == 201
+                    except Exception:
+                        creada = False
+                    with candado:
+                        resultados["ventas" if creada else "errores_escritura"] += 1
+            finally:
+                connection.close()
+
+        def lector():
+            try:
+                while escribiendo.is_set():
+                    request = factory.get("/api/ventas/")
+                    force_authenticate(request, user=usuario)
+                    inicio = time.perf_counter()
+                    try:
+                        correcta = venta_list(request).status_code == 200
+                    except Exception:
+                        correcta = False
+                    latencia = time.perf_counter() - inicio
+                    with candado:
+                        if correcta:
+                            resultados["latencias"].append(latencia)
+                        else:
+                            resultados["errores_lectura"] += 1
+            finally:
+                connection.close()
+
+        escritores = [
+            threading.Thread(target=escritor) for _ in range(options["escritores"])
+        ]
+        lectores = [threading.Thread(target=lector) for _ in range(options["lectores"])]
+
+        inicio = time.perf_counter()
+        for hilo in lectores + escritores:
+            hilo.start()
+        for hilo in escritores:
+            hilo.join()
+        duracion = time.perf_counter() - inicio
+
+        escribiendo.clear()
+        for hilo in lectores:
+            hilo.join()
+
+        return {**resultados, "duracion": duracion}
+
+    def reportar(self, resultado):
+        latencias = sorted(resultado["latencias"])
+        duracion = resultado["duracion"]
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f"journal_mode={resultado['journal']}"))
+        self.stdout.write(
+            f"  escrituras: {resultado['ventas']} ventas en {duracion:.2f}s "
+            f"({resultado['ventas'] / duracion:.1f}/s), {resultado['errores_escritura']} errores"
+        )
+
+        if not latencias:
+            self.stdout.write(
+                f"  lecturas: ninguna completada, {resultado['errores_lectura']} errores"
+            )
+            return
+
+        p95 = latencias[min(len(latencias) - 1, int(len(latencias) * 0.95))]
+        self.stdout.write(
+            f"  lecturas: {len(latencias)} ({len(latencias) / duracion:.1f}/s), "
+            f"{resultado['errores_lectura']} errores, "
+            f"p50 {statistics.median(latencias) * 1000:.1f}ms, "
+            f"p95 {p95 * 1000:.1f}ms, max {latencias[-1] * 1000:.1f}ms"
+        )
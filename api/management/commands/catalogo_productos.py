@@ -0,0 +1,110 @@
+import csv
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.models import Producto
+from api.views.utilis.catalogo import (
+    CAMPOS_CATALOGO,
+    FORMATOS_CATALOGO,
+    TAMANO_BLOQUE_CATALOGO,
+    CatalogoInvalido,
+    importar_catalogo,
+    leer_catalogo,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Exporta o importa el catalogo de productos de una ciudad en CSV, JSON o NDJSON. "
+        "Al importar se actualizan los productos por id o por nombre y se crean los que no existen"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("accion", choices=["exportar", "importar"])
+        parser.add_argument(
+            "archivo",
+            help="Archivo a importar o donde exportar, - para la entrada o salida estandar",
+        )
+        parser.add_argument(
+            "--ciudad", choices=["LAZARO", "URUAPAN"], required=True, help="Ciudad del catalogo"
+        )
+        parser.add_argument(
+            "--formato",
+            choices=FORMATOS_CATALOGO,
+            help="Por defecto la extension del archivo, o csv",
+        )
+        parser.add_argument(
+            "--tamano-bloque",
+            type=int,
+            default=TAMANO_BLOQUE_CATALOGO,
+            help="Productos por transaccion al importar",
+        )
+
+    def handle(self, *args, **options):
+        formato = options["formato"] or options["archivo"].rsplit(".", 1)[-1].lower()
+        if formato not in FORMATOS_CATALOGO:
+            formato = "csv"
+
+        if options["accion"] == "exportar":
+            self.exportar(options["archivo"], options["ciudad"], formato)
+        else:
+            self.importar(
+                options["archivo"], options["ciudad"], formato, options["tamano_bloque"]
+            )
+
+    def exportar(self, ruta, ciudad_registro, formato):
+        filas = (
+            Producto.objects.filter(CIUDAD_REGISTRO=ciudad_registro)
+            .order_by("id")
+            .values(*CAMPOS_CATALOGO)
+        )
+
+        if ruta == "-":
+            archivo = sys.stdout
+        else:
+            archivo = open(ruta, "w", newline="", encoding="utf-8")
+        try:
+            if formato == "csv":
+                escritor = csv.DictWriter(archivo, fieldnames=CAMPOS_CATALOGO)
+                escritor.writeheader()
+                escritor.writerows(filas)
+            elif formato == "ndjson":
+                for fila in filas:
+                    archivo.write(json.dumps(fila, ensure_ascii=False) + "\n")
+            else:
+                json.dump(list(filas), archivo, ensure_ascii=False, indent=2)
+                archivo.write("\n")
+        finally:
+            if archivo is not sys.stdout:
+                archivo.close()
+
+        if ruta != "-":
+            self.stdout.write(
+                self.style.SUCCESS(f"{len(filas)} productos exportados a {ruta}")
+            )
+
+    def importar(self, ruta, ciudad_registro, formato, tamano_bloque):
+        try:
+            if ruta == "-":
+                contenido = sys.stdin.read()
+            else:
+                with open(ruta, encoding="utf-8") as archivo:
+                    contenido = archivo.read()
+            filas = leer_catalogo(contenido, formato)
+        except (OSError, UnicodeDecodeError, CatalogoInvalido) as error:
+            raise CommandError(str(error))
+
+        resultado = importar_catalogo(filas, ciudad_registro, tamano_bloque)
+
+        for error in resultado["errores"]:
+            errores = json.dumps(error["errores"], ensure_ascii=False)
+            self.stderr.write(f"Fila {error['fila']}: {errores}")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{resultado['creados']} creados, {resultado['actualizados']} actualizados, "
+                f"{resultado['sin_cambios']} sin cambios, {len(resultado['errores'])} con errores"
+            )
+        )
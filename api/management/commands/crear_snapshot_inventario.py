@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.models import InventarioSnapshot, Producto
+from api.views.utilis.inventario import anotar_stock_a_fecha, stock_anotado
+
+
+class Command(BaseCommand):
+    help = "Guarda un snapshot de la cantidad de cada producto a partir del kardex (se recomienda correrlo diario)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--ciudad", choices=["LAZARO", "URUAPAN"], help="Solo esta ciudad"
+        )
+
+    def handle(self, *args, **options):
+        fecha = timezone.now()
+
+        productos = Producto.objects.all()
+        if options["ciudad"]:
+            productos = productos.filter(CIUDAD_REGISTRO=options["ciudad"])
+
+        snapshots = []
+        diferencias = []
+        for producto in anotar_stock_a_fecha(productos, fecha).iterator():
+            if producto.SNAPSHOT_CANTIDAD is not None and producto.MOVIMIENTOS_CANTIDAD is None:
+                # Sin movimientos desde el ultimo snapshot
+                continue
+
+            cantidad = stock_anotado(producto)
+            if cantidad is None:
+                # Producto sin historial en el kardex, se toma la cantidad actual
+                cantidad = producto.CANTIDAD
+
+            if abs(cantidad - producto.CANTIDAD) > 1e-6:
+                diferencias.append(
+                    f"{producto.NOMBRE} (kardex {cantidad}, producto {producto.CANTIDAD})"
+                )
+
+            snapshots.append(
+                InventarioSnapshot(PRODUCTO=producto, FECHA=fecha, CANTIDAD=cantidad)
+            )
+
+        InventarioSnapshot.objects.bulk_create(snapshots, batch_size=1000)
+
+        self.stdout.write(
+            self.style.SUCCESS(f"{len(snapshots)} snapshots creados al {fecha}")
+        )
+
+        if diferencias:
+            # Cambios de cantidad que no pasaron por el kardex (por ejemplo desde el admin)
+            self.stdout.write(
+                self.style.WARNING(
+                    "El kardex no coincide con la cantidad de: " + ", ".join(diferencias)
+                )
+            )
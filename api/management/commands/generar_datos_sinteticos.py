@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.datos_sinteticos import CIUDADES, ESCALAS, generar_ciudad
+from api.models import Producto
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera datos sinteticos con volumenes de produccion (productos, clientes con precios, rutas, "
+        "años de ventas y salidas ruta) para medir el rendimiento. Con la misma semilla se generan los mismos datos"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--escala",
+            choices=list(ESCALAS),
+            default="pequena",
+            help="Volumen de datos por ciudad (por defecto pequena)",
+        )
+        parser.add_argument("--semilla", type=int, default=1, help="Semilla del generador")
+        parser.add_argument(
+            "--ciudad", choices=CIUDADES, help="Solo esta ciudad (por defecto las dos)"
+        )
+        for parametro in ESCALAS["pequena"]:
+            parser.add_argument(
+                f"--{parametro.replace('_', '-')}",
+                type=int,
+                help=f"Reemplaza {parametro} de la escala",
+            )
+
+    def handle(self, *args, **options):
+        parametros = {
+            parametro: options[parametro] if options[parametro] is not None else valor
+            for parametro, valor in ESCALAS[options["escala"]].items()
+        }
+        ciudades = [options["ciudad"]] if options["ciudad"] else CIUDADES
+
+        # Los folios, el resumen y los nombres de usuario asumen una ciudad vacia
+        ocupadas = [
+            ciudad
+            for ciudad in ciudades
+            if Producto.objects.filter(CIUDAD_REGISTRO=ciudad).exists()
+        ]
+        if ocupadas:
+            raise CommandError(
+                f"Ya hay productos registrados en {', '.join(ocupadas)}, los datos sinteticos se generan en una base vacia"
+            )
+
+        for ciudad in ciudades:
+            inicio = time.perf_counter()
+            generar_ciudad(ciudad, parametros, options["semilla"], self.stdout.write)
+            self.stdout.write(
+                self.style.SUCCESS(f"{ciudad} generada en {time.perf_counter() - inicio:.1f}s")
+            )
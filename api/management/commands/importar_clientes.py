@@ -0,0 +1,67 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.views.utilis.importar_clientes import (
+    FORMATOS_CLIENTES,
+    TAMANO_BLOQUE_CLIENTES,
+    ArchivoClientesInvalido,
+    importar_clientes,
+    leer_clientes,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa clientes con su direccion, precios y rutas dia desde un archivo CSV, JSON o NDJSON. "
+        "Si alguna fila tiene errores no se guarda ningun cliente"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("archivo", help="Archivo a importar, - para la entrada estandar")
+        parser.add_argument(
+            "--ciudad",
+            choices=["LAZARO", "URUAPAN"],
+            required=True,
+            help="Ciudad de los clientes",
+        )
+        parser.add_argument(
+            "--formato",
+            choices=FORMATOS_CLIENTES,
+            help="Por defecto la extension del archivo, o csv",
+        )
+        parser.add_argument(
+            "--tamano-bloque",
+            type=int,
+            default=TAMANO_BLOQUE_CLIENTES,
+            help="Clientes por transaccion",
+        )
+
+    def handle(self, *args, **options):
+        ruta = options["archivo"]
+        formato = options["formato"] or ruta.rsplit(".", 1)[-1].lower()
+        if formato not in FORMATOS_CLIENTES:
+            formato = "csv"
+
+        try:
+            if ruta == "-":
+                contenido = sys.stdin.read()
+            else:
+                with open(ruta, encoding="utf-8") as archivo:
+                    contenido = archivo.read()
+            filas = leer_clientes(contenido, formato)
+        except (OSError, UnicodeDecodeError, ArchivoClientesInvalido) as error:
+            raise CommandError(str(error))
+
+        resultado = importar_clientes(filas, options["ciudad"], options["tamano_bloque"])
+
+        if resultado["errores"]:
+            for error in resultado["errores"]:
+                errores = json.dumps(error["errores"], ensure_ascii=False)
+                self.stderr.write(f"Fila {error['fila']}: {errores}")
+            raise CommandError(
+                f"{len(resultado['errores'])} filas con errores, no se importo ningun cliente"
+            )
+
+        self.stdout.write(self.style.SUCCESS(f"{resultado['creados']} clientes importados"))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.models import SalidaRuta
+from api.views.utilis.salida_ruta import recalcular_contadores
+
+
+class Command(BaseCommand):
+    help = "Recalcula los contadores de clientes pendientes y productos cargados de las salidas ruta a partir de sus clientes y productos"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--salida-ruta", type=int, help="Solo esta salida ruta")
+        parser.add_argument(
+            "--ciudad", choices=["LAZARO", "URUAPAN"], help="Solo esta ciudad"
+        )
+
+    def handle(self, *args, **options):
+        salidas_ruta = SalidaRuta.objects.all()
+        if options["salida_ruta"]:
+            salidas_ruta = salidas_ruta.filter(pk=options["salida_ruta"])
+        if options["ciudad"]:
+            salidas_ruta = salidas_ruta.filter(CIUDAD_REGISTRO=options["ciudad"])
+
+        with transaction.atomic():
+            corregidas = recalcular_contadores(salidas_ruta)
+
+        self.stdout.write(
+            self.style.SUCCESS(f"{corregidas} salidas ruta con contadores corregidos")
+        )
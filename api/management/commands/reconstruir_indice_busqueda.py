@@ -0,0 +1,60 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from api.models import IndiceBusqueda
+from api.views.utilis.busqueda import (
+    CAMPOS_TEXTO,
+    crear_tabla_fts,
+    filas_indice,
+    fts_disponible,
+)
+
+
+class Command(BaseCommand):
+    help = "Reconstruye el indice de busqueda de texto (IndiceBusqueda) de uno o todos los modelos"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--modelo", choices=list(CAMPOS_TEXTO), help="Solo este modelo"
+        )
+
+    def handle(self, *args, **options):
+        modelos = [options["modelo"]] if options["modelo"] else list(CAMPOS_TEXTO)
+
+        if fts_disponible():
+            # Por si la base se migro con una version de SQLite sin el tokenizador trigram
+            with connection.cursor() as cursor:
+                crear_tabla_fts(cursor)
+
+        for nombre_modelo in modelos:
+            with transaction.atomic():
+                filas = self.reconstruir(nombre_modelo)
+
+            self.stdout.write(
+                self.style.SUCCESS(f"{nombre_modelo}: {filas} filas en el indice")
+            )
+
+    def reconstruir(self, nombre_modelo):
+        IndiceBusqueda.objects.filter(MODELO=nombre_modelo).delete()
+
+        objetos = (
+            apps.get_model("api", nombre_modelo)
+            .objects.order_by("id")
+            .values("id", *CAMPOS_TEXTO[nombre_modelo])
+            .iterator(chunk_size=2000)
+        )
+
+        filas = 0
+        lote = []
+        for objeto in objetos:
+            lote.append(objeto)
+            if len(lote) == 2000:
+                filas += len(
+                    IndiceBusqueda.objects.bulk_create(filas_indice(nombre_modelo, lote))
+                )
+                lote = []
+
+        filas += len(IndiceBusqueda.objects.bulk_create(filas_indice(nombre_modelo, lote)))
+
+        return filas
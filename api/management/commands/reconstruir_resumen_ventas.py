@@ -0,0 +1,45 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from api.views.utilis.resumen_ventas import reconstruir_resumen_ventas
+
+
+class Command(BaseCommand):
+    help = "Reconstruye el resumen diario de ventas (VentaResumenDiario) para un rango de fechas"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--desde", required=True, help="Fecha inicial YYYY-MM-DD")
+        parser.add_argument(
+            "--hasta", help="Fecha final YYYY-MM-DD (por defecto la fecha de hoy)"
+        )
+        parser.add_argument(
+            "--ciudad", choices=["LAZARO", "URUAPAN"], help="Solo esta ciudad"
+        )
+
+    def handle(self, *args, **options):
+        desde = self.leer_fecha(options["desde"])
+        hasta = self.leer_fecha(options["hasta"]) if options["hasta"] else date.today()
+
+        if desde > hasta:
+            raise CommandError("--desde no puede ser mayor que --hasta")
+
+        filas = reconstruir_resumen_ventas(desde, hasta, options["ciudad"])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Resumen reconstruido del {desde} al {hasta}: {filas} filas"
+            )
+        )
+
+    def leer_fecha(self, valor):
+        try:
+            fecha = parse_date(valor)
+        except ValueError:
+            fecha = None
+
+        if fecha is None:
+            raise CommandError(f"Fecha invalida: {valor}")
+
+        return fecha
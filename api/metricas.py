@@ -0,0 +1,264 @@
+import contextvars
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.urls import URLPattern, URLResolver, get_resolver
+from rest_framework.serializers import BaseSerializer
+
+# Metricas por vista: solicitudes, duracion, queries, tiempo en la base de datos, tiempo en serializers y tamaño de la respuesta
+# Cada proceso acumula en memoria y cada METRICAS_INTERVALO segundos suma lo acumulado a contadores en la cache (Redis en produccion)
+# para que el endpoint metricas/ regrese los totales de todos los procesos en formato de texto de Prometheus
+
+SIN_RUTA = "sin_ruta"
+
+# Maximo de queries por request de las vistas mas consultadas, medido con la cache vacia (incluye autenticacion y savepoints)
+# Las ventas se miden con la secuencia de folios y el resumen del dia ya creados, la primera venta del dia en una ciudad hace unos queries mas
+# No dependen de la cantidad de filas: una vista que se pasa tiene un query por fila nuevo
+# Se cuenta en api_presupuesto_queries_excedido_total y hace fallar a verificar_presupuesto en las pruebas
+PRESUPUESTOS_QUERIES = {
+    "producto_list": 2,
+    "ruta_list": 2,
+    "cliente_list": 16,
+    "cliente_detail": 8,
+    "cliente_venta_lista": 4,
+    "cliente_venta_sugerencias": 4,
+    "precios_matriz": 4,
+    "venta_list": 4,
+    "venta_detail": 4,
+    "crear_venta": 30,
+    "salida_ruta_list": 5,
+    "salida_ruta_detail": 4,
+    "salida_ruta_resumen": 5,
+    "salida_ruta_venta": 7,
+    "salida_ruta_bundle": 5,
+    "crear_salida_ruta": 25,
+    "crear_venta_salida_ruta": 27,
+    "crear_ventas_salida_ruta": 26,
+    "cancelar_salidas_ruta": 12,
+}
+
+# Serie: (nombre en Prometheus, descripcion, divisor para pasar el entero guardado a la unidad de la metrica)
+SERIES = {
+    "solicitudes": ("api_solicitudes_total", "Solicitudes atendidas", 1),
+    "duracion_us": ("api_duracion_segundos_total", "Tiempo total de respuesta", 1e6),
+    "queries": ("api_queries_total", "Queries ejecutados", 1),
+    "db_us": ("api_db_segundos_total", "Tiempo en la base de datos", 1e6),
+    "serializer_us": (
+        "api_serializer_segundos_total",
+        "Tiempo en serializers (incluye los queries que disparan)",
+        1e6,
+    ),
+    "bytes": ("api_respuesta_bytes_total", "Tamaño de las respuestas", 1),
+    "presupuesto_excedido": (
+        "api_presupuesto_queries_excedido_total",
+        "Solicitudes que pasaron el presupuesto de queries de su vista",
+        1,
+    ),
+}
+
+_medicion_actual = contextvars.ContextVar("medicion_actual", default=None)
+
+_acumulado = defaultdict(lambda: defaultdict(int))
+_candado = threading.Lock()
+_ultimo_envio = time.monotonic()
+
+# Funciones que reciben (vista, medicion) de cada request. Las usa verificar_presupuesto
+_observadores = []
+
+
+def nombre_vista(url_name, vista):
+    # Las rutas de api/urls no tienen name, se usa el nombre de la funcion de la vista (api_view lo conserva en view_class)
+    if url_name:
+        return url_name
+    vista = getattr(vista, "view_class", vista)
+    return getattr(vista, "__name__", type(vista).__name__)
+
+
+def _medir_data(propiedad):
+    def data(self):
+        medicion = _medicion_actual.get()
+        # Solo se mide el serializer exterior, los anidados y los de una lista ya estan dentro de su tiempo
+        if medicion is None or medicion["serializando"]:
+            return propiedad.fget(self)
+
+        medicion["serializando"] = True
+        inicio = time.perf_counter()
+        try:
+            return propiedad.fget(self)
+        finally:
+            medicion["serializer"] += time.perf_counter() - inicio
+            medicion["serializando"] = False
+
+    data._metricas = True
+    return property(data)
+
+
+def _instalar_medicion_serializers():
+    # Serializer.data y ListSerializer.data llaman a BaseSerializer.data, basta con envolver esa propiedad una vez
+    if not getattr(BaseSerializer.data.fget, "_metricas", False):
+        BaseSerializer.data = _medir_data(BaseSerializer.data)
+
+
+def _sumar(vista, valores):
+    global _ultimo_envio
+
+    with _candado:
+        acumulado = _acumulado[vista]
+        for serie, valor in valores.items():
+            acumulado[serie] += valor
+
+        if time.monotonic() - _ultimo_envio < settings.METRICAS_INTERVALO:
+            return
+        _ultimo_envio = time.monotonic()
+
+    enviar_metricas()
+
+
+def llave_metrica(vista, serie):
+    return f"metricas:{vista}:{serie}"
+
+
+def enviar_metricas():
+    # Suma lo acumulado por este proceso a los contadores compartidos de la cache
+    with _candado:
+        pendientes = {vista: dict(series) for vista, series in _acumulado.items()}
+        _acumulado.clear()
+
+    for vista, series in pendientes.items():
+        for serie, valor in series.items():
+            if not valor:
+                continue
+            llave = llave_metrica(vista, serie)
+            try:
+                # incr es atomico tanto en Redis como en memoria local
+                cache.incr(llave, valor)
+            except ValueError:
+                if not cache.add(llave, valor, None):
+                    cache.incr(llave, valor)
+
+
+def vistas_registradas():
+    # Nombres de todas las vistas de las rutas del proyecto, son las etiquetas posibles de las metricas
+    vistas = {SIN_RUTA}
+    pendientes = list(get_resolver().url_patterns)
+    while pendientes:
+        patron = pendientes.pop()
+        if isinstance(patron, URLResolver):
+            pendientes.extend(patron.url_patterns)
+        elif isinstance(patron, URLPattern):
+            vistas.add(nombre_vista(patron.name, patron.callback))
+
+    return sorted(vistas)
+
+
+def texto_prometheus():
+    enviar_metricas()
+
+    vistas = vistas_registradas()
+    valores = cache.get_many(
+        [llave_metrica(vista, serie) for vista in vistas for serie in SERIES]
+    )
+
+    lineas = []
+    for serie, (nombre, descripcion, divisor) in SERIES.items():
+        lineas.append(f"# HELP {nombre} {descripcion} por vista")
+        lineas.append(f"# TYPE {nombre} counter")
+        for vista in vistas:
+            valor = valores.get(llave_metrica(vista, serie))
+            if valor is not None:
+                valor = valor if divisor == 1 else f"{valor / divisor:.6f}"
+                lineas.append(f'{nombre}{{vista="{vista}"}} {valor}')
+
+    lineas.append("# HELP api_presupuesto_queries Maximo de queries por solicitud de la vista")
+    lineas.append("# TYPE api_presupuesto_queries gauge")
+    for vista, maximo in sorted(PRESUPUESTOS_QUERIES.items()):
+        lineas.append(f'api_presupuesto_queries{{vista="{vista}"}} {maximo}')
+
+    return "\n".join(lineas) + "\n"
+
+
+class MetricasMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        _instalar_medicion_serializers()
+
+    def __call__(self, request):
+        medicion = {"queries": 0, "db": 0.0, "serializer": 0.0, "serializando": False}
+
+        def medir_query(execute, sql, params, many, context):
+            inicio = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                medicion["queries"] += 1
+                medicion["db"] += time.perf_counter() - inicio
+
+        token = _medicion_actual.set(medicion)
+        inicio = time.perf_counter()
+        try:
+            with connection.execute_wrapper(medir_query):
+                response = self.get_response(request)
+        finally:
+            _medicion_actual.reset(token)
+        duracion = time.perf_counter() - inicio
+
+        resolver_match = getattr(request, "resolver_match", None)
+        vista = (
+            nombre_vista(resolver_match.url_name, resolver_match.func)
+            if resolver_match
+            else SIN_RUTA
+        )
+        presupuesto = PRESUPUESTOS_QUERIES.get(vista)
+        excedido = presupuesto is not None and medicion["queries"] > presupuesto
+
+        _sumar(
+            vista,
+            {
+                "solicitudes": 1,
+                "duracion_us": int(duracion * 1e6),
+                "queries": medicion["queries"],
+                "db_us": int(medicion["db"] * 1e6),
+                "serializer_us": int(medicion["serializer"] * 1e6),
+                "bytes": 0 if response.streaming else len(response.content),
+                "presupuesto_excedido": int(excedido),
+            },
+        )
+
+        for observador in list(_observadores):
+            observador(vista, medicion)
+
+        return response
+
+
+class PresupuestoExcedido(AssertionError):
+    pass
+
+
+@contextmanager
+def verificar_presupuesto(vista=None, maximo=None):
+    # Para las pruebas: falla si algun request hecho dentro del bloque pasa su presupuesto de queries
+    # Con vista solo se revisan los requests a esa vista, maximo reemplaza el presupuesto declarado en PRESUPUESTOS_QUERIES
+    #     with verificar_presupuesto("venta_list"):
+    #         self.client.get("/api/ventas/")
+    excedidos = []
+
+    def observar(vista_request, medicion):
+        if vista is not None and vista_request != vista:
+            return
+        limite = maximo if maximo is not None else PRESUPUESTOS_QUERIES.get(vista_request)
+        if limite is not None and medicion["queries"] > limite:
+            excedidos.append(f"{vista_request}: {medicion['queries']} queries (maximo {limite})")
+
+    _observadores.append(observar)
+    try:
+        yield
+    finally:
+        _observadores.remove(observar)
+
+    if excedidos:
+        raise PresupuestoExcedido("; ".join(excedidos))
@@ -0,0 +1,27 @@
+# Generated by Django 4.1.7 on 2026-10-18 06:49
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0019_alter_salidaruta_folio'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FolioSecuencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('CIUDAD_REGISTRO', models.CharField(choices=[('LAZARO', 'LAZARO'), ('URUAPAN', 'URUAPAN')], default='URUAPAN', max_length=15)),
+                ('TIPO', models.CharField(choices=[('MOSTRADOR', 'MOSTRADOR'), ('RUTA', 'RUTA'), ('SALIDA_RUTA', 'SALIDA_RUTA')], max_length=100)),
+                ('ULTIMO_FOLIO', models.IntegerField(default=0, validators=[django.core.validators.MinValueValidator(0)])),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='foliosecuencia',
+            constraint=models.UniqueConstraint(fields=('CIUDAD_REGISTRO', 'TIPO'), name='unique_folio_secuencia'),
+        ),
+    ]
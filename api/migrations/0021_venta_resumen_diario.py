@@ -0,0 +1,54 @@
+# Generated by Django 4.1.7 on 2026-10-18 06:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0020_foliosecuencia'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductoVentaResumenDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('NOMBRE_PRODUCTO', models.CharField(max_length=200)),
+                ('CANTIDAD', models.FloatField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='VentaResumenDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('CIUDAD_REGISTRO', models.CharField(choices=[('LAZARO', 'LAZARO'), ('URUAPAN', 'URUAPAN')], default='URUAPAN', max_length=15)),
+                ('FECHA', models.DateField()),
+                ('TIPO_VENTA', models.CharField(choices=[('MOSTRADOR', 'MOSTRADOR'), ('RUTA', 'RUTA')], max_length=100)),
+                ('TIPO_PAGO', models.CharField(choices=[('CONTADO', 'CONTADO'), ('CREDITO', 'CREDITO'), ('CORTESIA', 'CORTESIA')], max_length=100)),
+                ('STATUS', models.CharField(choices=[('REALIZADO', 'REALIZADO'), ('PENDIENTE', 'PENDIENTE'), ('CANCELADO', 'CANCELADO')], max_length=100)),
+                ('VENDEDOR', models.CharField(max_length=100)),
+                ('MONTO', models.FloatField(default=0)),
+                ('NUMERO_VENTAS', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='ventaresumendiario',
+            constraint=models.UniqueConstraint(fields=('CIUDAD_REGISTRO', 'FECHA', 'TIPO_VENTA', 'TIPO_PAGO', 'STATUS', 'VENDEDOR'), name='unique_venta_resumen_diario'),
+        ),
+        migrations.AddField(
+            model_name='productoventaresumendiario',
+            name='PRODUCTO',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='api.producto'),
+        ),
+        migrations.AddField(
+            model_name='productoventaresumendiario',
+            name='RESUMEN',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='productos_resumen', to='api.ventaresumendiario'),
+        ),
+        migrations.AddConstraint(
+            model_name='productoventaresumendiario',
+            constraint=models.UniqueConstraint(fields=('RESUMEN', 'NOMBRE_PRODUCTO'), name='unique_producto_venta_resumen_diario'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 4.1.7 on 2026-10-18 06:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def crear_snapshot_inicial(apps, schema_editor):
+    # La cantidad actual de cada producto es el punto de partida del kardex
+    Producto = apps.get_model("api", "Producto")
+    InventarioSnapshot = apps.get_model("api", "InventarioSnapshot")
+
+    fecha = django.utils.timezone.now()
+    InventarioSnapshot.objects.bulk_create(
+        [
+            InventarioSnapshot(PRODUCTO_id=producto_id, FECHA=fecha, CANTIDAD=cantidad)
+            for producto_id, cantidad in Producto.objects.values_list("id", "CANTIDAD")
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0021_venta_resumen_diario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovimientoInventario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('PRODUCTO_NOMBRE', models.CharField(max_length=200)),
+                ('CANTIDAD', models.FloatField()),
+                ('CANTIDAD_RESULTANTE', models.FloatField()),
+                ('TIPO', models.CharField(choices=[('ALTA', 'ALTA'), ('EDICION', 'EDICION'), ('VENTA', 'VENTA'), ('STATUS_VENTA', 'STATUS_VENTA'), ('SALIDA_RUTA', 'SALIDA_RUTA'), ('CANCELACION_SALIDA_RUTA', 'CANCELACION_SALIDA_RUTA'), ('RECARGA', 'RECARGA'), ('DEVOLUCION', 'DEVOLUCION'), ('AJUSTE', 'AJUSTE')], max_length=30)),
+                ('REFERENCIA', models.CharField(blank=True, max_length=100)),
+                ('FECHA', models.DateTimeField(default=django.utils.timezone.now)),
+                ('CIUDAD_REGISTRO', models.CharField(choices=[('LAZARO', 'LAZARO'), ('URUAPAN', 'URUAPAN')], db_index=True, default='URUAPAN', max_length=15)),
+                ('PRODUCTO', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movimientos', to='api.producto')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='InventarioSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('FECHA', models.DateTimeField()),
+                ('CANTIDAD', models.FloatField()),
+                ('PRODUCTO', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='api.producto')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='movimientoinventario',
+            index=models.Index(fields=['PRODUCTO', 'FECHA'], name='movimiento_producto_fecha'),
+        ),
+        migrations.AddIndex(
+            model_name='inventariosnapshot',
+            index=models.Index(fields=['PRODUCTO', 'FECHA'], name='snapshot_producto_fecha'),
+        ),
+        migrations.RunPython(crear_snapshot_inicial, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.1.7 on 2026-10-18 07:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0022_movimiento_inventario'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='salidaruta',
+            index=models.Index(fields=['CIUDAD_REGISTRO', 'FECHA'], name='salida_ruta_ciudad_fecha'),
+        ),
+        migrations.AddIndex(
+            model_name='salidaruta',
+            index=models.Index(fields=['REPARTIDOR', 'STATUS', 'FECHA'], name='salida_ruta_repartidor'),
+        ),
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(fields=['CIUDAD_REGISTRO', 'FECHA'], name='venta_ciudad_fecha'),
+        ),
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(fields=['CIUDAD_REGISTRO', 'TIPO_VENTA', 'id'], name='venta_ciudad_tipo_id'),
+        ),
+    ]
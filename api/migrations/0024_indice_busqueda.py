@@ -0,0 +1,149 @@
+# Generated by Django 4.1.7 on 2026-10-18 07:05
+
+import sqlite3
+import unicodedata
+
+from django.db import migrations, models
+
+# Copia de los campos y del SQL de api/views/utilis/busqueda.py al momento de esta migracion
+# La migracion no importa codigo de la aplicacion para que un cambio posterior no cambie lo que hace en una base nueva
+CAMPOS_TEXTO = {
+    "Venta": ["NOMBRE_CLIENTE", "VENDEDOR", "FOLIO", "OBSERVACIONES"],
+    "SalidaRuta": [
+        "ATIENDE",
+        "REPARTIDOR_NOMBRE",
+        "RUTA_NOMBRE",
+        "FOLIO",
+        "OBSERVACIONES",
+    ],
+    "AjusteInventario": [
+        "CAJERO",
+        "BODEGA",
+        "ADMINISTRADOR",
+        "PRODUCTO_NOMBRE",
+        "OBSERVACIONES",
+    ],
+    "DevolucionSalidaRuta": [
+        "REPARTIDOR",
+        "ATIENDE",
+        "ADMINISTRADOR",
+        "PRODUCTO_NOMBRE",
+        "OBSERVACIONES",
+    ],
+    "Cliente": ["NOMBRE", "CONTACTO", "TELEFONO", "CORREO", "OBSERVACIONES"],
+}
+
+TABLA_FTS = "api_indicebusqueda_fts"
+
+SQL_TABLA_FTS = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA_FTS} USING fts5("
+    "TEXTO, content='api_indicebusqueda', content_rowid='id', tokenize='trigram')",
+    f"CREATE TRIGGER IF NOT EXISTS {TABLA_FTS}_insert AFTER INSERT ON api_indicebusqueda BEGIN "
+    f"INSERT INTO {TABLA_FTS}(rowid, TEXTO) VALUES (new.id, new.TEXTO); END",
+    f"CREATE TRIGGER IF NOT EXISTS {TABLA_FTS}_delete AFTER DELETE ON api_indicebusqueda BEGIN "
+    f"INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, TEXTO) VALUES ('delete', old.id, old.TEXTO); END",
+    f"CREATE TRIGGER IF NOT EXISTS {TABLA_FTS}_update AFTER UPDATE ON api_indicebusqueda BEGIN "
+    f"INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, TEXTO) VALUES ('delete', old.id, old.TEXTO); "
+    f"INSERT INTO {TABLA_FTS}(rowid, TEXTO) VALUES (new.id, new.TEXTO); END",
+]
+
+
+def fts_disponible(conexion):
+    # El tokenizador trigram de FTS5 existe desde SQLite 3.34
+    return conexion.vendor == "sqlite" and sqlite3.sqlite_version_info >= (3, 34, 0)
+
+
+def normalizar(valor):
+    texto = unicodedata.normalize("NFKD", str(valor))
+    texto = "".join(letra for letra in texto if not unicodedata.combining(letra))
+    return " ".join(texto.lower().split())
+
+
+def filas_indice(nombre_modelo, objetos, IndiceBusqueda):
+    filas = []
+    for objeto in objetos:
+        for campo in CAMPOS_TEXTO[nombre_modelo]:
+            texto = normalizar(objeto[campo]) if objeto[campo] is not None else ""
+            if texto:
+                filas.append(
+                    IndiceBusqueda(
+                        MODELO=nombre_modelo,
+                        CAMPO=campo,
+                        OBJETO_ID=objeto["id"],
+                        TEXTO=texto,
+                    )
+                )
+
+    return filas
+
+
+def crear_indice_texto(apps, schema_editor):
+    conexion = schema_editor.connection
+
+    if conexion.vendor == "postgresql":
+        # LIKE '%texto%' sobre TEXTO usa este indice GIN trigram
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS api_indicebusqueda_texto_trgm ON api_indicebusqueda USING gin ("TEXTO" gin_trgm_ops)'
+        )
+    elif fts_disponible(conexion):
+        # Tabla FTS5 de contenido externo, los triggers la mantienen al dia
+        for sql in SQL_TABLA_FTS:
+            schema_editor.execute(sql)
+
+
+def borrar_indice_texto(apps, schema_editor):
+    # El indice de PostgreSQL y los triggers de SQLite se borran junto con la tabla
+    if fts_disponible(schema_editor.connection):
+        schema_editor.execute(f"DROP TABLE IF EXISTS {TABLA_FTS}")
+
+
+def llenar_indice(apps, schema_editor):
+    IndiceBusqueda = apps.get_model("api", "IndiceBusqueda")
+
+    for nombre_modelo, campos in CAMPOS_TEXTO.items():
+        objetos = (
+            apps.get_model("api", nombre_modelo)
+            .objects.order_by("id")
+            .values("id", *campos)
+            .iterator(chunk_size=2000)
+        )
+
+        lote = []
+        for objeto in objetos:
+            lote.append(objeto)
+            if len(lote) == 2000:
+                IndiceBusqueda.objects.bulk_create(
+                    filas_indice(nombre_modelo, lote, IndiceBusqueda)
+                )
+                lote = []
+
+        IndiceBusqueda.objects.bulk_create(
+            filas_indice(nombre_modelo, lote, IndiceBusqueda)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0023_indices_compuestos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndiceBusqueda',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('MODELO', models.CharField(max_length=50)),
+                ('CAMPO', models.CharField(max_length=50)),
+                ('OBJETO_ID', models.BigIntegerField()),
+                ('TEXTO', models.TextField()),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='indicebusqueda',
+            constraint=models.UniqueConstraint(fields=('MODELO', 'OBJETO_ID', 'CAMPO'), name='unique_indice_busqueda'),
+        ),
+        migrations.RunPython(crear_indice_texto, borrar_indice_texto),
+        migrations.RunPython(llenar_indice, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.1.7 on 2026-10-18 07:13
+
+import django.core.validators
+from django.db import migrations, models
+
+
+def descuento_desde_precio(precio, precio_publico):
+    # Copia de api.models.descuento_desde_precio al momento de esta migracion
+    # None (precio fijo) si el precio es mayor al publico o el producto no tiene precio
+    if precio_publico > 0 and 0 <= precio <= precio_publico:
+        return 1 - precio / precio_publico
+    if precio_publico == 0 and precio == 0:
+        return 0.0
+
+    return None
+
+
+def convertir_a_descuento(apps, schema_editor):
+    # Cada precio existente pasa a ser un descuento relativo al precio publico actual, asi sobrevive al siguiente cambio de precio
+    PrecioCliente = apps.get_model("api", "PrecioCliente")
+
+    filas = (
+        PrecioCliente.objects.order_by("id")
+        .values_list("id", "PRECIO", "PRODUCTO__PRECIO")
+        .iterator(chunk_size=2000)
+    )
+
+    lote = []
+    for precio_id, precio, precio_publico in filas:
+        descuento = descuento_desde_precio(precio, precio_publico)
+        if descuento is not None:
+            lote.append(PrecioCliente(id=precio_id, DESCUENTO=descuento))
+        if len(lote) == 2000:
+            PrecioCliente.objects.bulk_update(lote, ["DESCUENTO"])
+            lote = []
+
+    PrecioCliente.objects.bulk_update(lote, ["DESCUENTO"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0024_indice_busqueda'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='preciocliente',
+            name='DESCUENTO',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(1)]),
+        ),
+        migrations.RunPython(convertir_a_descuento, migrations.RunPython.noop),
+    ]
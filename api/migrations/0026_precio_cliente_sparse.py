@@ -0,0 +1,74 @@
+# Generated by Django 4.1.7 on 2026-10-18 09:02
+
+from django.db import migrations, models
+
+
+def colapsar_precios(apps, schema_editor):
+    # Solo se conservan los precios distintos al publico. Con un precio repetido para el mismo producto se conserva el mas reciente
+    PrecioCliente = apps.get_model("api", "PrecioCliente")
+
+    filas = (
+        PrecioCliente.objects.order_by("-id")
+        .values_list("id", "CLIENTE_id", "PRODUCTO_id", "DESCUENTO")
+        .iterator(chunk_size=2000)
+    )
+
+    vistos = set()
+    borrar = []
+    for precio_id, cliente_id, producto_id, descuento in filas:
+        if descuento == 0 or (cliente_id, producto_id) in vistos:
+            borrar.append(precio_id)
+        vistos.add((cliente_id, producto_id))
+
+    for inicio in range(0, len(borrar), 2000):
+        PrecioCliente.objects.filter(id__in=borrar[inicio : inicio + 2000]).delete()
+
+
+def materializar_precios(apps, schema_editor):
+    # Reversa: un precio al publico para cada cliente y producto de su ciudad que no tiene uno guardado
+    Cliente = apps.get_model("api", "Cliente")
+    Producto = apps.get_model("api", "Producto")
+    PrecioCliente = apps.get_model("api", "PrecioCliente")
+
+    existentes = set(PrecioCliente.objects.values_list("CLIENTE_id", "PRODUCTO_id"))
+
+    productos = {}
+    for producto_id, ciudad_registro, precio in Producto.objects.order_by(
+        "id"
+    ).values_list("id", "CIUDAD_REGISTRO", "PRECIO"):
+        productos.setdefault(ciudad_registro, []).append((producto_id, precio))
+
+    lote = []
+    for cliente_id, ciudad_registro in Cliente.objects.values_list(
+        "id", "CIUDAD_REGISTRO"
+    ).iterator(chunk_size=2000):
+        for producto_id, precio in productos.get(ciudad_registro, []):
+            if (cliente_id, producto_id) not in existentes:
+                lote.append(
+                    PrecioCliente(
+                        CLIENTE_id=cliente_id,
+                        PRODUCTO_id=producto_id,
+                        PRECIO=precio,
+                        DESCUENTO=0.0,
+                    )
+                )
+        if len(lote) >= 2000:
+            PrecioCliente.objects.bulk_create(lote)
+            lote = []
+
+    PrecioCliente.objects.bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0025_precio_cliente_descuento'),
+    ]
+
+    operations = [
+        migrations.RunPython(colapsar_precios, materializar_precios),
+        migrations.AddConstraint(
+            model_name='preciocliente',
+            constraint=models.UniqueConstraint(fields=('CLIENTE', 'PRODUCTO'), name='unique_precio_cliente_producto'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.1.7 on 2026-10-18 07:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0026_precio_cliente_sparse'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='venta',
+            name='CLAVE_IDEMPOTENCIA',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='venta',
+            constraint=models.UniqueConstraint(fields=('CLAVE_IDEMPOTENCIA',), name='unique_clave_idempotencia_venta'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.1.7 on 2026-10-18 07:21
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def calcular_contadores(apps, schema_editor):
+    # Un solo UPDATE con los contadores de todas las salidas ruta existentes, contados con los modelos historicos
+    SalidaRuta = apps.get_model("api", "SalidaRuta")
+    ClienteSalidaRuta = apps.get_model("api", "ClienteSalidaRuta")
+    ProductoSalidaRuta = apps.get_model("api", "ProductoSalidaRuta")
+
+    def contar(modelo, status):
+        return Coalesce(
+            Subquery(
+                modelo.objects.filter(SALIDA_RUTA=OuterRef("pk"), STATUS=status)
+                .order_by()
+                .values("SALIDA_RUTA")
+                .annotate(total=Count("id"))
+                .values("total")
+            ),
+            0,
+        )
+
+    SalidaRuta.objects.update(
+        CLIENTES_PENDIENTES=contar(ClienteSalidaRuta, "PENDIENTE"),
+        PRODUCTOS_CARGADOS=contar(ProductoSalidaRuta, "CARGADO"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0027_venta_clave_idempotencia'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='salidaruta',
+            name='CLIENTES_PENDIENTES',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='salidaruta',
+            name='PRODUCTOS_CARGADOS',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(calcular_contadores, migrations.RunPython.noop),
+    ]
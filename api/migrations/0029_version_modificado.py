@@ -0,0 +1,34 @@
+# Generated by Django 4.1.7 on 2026-10-18 07:24
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0028_salida_ruta_contadores'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='salidaruta',
+            name='MODIFICADO',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddField(
+            model_name='salidaruta',
+            name='VERSION',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='venta',
+            name='MODIFICADO',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddField(
+            model_name='venta',
+            name='VERSION',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.1.7 on 2026-10-18 07:44
+
+from django.conf import settings
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('api', '0029_version_modificado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReservaFolios',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('CIUDAD_REGISTRO', models.CharField(choices=[('LAZARO', 'LAZARO'), ('URUAPAN', 'URUAPAN')], default='URUAPAN', max_length=15)),
+                ('TIPO', models.CharField(choices=[('MOSTRADOR', 'MOSTRADOR'), ('RUTA', 'RUTA')], max_length=100)),
+                ('PRIMER_FOLIO', models.IntegerField(validators=[django.core.validators.MinValueValidator(1)])),
+                ('ULTIMO_FOLIO', models.IntegerField(validators=[django.core.validators.MinValueValidator(1)])),
+                ('FECHA', models.DateTimeField(auto_now_add=True)),
+                ('USUARIO', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas_folios', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='reservafolios',
+            index=models.Index(fields=['USUARIO', 'CIUDAD_REGISTRO', 'TIPO', 'PRIMER_FOLIO'], name='reserva_folios_usuario'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.1.7 on 2026-10-18 08:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0030_reserva_folios'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='venta',
+            name='unique_clave_idempotencia_venta',
+        ),
+        migrations.AddField(
+            model_name='venta',
+            name='SALIDA_RUTA',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ventas', to='api.salidaruta'),
+        ),
+        migrations.AddConstraint(
+            model_name='venta',
+            constraint=models.UniqueConstraint(fields=('SALIDA_RUTA', 'CLAVE_IDEMPOTENCIA'), name='unique_clave_idempotencia_salida_ruta'),
+        ),
+    ]
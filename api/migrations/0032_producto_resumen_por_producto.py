@@ -0,0 +1,42 @@
+# Generated by Django 4.1.7 on 2026-10-18 08:04
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def unir_filas_por_producto(apps, schema_editor):
+    # Un producto renombrado quedo en varias filas del mismo resumen. Se suman en la fila mas antigua antes de la restriccion nueva
+    ProductoVentaResumenDiario = apps.get_model("api", "ProductoVentaResumenDiario")
+
+    duplicados = (
+        ProductoVentaResumenDiario.objects.filter(PRODUCTO__isnull=False)
+        .values("RESUMEN", "PRODUCTO")
+        .annotate(FILAS=Count("id"), PRIMERA=Min("id"), TOTAL=Sum("CANTIDAD"))
+        .filter(FILAS__gt=1)
+        .order_by()
+    )
+
+    for fila in duplicados:
+        ProductoVentaResumenDiario.objects.filter(pk=fila["PRIMERA"]).update(CANTIDAD=fila["TOTAL"])
+        ProductoVentaResumenDiario.objects.filter(
+            RESUMEN=fila["RESUMEN"], PRODUCTO=fila["PRODUCTO"]
+        ).exclude(pk=fila["PRIMERA"]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0031_venta_salida_ruta'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='productoventaresumendiario',
+            name='unique_producto_venta_resumen_diario',
+        ),
+        migrations.RunPython(unir_filas_por_producto, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='productoventaresumendiario',
+            constraint=models.UniqueConstraint(fields=('RESUMEN', 'PRODUCTO'), name='unique_producto_venta_resumen_diario'),
+        ),
+    ]
@@ -130,6 +130,98 @@ class AjusteInventario(models.Model):
         return f"{self.PRODUCTO_NOMBRE}, {self.TIPO_AJUSTE}, {self.CANTIDAD}"
 
 
+# Kardex: cada cambio en Producto.CANTIDAD deja un movimiento (solo se agregan filas, nunca se modifican)
+# Los movimientos se escriben en mover_stock (ver api/views/utilis/inventario.py)
+class MovimientoInventario(models.Model):
+    PRODUCTO = models.ForeignKey(
+        Producto, on_delete=models.SET_NULL, null=True, related_name="movimientos"
+    )
+    # Igual que en AjusteInventario, el nombre se guarda por si el producto se elimina
+    PRODUCTO_NOMBRE = models.CharField(max_length=200)
+
+    # Positivo entra al almacen, negativo sale del almacen
+    CANTIDAD = models.FloatField()
+
+    CANTIDAD_RESULTANTE = models.FloatField()
+
+    TIPO = models.CharField(
+        max_length=30,
+        choices=(
+            ("ALTA", "ALTA"),
+            ("EDICION", "EDICION"),
+            ("VENTA", "VENTA"),
+            ("STATUS_VENTA", "STATUS_VENTA"),
+            ("SALIDA_RUTA", "SALIDA_RUTA"),
+            ("CANCELACION_SALIDA_RUTA", "CANCELACION_SALIDA_RUTA"),
+            ("RECARGA", "RECARGA"),
+            ("DEVOLUCION", "DEVOLUCION"),
+            ("AJUSTE", "AJUSTE"),
+        ),
+    )
+
+    # Registro que origino el movimiento, por ejemplo "VENTA:15" o "SALIDA_RUTA:3"
+    REFERENCIA = models.CharField(max_length=100, blank=True)
+
+    FECHA = models.DateTimeField(default=now)
+
+    CIUDAD_REGISTRO = models.CharField(
+        choices=(("LAZARO", "LAZARO"), ("URUAPAN", "URUAPAN")),
+        max_length=15,
+        default="URUAPAN",
+        blank=False,
+        db_index=True,
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["PRODUCTO", "FECHA"], name="movimiento_producto_fecha"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.PRODUCTO_NOMBRE}, {self.TIPO}, {self.CANTIDAD}"
+
+
+# Cantidad de un producto en una fecha. El stock en cualquier fecha es el ultimo snapshot anterior mas los movimientos posteriores
+# Se crean con el comando crear_snapshot_inventario
+class InventarioSnapshot(models.Model):
+    PRODUCTO = models.ForeignKey(
+        Producto, on_delete=models.CASCADE, related_name="snapshots"
+    )
+
+    FECHA = models.DateTimeField()
+
+    CANTIDAD = models.FloatField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["PRODUCTO", "FECHA"], name="snapshot_producto_fecha")
+        ]
+
+    def __str__(self):
+        return f"{self.PRODUCTO}, {self.FECHA}, {self.CANTIDAD}"
+
+
+# Indice de busqueda de texto: una fila por objeto y campo con el texto normalizado (minusculas y sin acentos)
+# Se mantiene con las señales de cada modelo y se consulta con un indice trigram (PostgreSQL) o FTS5 (SQLite). Ver api/views/utilis/busqueda.py
+class IndiceBusqueda(models.Model):
+    MODELO = models.CharField(max_length=50)
+    CAMPO = models.CharField(max_length=50)
+    OBJETO_ID = models.BigIntegerField()
+    TEXTO = models.TextField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["MODELO", "OBJETO_ID", "CAMPO"], name="unique_indice_busqueda"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.MODELO}, {self.CAMPO}, {self.OBJETO_ID}"
+
+
 # This model is just on allow model clients to add address information without creating too many fileds in Client model
 class Direccion(models.Model):
     CALLE = models.CharField(max_length=200)
@@ -212,6 +304,24 @@ class Cliente(models.Model):
         return str(self.NOMBRE)
 
 
+def calcular_precio_cliente(precio, descuento, precio_publico):
+    # Precio que paga el cliente. Se usa tanto en PrecioCliente.precio_efectivo como en las consultas con values_list
+    if descuento is None:
+        return precio
+
+    return round(precio_publico * (1 - descuento), 2)
+
+
+def descuento_desde_precio(precio, precio_publico):
+    # Descuento relativo equivalente a un precio capturado. None (precio fijo) si el precio es mayor al publico o el producto no tiene precio
+    if precio_publico > 0 and 0 <= precio <= precio_publico:
+        return 1 - precio / precio_publico
+    if precio_publico == 0 and precio == 0:
+        return 0.0
+
+    return None
+
+
 # Is this expensive?
 class PrecioCliente(models.Model):
     # Debido a que si se borrar cliente se debe de borrar el correspondiente precio(s). Aqui si tiene sentido usar el foreigkey y no solo el nombre del cliente. Los mismo para producto.
@@ -224,9 +334,25 @@ class PrecioCliente(models.Model):
     PRODUCTO = models.ForeignKey(Producto, on_delete=models.CASCADE)
     # si borro el producto no tiene caso tener el nombre del producto, por eso no lo puse aqui como otro campo
 
-    PRECIO = models.FloatField(validators=[MinValueValidator(0)])  # REMOVE THIS FIELD
-    # Maybe for the general code we should consider using relative prices just as Gabriel said
-    # DESCUENTO = models.FloatField(validators=[MinValueValidator(0), MaxValueValidator(1)]) # ADD THIS FIELD
+    # Con DESCUENTO, PRECIO solo guarda el ultimo precio calculado. El precio que paga el cliente es precio_efectivo
+    PRECIO = models.FloatField(validators=[MinValueValidator(0)])
+    # Descuento relativo al precio publico (0.1 = 10%). El precio del cliente sigue a Producto.PRECIO y el descuento se conserva cuando cambia el precio publico
+    # Sin DESCUENTO (null) PRECIO es un precio fijo
+    DESCUENTO = models.FloatField(
+        validators=[MinValueValidator(0), MaxValueValidator(1)], null=True, blank=True
+    )
+
+    # Solo se guardan los precios distintos al publico. Un cliente sin fila para un producto paga Producto.PRECIO (ver api/views/utilis/precios.py)
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["CLIENTE", "PRODUCTO"], name="unique_precio_cliente_producto"
+            )
+        ]
+
+    @property
+    def precio_efectivo(self):
+        return calcular_precio_cliente(self.PRECIO, self.DESCUENTO, self.PRODUCTO.PRECIO)
 
     # En este metodo nunca debes de poner algo que se pueda volver None. Por ejemplo, en este caso estamos seguros de que CLIENTE y PRODUCTO siempre seran valores distintos de None
     def __str__(self):
@@ -289,17 +415,117 @@ class Venta(models.Model):
 
     FOLIO = models.CharField(max_length=20, null=True, blank=True)
 
+    # Clave generada por el dispositivo para cada venta capturada sin conexion. Si el dispositivo reenvia la venta no se registra dos veces
+    # La clave es unica dentro de la salida ruta de la venta: dos dispositivos pueden generar la misma clave en salidas distintas
+    CLAVE_IDEMPOTENCIA = models.CharField(max_length=64, null=True, blank=True)
+    SALIDA_RUTA = models.ForeignKey(
+        "SalidaRuta",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name="ventas",
+    )
+
+    # ETag y Last-Modified de venta_detail (ver utilis/condicional.py). Las vistas que modifican la venta llaman marcar_modificado
+    VERSION = models.PositiveIntegerField(default=0, editable=False)
+    MODIFICADO = models.DateTimeField(default=now, editable=False)
+
     class Meta:
         constraints = [
             models.UniqueConstraint(
                 fields=["FOLIO", "CIUDAD_REGISTRO"], name="unique_folio_ciudad"
-            )
+            ),
+            models.UniqueConstraint(
+                fields=["SALIDA_RUTA", "CLAVE_IDEMPOTENCIA"],
+                name="unique_clave_idempotencia_salida_ruta",
+            ),
+        ]
+        # Indices para los filtros de las listas y reportes: siempre por ciudad, luego por fecha o por tipo de venta ordenado por id
+        indexes = [
+            models.Index(
+                fields=["CIUDAD_REGISTRO", "FECHA"], name="venta_ciudad_fecha"
+            ),
+            models.Index(
+                fields=["CIUDAD_REGISTRO", "TIPO_VENTA", "id"],
+                name="venta_ciudad_tipo_id",
+            ),
         ]
 
     def __str__(self):
         return f"{self.TIPO_VENTA}, {self.MONTO}, {self.TIPO_PAGO}"
 
 
+# Secuencia de folios por ciudad. Cada fila guarda el ultimo folio entregado para ventas a mostrador, ventas en ruta o salidas ruta.
+# Los folios se reparten con un UPDATE que bloquea solo esta fila (ver api/views/utilis/folios.py)
+class FolioSecuencia(models.Model):
+    CIUDAD_REGISTRO = models.CharField(
+        choices=(("LAZARO", "LAZARO"), ("URUAPAN", "URUAPAN")),
+        max_length=15,
+        default="URUAPAN",
+        blank=False,
+    )
+
+    TIPO = models.CharField(
+        max_length=100,
+        choices=(
+            ("MOSTRADOR", "MOSTRADOR"),
+            ("RUTA", "RUTA"),
+            ("SALIDA_RUTA", "SALIDA_RUTA"),
+        ),
+    )
+
+    ULTIMO_FOLIO = models.IntegerField(default=0, validators=[MinValueValidator(0)])
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["CIUDAD_REGISTRO", "TIPO"], name="unique_folio_secuencia"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.CIUDAD_REGISTRO}, {self.TIPO}, {self.ULTIMO_FOLIO}"
+
+
+# Bloque de folios reservado por un usuario para registrar ventas sin conexion (ver reservar_folios)
+# Un folio enviado por un dispositivo solo es valido si cae en un bloque reservado por el mismo usuario
+class ReservaFolios(models.Model):
+    CIUDAD_REGISTRO = models.CharField(
+        choices=(("LAZARO", "LAZARO"), ("URUAPAN", "URUAPAN")),
+        max_length=15,
+        default="URUAPAN",
+        blank=False,
+    )
+
+    TIPO = models.CharField(
+        max_length=100,
+        choices=(
+            ("MOSTRADOR", "MOSTRADOR"),
+            ("RUTA", "RUTA"),
+        ),
+    )
+
+    PRIMER_FOLIO = models.IntegerField(validators=[MinValueValidator(1)])
+
+    ULTIMO_FOLIO = models.IntegerField(validators=[MinValueValidator(1)])
+
+    USUARIO = models.ForeignKey(User, on_delete=models.CASCADE, related_name="reservas_folios")
+
+    FECHA = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["USUARIO", "CIUDAD_REGISTRO", "TIPO", "PRIMER_FOLIO"],
+                name="reserva_folios_usuario",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.CIUDAD_REGISTRO}, {self.TIPO}, {self.PRIMER_FOLIO}-{self.ULTIMO_FOLIO}"
+
+
 class ProductoVenta(models.Model):
     VENTA = models.ForeignKey(
         Venta, on_delete=models.CASCADE, related_name="productos_venta"
@@ -317,6 +543,89 @@ class ProductoVenta(models.Model):
         return f"{self.VENTA}, {self.NOMBRE_PRODUCTO}"
 
 
+# Resumen diario de ventas para reportes y dashboards. La FECHA es el dia en horario de Mexico (America/Mexico_City)
+# Se actualiza al crear o modificar ventas y se puede reconstruir con el comando reconstruir_resumen_ventas
+class VentaResumenDiario(models.Model):
+    CIUDAD_REGISTRO = models.CharField(
+        choices=(("LAZARO", "LAZARO"), ("URUAPAN", "URUAPAN")),
+        max_length=15,
+        default="URUAPAN",
+        blank=False,
+    )
+
+    FECHA = models.DateField()
+
+    TIPO_VENTA = models.CharField(
+        max_length=100, choices=(("MOSTRADOR", "MOSTRADOR"), ("RUTA", "RUTA"))
+    )
+
+    TIPO_PAGO = models.CharField(
+        max_length=100,
+        choices=(
+            ("CONTADO", "CONTADO"),
+            ("CREDITO", "CREDITO"),
+            ("CORTESIA", "CORTESIA"),
+        ),
+    )
+
+    STATUS = models.CharField(
+        max_length=100,
+        choices=(
+            ("REALIZADO", "REALIZADO"),
+            ("PENDIENTE", "PENDIENTE"),
+            ("CANCELADO", "CANCELADO"),
+        ),
+    )
+
+    VENDEDOR = models.CharField(max_length=100)
+
+    MONTO = models.FloatField(default=0)
+
+    NUMERO_VENTAS = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=[
+                    "CIUDAD_REGISTRO",
+                    "FECHA",
+                    "TIPO_VENTA",
+                    "TIPO_PAGO",
+                    "STATUS",
+                    "VENDEDOR",
+                ],
+                name="unique_venta_resumen_diario",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.CIUDAD_REGISTRO}, {self.FECHA}, {self.STATUS}, {self.MONTO}"
+
+
+class ProductoVentaResumenDiario(models.Model):
+    RESUMEN = models.ForeignKey(
+        VentaResumenDiario, on_delete=models.CASCADE, related_name="productos_resumen"
+    )
+
+    PRODUCTO = models.ForeignKey(Producto, on_delete=models.SET_NULL, null=True)
+
+    # Igual que en ProductoVenta, el nombre se guarda por si el producto se elimina. Solo es la etiqueta, la fila se identifica por PRODUCTO
+    NOMBRE_PRODUCTO = models.CharField(max_length=200)
+
+    CANTIDAD = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["RESUMEN", "PRODUCTO"],
+                name="unique_producto_venta_resumen_diario",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.RESUMEN}, {self.NOMBRE_PRODUCTO}, {self.CANTIDAD}"
+
+
 # RUTA #################################################################################################################################
 class Ruta(models.Model):
     NOMBRE = models.CharField(max_length=100, unique=True)
@@ -427,6 +736,17 @@ class SalidaRuta(models.Model):
         null=True, blank=True, validators=[MinValueValidator(0)]
     )
 
+    # Contadores para saber si la salida ruta ya se completo sin leer todos sus clientes y productos (ver verificar_salida_ruta_completada)
+    # Las vistas que cambian el STATUS de un ClienteSalidaRuta o ProductoSalidaRuta los ajustan con F() en la misma transaccion
+    # Si quedan mal se recalculan con el comando recalcular_contadores_salida_ruta
+    CLIENTES_PENDIENTES = models.PositiveIntegerField(default=0, editable=False)
+    PRODUCTOS_CARGADOS = models.PositiveIntegerField(default=0, editable=False)
+
+    # ETag y Last-Modified de salida_ruta_detail y salida_ruta_resumen (ver utilis/condicional.py)
+    # Las vistas que modifican la salida ruta, sus productos o sus clientes llaman marcar_modificado
+    VERSION = models.PositiveIntegerField(default=0, editable=False)
+    MODIFICADO = models.DateTimeField(default=now, editable=False)
+
     class Meta:
         constraints = [
             models.UniqueConstraint(
@@ -434,6 +754,16 @@ class SalidaRuta(models.Model):
                 name="unique_folio_ciudad_salida_ruta",
             )
         ]
+        # Listas por ciudad y fecha, y busqueda de salidas activas de un repartidor
+        indexes = [
+            models.Index(
+                fields=["CIUDAD_REGISTRO", "FECHA"], name="salida_ruta_ciudad_fecha"
+            ),
+            models.Index(
+                fields=["REPARTIDOR", "STATUS", "FECHA"],
+                name="salida_ruta_repartidor",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.ATIENDE}, {self.REPARTIDOR_NOMBRE}"
@@ -7,9 +7,12 @@ from .models import (
     Cliente,
     Producto,
     AjusteInventario,
+    MovimientoInventario,
     PrecioCliente,
     Venta,
     ProductoVenta,
+    VentaResumenDiario,
+    ProductoVentaResumenDiario,
     # Ruta
     Ruta,
     RutaDia,
@@ -18,6 +21,12 @@ from .models import (
     SalidaRuta,
 )
 from django.contrib.auth.models import User
+from api.views.utilis.precios import (
+    formato_precio_cliente,
+    formato_precio_cliente_venta,
+    precios_completos,
+    precios_por_cliente,
+)
 
 # Empleados
 
@@ -75,6 +84,18 @@ class ProductoSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
+# Una fila del catalogo de productos (ver utilis/catalogo.py). Sin id el producto se busca por NOMBRE en la ciudad
+class ProductoCatalogoSerializer(serializers.Serializer):
+    id = serializers.IntegerField(required=False, allow_null=True)
+    NOMBRE = serializers.CharField(max_length=100)
+    PRECIO = serializers.FloatField(min_value=0, required=False, allow_null=True)
+    CANTIDAD = serializers.FloatField(min_value=0, required=False, allow_null=True)
+
+    def validate_NOMBRE(self, value):
+        # bulk_create y bulk_update no pasan por Producto.save, el nombre se guarda y se busca en mayusculas como ahi
+        return value.upper()
+
+
 class AjusteInventarioSerializer(serializers.ModelSerializer):
     class Meta:
         model = AjusteInventario
@@ -95,6 +116,12 @@ class AjusteInventarioReporteSerializer(AjusteInventarioSerializer):
         ]
 
 
+class MovimientoInventarioSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = MovimientoInventario
+        fields = "__all__"
+
+
 # Clientes
 
 
@@ -113,6 +140,13 @@ class BasePrecioClienteSerializer(serializers.ModelSerializer):
         model = PrecioCliente
         fields = "__all__"
 
+    def to_representation(self, instance):
+        # PRECIO siempre es el precio que paga el cliente (con DESCUENTO se calcula desde el precio publico actual)
+        data = super().to_representation(instance)
+        if "PRECIO" in data:
+            data["PRECIO"] = instance.precio_efectivo
+        return data
+
 
 class PrecioClienteSerializer(BasePrecioClienteSerializer):
     porcentage_precio = serializers.SerializerMethodField(read_only=True)
@@ -124,12 +158,13 @@ class PrecioClienteSerializer(BasePrecioClienteSerializer):
             "producto_imagen",
             "porcentage_precio",
             "PRECIO",
+            "DESCUENTO",
             "PRODUCTO",
         )
 
     def get_porcentage_precio(self, obj):
         precio_publico = obj.PRODUCTO.PRECIO or 1
-        precio_cliente = obj.PRECIO or 0
+        precio_cliente = obj.precio_efectivo or 0
 
         if precio_publico == 0:
             return "NO DISPONIBLE"
@@ -163,8 +198,53 @@ class RutaDiaSerializer(serializers.ModelSerializer):
 #         ]
 
 
+def _precios_cliente(serializer, cliente, formato):
+    # Solo los precios distintos al publico estan guardados (ver precios_completos). La vista carga los precios de todos
+    # los clientes de la pagina en el contexto. Sin contexto se cargan los del cliente
+    precios = serializer.context.get("precios_cliente")
+    if precios is None:
+        precios = precios_completos([cliente.id], cliente.CIUDAD_REGISTRO)
+
+    return [formato(fila) for fila in precios.get(cliente.id, [])]
+
+
+# Una fila de la importacion de clientes (ver utilis/importar_clientes.py). Mismos datos que recibe crear_cliente
+class PrecioClienteImportacionSerializer(serializers.Serializer):
+    # precioClienteId es el id del producto, igual que en crear_cliente
+    precioClienteId = serializers.IntegerField()
+    nuevoPrecioCliente = serializers.FloatField(min_value=0, required=False, allow_null=True)
+    nuevoDescuento = serializers.FloatField(
+        min_value=0, max_value=1, required=False, allow_null=True
+    )
+
+    def validate(self, attrs):
+        if attrs.get("nuevoPrecioCliente") is None and attrs.get("nuevoDescuento") is None:
+            raise serializers.ValidationError("Indica nuevoPrecioCliente o nuevoDescuento")
+        return attrs
+
+
+class ClienteImportacionSerializer(serializers.ModelSerializer):
+    direccion = DireccionSerializer()
+    preciosCliente = PrecioClienteImportacionSerializer(many=True, required=False)
+    rutasIds = serializers.ListField(child=serializers.IntegerField(), required=False)
+
+    class Meta:
+        model = Cliente
+        fields = [
+            "NOMBRE",
+            "CONTACTO",
+            "TELEFONO",
+            "CORREO",
+            "TIPO_PAGO",
+            "OBSERVACIONES",
+            "direccion",
+            "preciosCliente",
+            "rutasIds",
+        ]
+
+
 class ClienteSerializer(serializers.ModelSerializer):
-    precios_cliente = PrecioClienteSerializer(many=True, read_only=True)
+    precios_cliente = serializers.SerializerMethodField()
 
     DIRECCION = DireccionSerializer(required=False)
 
@@ -174,6 +254,9 @@ class ClienteSerializer(serializers.ModelSerializer):
         model = Cliente
         fields = "__all__"
 
+    def get_precios_cliente(self, obj):
+        return _precios_cliente(self, obj, formato_precio_cliente)
+
 
 # Esto se usa al momento de generar una salida ruta
 # Este serializador me permite seleccionar a los clientes y sus respectivas rutas dia
@@ -207,13 +290,16 @@ class PrecioClienteVentaSerializer(BasePrecioClienteSerializer):
 
 
 class ClienteVentaSerializer(serializers.ModelSerializer):
-    precios_cliente = PrecioClienteVentaSerializer(many=True, read_only=True)
+    precios_cliente = serializers.SerializerMethodField()
 
     class Meta:
         model = Cliente
 
         fields = ("id", "precios_cliente", "NOMBRE", "CIUDAD_REGISTRO", "TIPO_PAGO" )
 
+    def get_precios_cliente(self, obj):
+        return _precios_cliente(self, obj, formato_precio_cliente_venta)
+
 
 # Venta
 
@@ -257,6 +343,29 @@ class VentaReporteSerializer(BaseVentaSerializer):
         ]
 
 
+class ProductoVentaResumenDiarioSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ProductoVentaResumenDiario
+        fields = ["PRODUCTO", "NOMBRE_PRODUCTO", "CANTIDAD"]
+
+
+class VentaResumenDiarioSerializer(serializers.ModelSerializer):
+    productos_resumen = ProductoVentaResumenDiarioSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = VentaResumenDiario
+        fields = [
+            "FECHA",
+            "TIPO_VENTA",
+            "TIPO_PAGO",
+            "STATUS",
+            "VENDEDOR",
+            "MONTO",
+            "NUMERO_VENTAS",
+            "productos_resumen",
+        ]
+
+
 # Ruta
 
 
@@ -341,23 +450,13 @@ class ClienteSalidaRutaSerializer(serializers.ModelSerializer):
 
     # Asi accedo a los atributos de un hermano desde el serializador
     def get_precios_cliente(self, obj):
-        precios_cliente = []
         # PrecioCliente es hermano de ClienteSalida porque los dos son hijos de Cliente
+        # La vista carga los precios de todos los clientes de la salida ruta en un solo query y los pasa en el contexto
+        precios = self.context.get("precios_por_cliente")
+        if precios is None:
+            precios = precios_por_cliente([obj.CLIENTE_RUTA_id])
 
-        # Dame todos las instancias de PrecioCliente que son hijas de mi papa (Cliente)
-        for precio in PrecioCliente.objects.filter(CLIENTE=obj.CLIENTE_RUTA):
-            # Serializar a mi hermano
-            serializer = PrecioClienteSerializer(precio)
-            # Usa la informacion en mi hermano serializado para crear un objeto y agregarlo a precios_cliente
-            precios_cliente.append(
-                {
-                    "precio": serializer.data["PRECIO"],
-                    "producto_nombre": serializer.data["producto_nombre"],
-                    "productoId": serializer.data["PRODUCTO"],
-                    "producto_imagen": serializer.data["producto_imagen"],
-                }
-            )
-        return precios_cliente
+        return precios.get(obj.CLIENTE_RUTA_id, [])
 
 # I should use prefetch related for clients and products
 class SalidaRutaSerializer(serializers.ModelSerializer):
@@ -1,12 +1,38 @@
 from django.dispatch import receiver
-from django.db.models.signals import pre_delete, pre_save, post_save, post_delete
+from django.db.models.signals import (
+    pre_delete,
+    pre_save,
+    post_save,
+    post_delete,
+    m2m_changed,
+)
 import os
 from django.core.files.storage import default_storage
 from django.core.files import File
 
-from .models import Producto, Empleado, Ruta, RutaDia, Cliente, Venta
+from .models import (
+    Producto,
+    Empleado,
+    Ruta,
+    RutaDia,
+    Cliente,
+    PrecioCliente,
+    Venta,
+    SalidaRuta,
+    AjusteInventario,
+    DevolucionSalidaRuta,
+)
 from django.contrib.auth.models import User
 from django.core.cache import cache
+from api.views.utilis.general import cache_key_empleado
+from api.views.utilis.cache_ciudad import (
+    ETIQUETA_CLIENTES,
+    ETIQUETA_PRECIOS,
+    ETIQUETA_PRODUCTOS,
+    ETIQUETA_RUTAS,
+    invalidar_etiquetas,
+)
+from api.views.utilis.busqueda import CAMPOS_TEXTO, desindexar, indexar
 
 
 @receiver(pre_delete, sender=Producto)
@@ -65,6 +91,14 @@ def set_default_employee_image(sender, instance, **kwargs):
         instance.IMAGEN.save("usuario_default.png", File(default_image), save=False)
 
 
+# La ciudad y el rol del empleado se guardan en cache (ver obtener_empleado_cache)
+@receiver(post_save, sender=Empleado)
+@receiver(post_delete, sender=Empleado)
+def invalidate_empleado_cache(sender, instance, **kwargs):
+    if instance.USUARIO_id:
+        cache.delete(cache_key_empleado(instance.USUARIO_id))
+
+
 @receiver(post_save, sender=User)
 def create_empleado(sender, instance, created, **kwargs):
     if created:
@@ -104,43 +138,93 @@ def create_rutadia(sender, instance, created, **kwargs):
             )
 
 
-# Generalized invalidate cache function
-def invalidate_cliente_cache(sender, **kwargs):
-    # Get all the keys related to clients
-    cliente_cache_keys = cache.get("cliente_cache_keys", [])
-    for key in cliente_cache_keys:
-        cache.delete(key)
-    # Clear the set after deleting all cache items
-    cache.set("cliente_cache_keys", [])
-
-
-# Connect the invalidate_cache function to post_save and post_delete signals of multiple models
-# Product: I need to update clients's prices (e.g., the product name )
-# RutaDia: I need to update RutaDia
-for model in [Cliente, Producto, RutaDia]:
-    post_save.connect(invalidate_cliente_cache, sender=model)
-    post_delete.connect(invalidate_cliente_cache, sender=model)
-
-
-# Delete cache venta reporte when Venta instance is modified
-@receiver(post_save, sender=Venta)  # When a venta is created
-# @receiver(post_delete, sender=Venta) Venta is never deleted
-def invalidate_venta_cache(sender, **kwargs):
-    # Get all the keys related to clients
-    venta_cache_keys = cache.get("venta_cache_keys", [])
-    for key in venta_cache_keys:
-        cache.delete(key)
-    # Optionally, you can also clear the set after deleting all cache items
-    cache.set("venta_cache_keys", [])
-
-
-# Delete cache venta reporte when Venta instance is modified
-@receiver(post_save, sender=Venta)  # When a venta is created
-# @receiver(post_delete, sender=Venta) Venta is never deleted
-def invalidate_venta_reporte_cache(sender, **kwargs):
-    # Get all the keys related to clients
-    venta_reporte_cache_keys = cache.get("venta_reporte_cache_keys", [])
-    for key in venta_reporte_cache_keys:
-        cache.delete(key)
-    # Optionally, you can also clear the set after deleting all cache items
-    cache.set("venta_reporte_cache_keys", [])
+# Cache por etiquetas (ver api/views/utilis/cache_ciudad.py). Cada cambio incrementa la version de la etiqueta en la ciudad del objeto
+# Las actualizaciones con bulk_update o update() no disparan señales, en esos casos la vista invalida la etiqueta directamente
+def _ciudad_ruta_dia(ruta_dia):
+    try:
+        return ruta_dia.RUTA.CIUDAD_REGISTRO
+    except Ruta.DoesNotExist:
+        # Sin ruta no se conoce la ciudad, se invalida en todas
+        return None
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+def invalidate_producto_cache(sender, instance, **kwargs):
+    # El nombre y la imagen del producto tambien aparecen en los precios de los clientes
+    invalidar_etiquetas(
+        instance.CIUDAD_REGISTRO, ETIQUETA_PRODUCTOS, ETIQUETA_PRECIOS
+    )
+
+
+@receiver(post_save, sender=Ruta)
+@receiver(post_delete, sender=Ruta)
+def invalidate_ruta_cache(sender, instance, **kwargs):
+    invalidar_etiquetas(instance.CIUDAD_REGISTRO, ETIQUETA_RUTAS)
+
+
+@receiver(post_save, sender=RutaDia)
+@receiver(post_delete, sender=RutaDia)
+def invalidate_ruta_dia_cache(sender, instance, **kwargs):
+    # Al eliminar una ruta dia tambien se eliminan sus clientes (Cliente.RUTAS) sin disparar m2m_changed
+    invalidar_etiquetas(_ciudad_ruta_dia(instance), ETIQUETA_RUTAS, ETIQUETA_CLIENTES)
+
+
+@receiver(post_delete, sender=Empleado)
+def invalidate_repartidor_cache(sender, instance, **kwargs):
+    # Las rutas y rutas dia del repartidor quedan con REPARTIDOR en null (SET_NULL no dispara post_save)
+    invalidar_etiquetas(instance.CIUDAD_REGISTRO, ETIQUETA_RUTAS)
+
+
+@receiver(post_save, sender=Cliente)
+@receiver(post_delete, sender=Cliente)
+def invalidate_cliente_cache(sender, instance, **kwargs):
+    invalidar_etiquetas(instance.CIUDAD_REGISTRO, ETIQUETA_CLIENTES, ETIQUETA_PRECIOS)
+
+
+@receiver(m2m_changed, sender=Cliente.RUTAS.through)
+def invalidate_cliente_rutas_cache(sender, instance, action, **kwargs):
+    if action not in ["post_add", "post_remove", "post_clear"]:
+        return
+
+    # instance es un Cliente o una RutaDia dependiendo del lado desde el que se modifico la relacion
+    if isinstance(instance, Cliente):
+        ciudad_registro = instance.CIUDAD_REGISTRO
+    else:
+        ciudad_registro = _ciudad_ruta_dia(instance)
+
+    invalidar_etiquetas(ciudad_registro, ETIQUETA_CLIENTES)
+
+
+@receiver(post_save, sender=PrecioCliente)
+@receiver(post_delete, sender=PrecioCliente)
+def invalidate_precio_cliente_cache(sender, instance, **kwargs):
+    try:
+        ciudad_registro = instance.CLIENTE.CIUDAD_REGISTRO
+    except Cliente.DoesNotExist:
+        ciudad_registro = None
+
+    invalidar_etiquetas(ciudad_registro, ETIQUETA_PRECIOS)
+
+
+# Indice de busqueda de texto (ver api/views/utilis/busqueda.py). Las altas con bulk_create deben llamar a indexar directamente
+@receiver(post_save, sender=Venta)
+@receiver(post_save, sender=SalidaRuta)
+@receiver(post_save, sender=AjusteInventario)
+@receiver(post_save, sender=DevolucionSalidaRuta)
+@receiver(post_save, sender=Cliente)
+def indexar_busqueda(sender, instance, created, update_fields=None, **kwargs):
+    # Un save con update_fields que no incluye campos de texto (por ejemplo el STATUS de una salida ruta) no cambia el indice
+    if update_fields is not None and not set(update_fields) & set(CAMPOS_TEXTO[sender.__name__]):
+        return
+
+    indexar([instance], nuevas=created)
+
+
+@receiver(post_delete, sender=Venta)
+@receiver(post_delete, sender=SalidaRuta)
+@receiver(post_delete, sender=AjusteInventario)
+@receiver(post_delete, sender=DevolucionSalidaRuta)
+@receiver(post_delete, sender=Cliente)
+def desindexar_busqueda(sender, instance, **kwargs):
+    desindexar(sender.__name__, [instance.pk])
@@ -1,3 +1,815 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api.metricas import PresupuestoExcedido, verificar_presupuesto
+from api.models import (
+    Cliente,
+    ClienteSalidaRuta,
+    Direccion,
+    MovimientoInventario,
+    PrecioCliente,
+    Producto,
+    ProductoSalidaRuta,
+    ProductoVentaResumenDiario,
+    Ruta,
+    SalidaRuta,
+    Venta,
+)
+from api.views.utilis.folios import errores_folios_enviados, formatear_folio, numero_folio
+from api.views.utilis.inventario import StockInsuficiente, mover_stock
+from api.views.utilis.resumen_ventas import fecha_resumen, reconstruir_resumen_ventas
+from api.views.utilis.salida_ruta import ajustar_contadores
+from api.views.utilis.sugerencias_clientes import TIEMPO_INDICE_LOCAL, _indices
+
+
+class PruebaApi(TestCase):
+    # Las imagenes por defecto de productos y empleados se copian a una carpeta temporal y no a media/
+    @classmethod
+    def setUpClass(cls):
+        cls.carpeta_media = tempfile.mkdtemp()
+        shutil.copytree(
+            os.path.join(settings.MEDIA_ROOT, "imagenes", "default"),
+            os.path.join(cls.carpeta_media, "imagenes", "default"),
+        )
+        cls.media = override_settings(MEDIA_ROOT=cls.carpeta_media)
+        cls.media.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media.disable()
+        shutil.rmtree(cls.carpeta_media, ignore_errors=True)
+
+    def setUp(self):
+        # Las versiones de las etiquetas y los empleados en cache no se deshacen con la transaccion de cada prueba
+        cache.clear()
+        self.client = self.login("admin_urp", "ADMINISTRADOR", "URUAPAN")
+
+        self.producto = Producto.objects.create(
+            NOMBRE="HIELO", CANTIDAD=100, PRECIO=10, CIUDAD_REGISTRO="URUAPAN"
+        )
+        self.producto_agua = Producto.objects.create(
+            NOMBRE="AGUA", CANTIDAD=100, PRECIO=5, CIUDAD_REGISTRO="URUAPAN"
+        )
+        self.cliente = Cliente.objects.create(
+            NOMBRE="ANA",
+            TELEFONO="1",
+            TIPO_PAGO="EFECTIVO",
+            CIUDAD_REGISTRO="URUAPAN",
+            DIRECCION=Direccion.objects.create(CALLE="A", NUMERO="1", CIUDAD="URUAPAN"),
+        )
+        self.cliente_bob = Cliente.objects.create(
+            NOMBRE="BOB", TELEFONO="2", TIPO_PAGO="EFECTIVO", CIUDAD_REGISTRO="URUAPAN"
+        )
+
+    def login(self, username, role, ciudad_registro):
+        usuario = User.objects.create_user(username=username, password="x")
+        usuario.empleado.ROLE = role
+        usuario.empleado.CIUDAD_REGISTRO = ciudad_registro
+        usuario.empleado.save()
+        self.usuario = usuario
+
+        client = APIClient()
+        response = client.post(
+            "/api/token/", {"username": username, "password": "x"}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        client.credentials(HTTP_AUTHORIZATION="Bearer " + response.data["access"])
+        return client
+
+    def crear_salida_ruta(self):
+        response = self.client.post(
+            "/api/crear-salida-ruta/",
+            {
+                "ATIENDE": "CAJERO",
+                "REPARTIDOR_NOMBRE": "REPARTIDOR",
+                "STATUS": "PENDIENTE",
+                "OBSERVACIONES": "",
+                "salidaRutaProductos": [
+                    {"productoId": self.producto.id, "cantidadSalidaRuta": 5},
+                    {"productoId": self.producto_agua.id, "cantidadSalidaRuta": 5},
+                ],
+                "salidaRutaClientes": [
+                    {"clienteId": self.cliente.id},
+                    {"clienteId": self.cliente_bob.id},
+                ],
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        return SalidaRuta.objects.latest("id")
+
+    def venta_ruta(self, **campos):
+        return {
+            "CLIENTE": self.cliente.id,
+            "NOMBRE_CLIENTE": "ANA",
+            "VENDEDOR": "REPARTIDOR",
+            "TIPO_VENTA": "RUTA",
+            "TIPO_PAGO": "CONTADO",
+            "STATUS": "REALIZADO",
+            "MONTO": 20,
+            "DESCUENTO": 0,
+            "OBSERVACIONES": "",
+            "productosVenta": [
+                {"PRODUCTO_RUTA": self.producto.id, "cantidadVenta": 2, "precioVenta": 10}
+            ],
+            **campos,
+        }
+
+    def venta_mostrador(self):
+        return {
+            "CLIENTE": self.cliente.id,
+            "NOMBRE_CLIENTE": "ANA",
+            "VENDEDOR": "CAJERO",
+            "TIPO_VENTA": "MOSTRADOR",
+            "TIPO_PAGO": "CONTADO",
+            "STATUS": "REALIZADO",
+            "MONTO": 15,
+            "DESCUENTO": 0,
+            "OBSERVACIONES": "",
+            "productosVenta": [
+                {"productoId": self.producto.id, "cantidadVenta": 1, "precioVenta": 10},
+                {"productoId": self.producto_agua.id, "cantidadVenta": 1, "precioVenta": 5},
+            ],
+        }
+
+
+class AutenticacionTests(PruebaApi):
+    # La ciudad y el rol del token deben coincidir con el empleado actual
+
+    def test_token_valido(self):
+        self.assertEqual(self.client.get("/api/productos/").status_code, 200)
+
+    def test_cambio_de_ciudad_invalida_el_token(self):
+        self.usuario.empleado.CIUDAD_REGISTRO = "LAZARO"
+        self.usuario.empleado.save()
+
+        response = self.client.get("/api/productos/")
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.data["code"], "token_desactualizado")
+
+    def test_cambio_de_rol_invalida_el_token(self):
+        self.usuario.empleado.ROLE = "REPARTIDOR"
+        self.usuario.empleado.save()
+
+        self.assertEqual(self.client.get("/api/productos/").status_code, 401)
+
+
+class EtagTests(PruebaApi):
+    # Cada vista que modifica datos debe cambiar el ETag de las vistas que los muestran
+    # Las etiquetas de cache se invalidan despues del commit, captureOnCommitCallbacks ejecuta esos callbacks dentro de la prueba
+
+    def assertEtagCambia(self, url, mutar, status_mutacion=200):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = mutar()
+        self.assertEqual(response.status_code, status_mutacion, response.data)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_crear_venta_salida_ruta(self):
+        salida_ruta = self.crear_salida_ruta()
+        self.assertEtagCambia(
+            f"/api/salida-rutas-acciones/{salida_ruta.id}/",
+            lambda: self.client.post(
+                f"/api/crear-venta-salida-ruta/{salida_ruta.id}/",
+                self.venta_ruta(),
+                format="json",
+            ),
+            201,
+        )
+
+    def test_crear_ventas_salida_ruta(self):
+        salida_ruta = self.crear_salida_ruta()
+        self.assertEtagCambia(
+            f"/api/salida-rutas-resumen/{salida_ruta.id}/",
+            lambda: self.client.post(
+                f"/api/crear-ventas-salida-ruta/{salida_ruta.id}/",
+                {"ventas": [self.venta_ruta(CLAVE_IDEMPOTENCIA="venta-1")]},
+                format="json",
+            ),
+            201,
+        )
+
+    def test_devolver_producto_salida_ruta(self):
+        salida_ruta = self.crear_salida_ruta()
+        producto_salida_ruta = ProductoSalidaRuta.objects.get(
+            SALIDA_RUTA=salida_ruta, PRODUCTO_RUTA=self.producto_agua
+        )
+        self.assertEtagCambia(
+            f"/api/salida-rutas-acciones/{salida_ruta.id}/",
+            lambda: self.client.post(
+                f"/api/devolver-producto-salida-ruta/{salida_ruta.id}/",
+                {
+                    "REPARTIDOR": "REPARTIDOR",
+                    "ATIENDE": "CAJERO",
+                    "SALIDA_RUTA": salida_ruta.id,
+                    "PRODUCTO_DEVOLUCION": self.producto_agua.id,
+                    "PRODUCTO_SALIDA_RUTA": producto_salida_ruta.id,
+                    "CANTIDAD_DEVOLUCION": 1,
+                    "STATUS": "PENDIENTE",
+                    "PRODUCTO_NOMBRE": "AGUA",
+                },
+                format="json",
+            ),
+        )
+
+    def test_realizar_aviso_visita(self):
+        salida_ruta = self.crear_salida_ruta()
+        cliente_salida_ruta = ClienteSalidaRuta.objects.get(
+            SALIDA_RUTA=salida_ruta, CLIENTE_RUTA=self.cliente_bob
+        )
+        self.assertEtagCambia(
+            f"/api/salida-rutas-resumen/{salida_ruta.id}/",
+            lambda: self.client.put(
+                f"/api/realizar-aviso-visita/{salida_ruta.id}/",
+                {"CLIENTE_SALIDA_RUTA": cliente_salida_ruta.id},
+                format="json",
+            ),
+        )
+
+    def test_realizar_recarga_salida_ruta(self):
+        salida_ruta = self.crear_salida_ruta()
+        self.assertEtagCambia(
+            f"/api/salida-rutas-acciones/{salida_ruta.id}/",
+            lambda: self.client.put(
+                f"/api/realizar-recarga-salida-ruta/{salida_ruta.id}/",
+                {
+                    "PRODUCTO_RUTA": self.producto_agua.id,
+                    "CANTIDAD_RECARGA": 2,
+                    "CANTIDAD_DISPONIBLE": 7,
+                    "CANTIDAD_RUTA": 7,
+                    "STATUS": "CARGADO",
+                },
+                format="json",
+            ),
+        )
+
+    def test_cancelar_salida_ruta(self):
+        salida_ruta = self.crear_salida_ruta()
+        self.assertEtagCambia(
+            f"/api/salida-rutas-resumen/{salida_ruta.id}/",
+            lambda: self.client.put(f"/api/cancelar-salida-ruta/{salida_ruta.id}/"),
+        )
+
+    def test_cancelar_salidas_ruta(self):
+        salida_ruta = self.crear_salida_ruta()
+        self.assertEtagCambia(
+            f"/api/salida-rutas-resumen/{salida_ruta.id}/",
+            lambda: self.client.put(
+                "/api/cancelar-salidas-ruta/", {"salidas": [salida_ruta.id]}, format="json"
+            ),
+        )
+
+    def test_modificar_venta(self):
+        salida_ruta = self.crear_salida_ruta()
+        response = self.client.post(
+            f"/api/crear-venta-salida-ruta/{salida_ruta.id}/",
+            self.venta_ruta(),
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        venta = Venta.objects.latest("id")
+
+        self.assertEtagCambia(
+            f"/api/ventas/{venta.id}/",
+            lambda: self.client.put(
+                f"/api/modificar-venta/{venta.id}/", {"STATUS": "CANCELADO"}, format="json"
+            ),
+        )
+
+    @override_settings(CACHE_ETIQUETAS=True)
+    def test_modificar_producto(self):
+        self.assertEtagCambia(
+            "/api/productos/",
+            lambda: self.client.put(
+                f"/api/modificar-producto/{self.producto.id}/",
+                {"NOMBRE": "HIELO GRANDE", "PRECIO": 11},
+                format="json",
+            ),
+        )
+
+    @override_settings(CACHE_ETIQUETAS=True)
+    def test_modificar_producto_cambia_bundle(self):
+        # El ETag del paquete de sincronizacion sale de las versiones de las etiquetas, sin armar el paquete
+        salida_ruta = self.crear_salida_ruta()
+        self.assertEtagCambia(
+            f"/api/salida-rutas-bundle/{salida_ruta.id}/",
+            lambda: self.client.put(
+                f"/api/modificar-producto/{self.producto.id}/",
+                {"PRECIO": 12},
+                format="json",
+            ),
+        )
+
+    @override_settings(CACHE_ETIQUETAS=True)
+    def test_movimiento_de_stock_no_cambia_bundle(self):
+        # Las ventas mueven el stock del almacen, que el paquete no incluye
+        salida_ruta = self.crear_salida_ruta()
+        url = f"/api/salida-rutas-bundle/{salida_ruta.id}/"
+        etag = self.client.get(url)["ETag"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            mover_stock({self.producto.id: -1}, "VENTA", "prueba")
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    @override_settings(CACHE_ETIQUETAS=True)
+    def test_modificar_cliente(self):
+        self.assertEtagCambia(
+            f"/api/clientes/{self.cliente.id}/",
+            lambda: self.client.put(
+                f"/api/modificar-cliente/{self.cliente.id}/",
+                {
+                    "NOMBRE": "ANA",
+                    "TELEFONO": "3",
+                    "TIPO_PAGO": "EFECTIVO",
+                    "nuevosPreciosCliente": [
+                        {"productoId": self.producto.id, "nuevoPrecioCliente": 9}
+                    ],
+                    "nuevaDireccion": {
+                        "direccionClienteId": self.cliente.DIRECCION_id,
+                        "CALLE": "B",
+                    },
+                },
+                format="json",
+            ),
+        )
+
+    @override_settings(CACHE_ETIQUETAS=True)
+    def test_modificar_ruta(self):
+        ruta = Ruta.objects.create(
+            NOMBRE="NORTE",
+            REPARTIDOR=self.usuario.empleado,
+            REPARTIDOR_NOMBRE="REPARTIDOR",
+            CIUDAD_REGISTRO="URUAPAN",
+        )
+        self.assertEtagCambia(
+            "/api/rutas/",
+            lambda: self.client.put(
+                f"/api/modificar-ruta/{ruta.id}/",
+                {
+                    "NOMBRE": "SUR",
+                    "REPARTIDOR": self.usuario.empleado.id,
+                    "REPARTIDOR_NOMBRE": "REPARTIDOR",
+                    "CIUDAD_REGISTRO": "URUAPAN",
+                },
+                format="json",
+            ),
+        )
+
+
+class CatalogoTests(PruebaApi):
+    # importar-catalogo-productos: alta, actualizacion por id o por nombre y stock final registrado como EDICION
+
+    def importar(self, productos):
+        return self.client.post(
+            "/api/importar-catalogo-productos/", {"productos": productos}, format="json"
+        )
+
+    def test_crea_producto_en_mayusculas(self):
+        response = self.importar([{"NOMBRE": "Hielo 5kg", "PRECIO": 12, "CANTIDAD": 3}])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["creados"], 1)
+        producto = Producto.objects.get(NOMBRE="HIELO 5KG")
+        movimiento = MovimientoInventario.objects.get(PRODUCTO=producto)
+        self.assertEqual(
+            (movimiento.TIPO, movimiento.CANTIDAD, movimiento.CANTIDAD_RESULTANTE),
+            ("ALTA", 3, 3),
+        )
+
+    def test_actualiza_por_id(self):
+        response = self.importar(
+            [{"id": self.producto.id, "NOMBRE": "hielo chico", "PRECIO": 11}]
+        )
+
+        self.assertEqual(response.data["actualizados"], 1)
+        self.producto.refresh_from_db()
+        self.assertEqual((self.producto.NOMBRE, self.producto.PRECIO), ("HIELO CHICO", 11))
+
+    def test_coincide_por_nombre_sin_importar_mayusculas(self):
+        response = self.importar([{"NOMBRE": "Hielo", "PRECIO": 12}])
+
+        self.assertEqual((response.data["creados"], response.data["actualizados"]), (0, 1))
+        self.assertEqual(Producto.objects.filter(NOMBRE__iexact="hielo").count(), 1)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.PRECIO, 12)
+
+    def test_filas_repetidas(self):
+        response = self.importar(
+            [
+                {"id": self.producto.id, "NOMBRE": "HIELO", "PRECIO": 11},
+                {"NOMBRE": "hielo", "PRECIO": 13},
+                {"NOMBRE": "Garrafon", "PRECIO": 30},
+                {"NOMBRE": "GARRAFON", "PRECIO": 31},
+            ]
+        )
+
+        self.assertEqual((response.data["creados"], response.data["actualizados"]), (1, 1))
+        self.assertEqual([error["fila"] for error in response.data["errores"]], [2, 4])
+        self.assertEqual(Producto.objects.get(NOMBRE="GARRAFON").PRECIO, 30)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.PRECIO, 11)
+
+    def test_cantidad_se_registra_como_edicion(self):
+        response = self.importar(
+            [
+                {"id": self.producto.id, "NOMBRE": "HIELO", "CANTIDAD": 120},
+                {"id": self.producto_agua.id, "NOMBRE": "AGUA", "CANTIDAD": 90},
+            ]
+        )
+
+        self.assertEqual(response.data["actualizados"], 2)
+        movimientos = {
+            movimiento.PRODUCTO_id: movimiento
+            for movimiento in MovimientoInventario.objects.filter(TIPO="EDICION")
+        }
+        self.assertEqual(
+            (movimientos[self.producto.id].CANTIDAD, movimientos[self.producto.id].CANTIDAD_RESULTANTE),
+            (20, 120),
+        )
+        self.assertEqual(
+            (
+                movimientos[self.producto_agua.id].CANTIDAD,
+                movimientos[self.producto_agua.id].CANTIDAD_RESULTANTE,
+            ),
+            (-10, 90),
+        )
+        self.producto_agua.refresh_from_db()
+        self.assertEqual(self.producto_agua.CANTIDAD, 90)
+
+
+class InventarioTests(PruebaApi):
+    # mover_stock es el unico punto que modifica Producto.CANTIDAD y deja cada cambio en el kardex
+
+    def test_stock_insuficiente_no_aplica_ningun_cambio(self):
+        with self.assertRaises(StockInsuficiente) as contexto:
+            mover_stock({self.producto_agua.id: -1, self.producto.id: -101}, "VENTA", "prueba")
+
+        self.assertEqual(contexto.exception.productos, ["HIELO"])
+        self.assertEqual(
+            list(Producto.objects.order_by("id").values_list("CANTIDAD", flat=True)), [100, 100]
+        )
+        self.assertFalse(MovimientoInventario.objects.filter(REFERENCIA="prueba").exists())
+
+    def test_bloquea_los_productos_en_orden_de_id(self):
+        # Dos transacciones con los mismos productos en distinto orden no deben bloquearse mutuamente
+        with CaptureQueriesContext(connection) as queries:
+            mover_stock({self.producto_agua.id: -1, self.producto.id: -1}, "VENTA", "prueba")
+
+        lectura = next(query["sql"] for query in queries if query["sql"].startswith("SELECT") and "api_producto" in query["sql"])
+        self.assertIn('ORDER BY "api_producto"."id" ASC', lectura)
+
+    def test_kardex_con_la_cantidad_resultante(self):
+        mover_stock({self.producto.id: -10, self.producto_agua.id: 0}, "VENTA", "prueba")
+        mover_stock({self.producto.id: 4}, "DEVOLUCION", "prueba")
+        resultado = mover_stock({self.producto.id: -30}, "VENTA", "prueba")
+
+        self.assertEqual(resultado[self.producto.id], {"NOMBRE": "HIELO", "ANTES": 94, "DESPUES": 64})
+        movimientos = list(
+            MovimientoInventario.objects.filter(REFERENCIA="prueba")
+            .order_by("id")
+            .values_list("PRODUCTO", "TIPO", "CANTIDAD", "CANTIDAD_RESULTANTE")
+        )
+        # Un delta de 0 no genera movimiento
+        self.assertEqual(
+            movimientos,
+            [
+                (self.producto.id, "VENTA", -10, 90),
+                (self.producto.id, "DEVOLUCION", 4, 94),
+                (self.producto.id, "VENTA", -30, 64),
+            ],
+        )
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.CANTIDAD, movimientos[-1][3])
+
+
+class FoliosTests(PruebaApi):
+    # Los dispositivos de ruta reservan folios y despues los envian con sus ventas
+
+    def reservar(self, cantidad):
+        response = self.client.post(
+            "/api/reservar-folios/", {"TIPO": "RUTA", "CANTIDAD": cantidad}, format="json"
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data["folios"]
+
+    def test_reservar_folios(self):
+        primero, segundo = self.reservar(2)
+
+        self.assertTrue(primero.startswith("R-"))
+        self.assertEqual(numero_folio("RUTA", segundo), numero_folio("RUTA", primero) + 1)
+        # El siguiente bloque continua la secuencia
+        self.assertEqual(numero_folio("RUTA", self.reservar(1)[0]), numero_folio("RUTA", segundo) + 1)
+
+    def test_reservar_folios_datos_invalidos(self):
+        for datos in [{"TIPO": "RUTA", "CANTIDAD": 0}, {"TIPO": "RUTA", "CANTIDAD": 1001}, {"TIPO": "OTRO"}]:
+            response = self.client.post("/api/reservar-folios/", datos, format="json")
+            self.assertEqual(response.status_code, 400)
+
+    def test_folios_enviados(self):
+        (folio,) = self.reservar(1)
+        no_reservado = formatear_folio("RUTA", numero_folio("RUTA", folio) + 1)
+
+        errores = errores_folios_enviados("URUAPAN", "RUTA", {folio, "M-1", no_reservado}, self.usuario)
+
+        self.assertNotIn(folio, errores)
+        self.assertEqual(set(errores), {"M-1", no_reservado})
+        # El bloque es del usuario y de la ciudad que lo reservaron
+        otro_usuario = User.objects.create_user(username="otro", password="x")
+        self.assertIn(folio, errores_folios_enviados("URUAPAN", "RUTA", [folio], otro_usuario))
+        self.assertIn(folio, errores_folios_enviados("LAZARO", "RUTA", [folio], self.usuario))
+
+    def test_folio_usado_por_otra_venta(self):
+        (folio,) = self.reservar(1)
+        salida_ruta = self.crear_salida_ruta()
+        url = f"/api/crear-ventas-salida-ruta/{salida_ruta.id}/"
+
+        response = self.client.post(
+            url, {"ventas": [self.venta_ruta(CLAVE_IDEMPOTENCIA="venta-1", FOLIO=folio)]}, format="json"
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertIn(folio, errores_folios_enviados("URUAPAN", "RUTA", [folio], self.usuario))
+
+        response = self.client.post(
+            url, {"ventas": [self.venta_ruta(CLAVE_IDEMPOTENCIA="venta-2", FOLIO=folio)]}, format="json"
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("venta-2", response.data["errores"])
+
+
+class ModificarClienteTests(PruebaApi):
+    # modificar-cliente no descarta en silencio los precios que no corresponden a un producto
+
+    def test_precio_sin_producto_regresa_400(self):
+        response = self.client.put(
+            f"/api/modificar-cliente/{self.cliente.id}/",
+            {
+                "NOMBRE": "ANA",
+                "TELEFONO": "3",
+                "TIPO_PAGO": "EFECTIVO",
+                "nuevosPreciosCliente": [
+                    {"productoId": self.producto.id, "nuevoPrecioCliente": 9},
+                    {"nuevoPrecioCliente": 8},
+                    {"precioClienteId": 999999, "nuevoPrecioCliente": 7},
+                ],
+                "nuevaDireccion": {"direccionClienteId": self.cliente.DIRECCION_id, "CALLE": "B"},
+            },
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(response.data["nuevosPreciosCliente"]), 2)
+        # No se guarda ningun cambio
+        self.cliente.refresh_from_db()
+        self.assertNotEqual(self.cliente.TELEFONO, "3")
+        self.assertFalse(PrecioCliente.objects.filter(CLIENTE=self.cliente).exists())
+
+
+class SugerenciasClientesTests(PruebaApi):
+    # Sin una cache compartida el indice de sugerencias se reutiliza entre requests y se reconstruye con los cambios de este proceso
+
+    def setUp(self):
+        super().setUp()
+        _indices.clear()
+
+    def sugerencias(self, nombre):
+        response = self.client.get("/api/clientes-venta-sugerencias/", {"nombre": nombre})
+        self.assertEqual(response.status_code, 200)
+        return [cliente["NOMBRE"] for cliente in response.data]
+
+    @override_settings(CACHE_ETIQUETAS=False)
+    def test_indice_se_reutiliza_sin_cache_compartida(self):
+        self.assertEqual(self.sugerencias("an"), ["ANA"])
+        indice = _indices["URUAPAN"]
+
+        self.assertEqual(self.sugerencias("bo"), ["BOB"])
+        self.assertIs(_indices["URUAPAN"], indice)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Cliente.objects.create(
+                NOMBRE="ANDRES", TELEFONO="3", TIPO_PAGO="EFECTIVO", CIUDAD_REGISTRO="URUAPAN"
+            )
+        self.assertEqual(self.sugerencias("an"), ["ANA", "ANDRES"])
+
+    @override_settings(CACHE_ETIQUETAS=False)
+    def test_indice_expira_sin_cache_compartida(self):
+        self.sugerencias("an")
+        # Un cliente creado en otro proceso no cambia la version de la cache local
+        Cliente.objects.create(
+            NOMBRE="ANDRES", TELEFONO="3", TIPO_PAGO="EFECTIVO", CIUDAD_REGISTRO="URUAPAN"
+        )
+        self.assertEqual(self.sugerencias("an"), ["ANA"])
+
+        _indices["URUAPAN"]["construido"] -= TIEMPO_INDICE_LOCAL
+        self.assertEqual(self.sugerencias("an"), ["ANA", "ANDRES"])
+
+
+class VentasSalidaRutaTests(PruebaApi):
+    # crear-ventas-salida-ruta: la CLAVE_IDEMPOTENCIA es unica dentro de cada salida ruta
+
+    def enviar_lote(self, salida_ruta, *claves):
+        return self.client.post(
+            f"/api/crear-ventas-salida-ruta/{salida_ruta.id}/",
+            {"ventas": [self.venta_ruta(CLAVE_IDEMPOTENCIA=clave) for clave in claves]},
+            format="json",
+        )
+
+    def test_reenvio_regresa_duplicadas(self):
+        salida_ruta = self.crear_salida_ruta()
+        creada = self.enviar_lote(salida_ruta, "venta-1").data["creadas"][0]
+
+        response = self.enviar_lote(salida_ruta, "venta-1")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["creadas"], [])
+        self.assertEqual(response.data["duplicadas"], [creada])
+        self.assertEqual(Venta.objects.filter(CLAVE_IDEMPOTENCIA="venta-1").count(), 1)
+
+    def test_misma_clave_en_otra_salida_ruta(self):
+        salida_ruta = self.crear_salida_ruta()
+        otra_salida_ruta = self.crear_salida_ruta()
+        self.enviar_lote(salida_ruta, "venta-1")
+
+        response = self.enviar_lote(otra_salida_ruta, "venta-1")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data["creadas"]), 1)
+        self.assertEqual(response.data["duplicadas"], [])
+        self.assertEqual(
+            Venta.objects.get(pk=response.data["creadas"][0]["id"]).SALIDA_RUTA,
+            otra_salida_ruta,
+        )
+
+
+class CancelarSalidasRutaTests(PruebaApi):
+    # cancelar-salidas-ruta cancela solo las salidas ruta PENDIENTE de la ciudad y regresa sus productos al almacen
+
+    def test_cancela_varias_salidas(self):
+        primera = self.crear_salida_ruta()
+        segunda = self.crear_salida_ruta()
+        otra_ciudad = self.crear_salida_ruta()
+        SalidaRuta.objects.filter(pk=otra_ciudad.id).update(CIUDAD_REGISTRO="LAZARO")
+
+        response = self.client.put(
+            "/api/cancelar-salidas-ruta/",
+            {"salidas": [primera.id, segunda.id, otra_ciudad.id, 999999]},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual([salida["id"] for salida in response.data["canceladas"]], [primera.id, segunda.id])
+        self.assertEqual(response.data["no_canceladas"], [otra_ciudad.id, 999999])
+        self.assertEqual(
+            SalidaRuta.objects.get(pk=primera.id).STATUS, "CANCELADO"
+        )
+        self.assertEqual(SalidaRuta.objects.get(pk=otra_ciudad.id).STATUS, "PENDIENTE")
+        self.assertFalse(ProductoSalidaRuta.objects.filter(SALIDA_RUTA__in=[primera, segunda]).exists())
+
+        # Regresan las cantidades de las dos salidas, la tercera sigue fuera del almacen
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.CANTIDAD, 95)
+        # Un movimiento por salida y producto, con la cantidad resultante en el orden en que se aplicaron
+        movimientos = list(
+            MovimientoInventario.objects.filter(
+                TIPO="CANCELACION_SALIDA_RUTA", PRODUCTO=self.producto
+            ).order_by("id").values_list("REFERENCIA", "CANTIDAD", "CANTIDAD_RESULTANTE")
+        )
+        self.assertEqual(
+            movimientos,
+            [(f"SALIDA_RUTA:{primera.id}", 5, 90), (f"SALIDA_RUTA:{segunda.id}", 5, 95)],
+        )
+
+    def test_ninguna_pendiente(self):
+        salida_ruta = self.crear_salida_ruta()
+        SalidaRuta.objects.filter(pk=salida_ruta.id).update(STATUS="PROGRESO")
+
+        response = self.client.put(
+            "/api/cancelar-salidas-ruta/", {"salidas": [salida_ruta.id]}, format="json"
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(SalidaRuta.objects.get(pk=salida_ruta.id).STATUS, "PROGRESO")
+
+    def test_salidas_invalidas(self):
+        for datos in [{}, {"salidas": []}, {"salidas": ["x"]}]:
+            response = self.client.put("/api/cancelar-salidas-ruta/", datos, format="json")
+            self.assertEqual(response.status_code, 400)
+
+
+class ContadoresSalidaRutaTests(PruebaApi):
+    # Los contadores de la salida ruta nunca bajan de 0 aunque esten desfasados
+
+    def test_decremento_desfasado_no_baja_de_cero(self):
+        salida_ruta = self.crear_salida_ruta()
+        SalidaRuta.objects.filter(pk=salida_ruta.id).update(CLIENTES_PENDIENTES=0, PRODUCTOS_CARGADOS=1)
+
+        ajustar_contadores(salida_ruta.id, clientes_pendientes=-1, productos_cargados=-2)
+
+        salida_ruta.refresh_from_db()
+        self.assertEqual(salida_ruta.CLIENTES_PENDIENTES, 0)
+        self.assertEqual(salida_ruta.PRODUCTOS_CARGADOS, 0)
+
+
+class ResumenVentasTests(PruebaApi):
+    # Las filas de productos del resumen diario se identifican por PRODUCTO, el nombre solo es la etiqueta
+
+    def cantidades_resumen(self):
+        return sorted(ProductoVentaResumenDiario.objects.values_list("PRODUCTO", "CANTIDAD"))
+
+    def test_producto_renombrado_sigue_en_su_fila(self):
+        self.client.post("/api/crear-venta/", self.venta_mostrador(), format="json")
+        self.producto.NOMBRE = "HIELO GRANDE"
+        self.producto.save()
+        self.client.post("/api/crear-venta/", self.venta_mostrador(), format="json")
+
+        esperado = sorted([(self.producto.id, 2.0), (self.producto_agua.id, 2.0)])
+        self.assertEqual(self.cantidades_resumen(), esperado)
+
+        # Reconstruir desde las ventas da las mismas filas
+        hoy = fecha_resumen(timezone.now())
+        reconstruir_resumen_ventas(hoy, hoy)
+        self.assertEqual(self.cantidades_resumen(), esperado)
+
+    def test_productos_con_el_mismo_nombre_no_se_mezclan(self):
+        self.client.post("/api/crear-venta/", self.venta_mostrador(), format="json")
+        self.producto.NOMBRE = "HIELO VIEJO"
+        self.producto.save()
+        self.producto_agua.NOMBRE = "HIELO"
+        self.producto_agua.save()
+        self.client.post("/api/crear-venta/", self.venta_mostrador(), format="json")
+
+        self.assertEqual(
+            self.cantidades_resumen(),
+            sorted([(self.producto.id, 2.0), (self.producto_agua.id, 2.0)]),
+        )
+
+
+class PresupuestoQueriesTests(PruebaApi):
+    # Las vistas mas consultadas no deben pasar su presupuesto de PRESUPUESTOS_QUERIES (api/metricas.py)
+    # Con varias filas un query por fila pasaria el presupuesto
+
+    def test_crear_venta_y_venta_list(self):
+        # La primera venta del dia en la ciudad crea la secuencia de folios y el resumen del dia, no entra en el presupuesto
+        response = self.client.post("/api/crear-venta/", self.venta_mostrador(), format="json")
+        self.assertEqual(response.status_code, 201)
+
+        with verificar_presupuesto("crear_venta"):
+            for _ in range(3):
+                response = self.client.post(
+                    "/api/crear-venta/", self.venta_mostrador(), format="json"
+                )
+                self.assertEqual(response.status_code, 201)
+
+        with verificar_presupuesto("venta_list"):
+            response = self.client.get("/api/ventas/")
+        self.assertEqual(response.status_code, 200)
+
+    def test_crear_ventas_salida_ruta_y_salida_ruta_venta(self):
+        salida_ruta = self.crear_salida_ruta()
+        response = self.client.post(
+            f"/api/crear-ventas-salida-ruta/{salida_ruta.id}/",
+            {"ventas": [self.venta_ruta(CLAVE_IDEMPOTENCIA="venta-0")]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+
+        with verificar_presupuesto("crear_ventas_salida_ruta"):
+            response = self.client.post(
+                f"/api/crear-ventas-salida-ruta/{salida_ruta.id}/",
+                {
+                    "ventas": [
+                        self.venta_ruta(CLAVE_IDEMPOTENCIA=f"venta-{numero}")
+                        for numero in range(1, 4)
+                    ]
+                },
+                format="json",
+            )
+        self.assertEqual(response.status_code, 201)
+
+        with verificar_presupuesto("salida_ruta_venta"):
+            response = self.client.get(f"/api/salida-rutas-venta/{salida_ruta.id}/")
+        self.assertEqual(response.status_code, 200)
 
-# Create your tests here.
+    def test_presupuesto_excedido(self):
+        with self.assertRaises(PresupuestoExcedido):
+            with verificar_presupuesto("venta_list", maximo=0):
+                self.client.get("/api/ventas/")
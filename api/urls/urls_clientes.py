@@ -6,7 +6,13 @@ urlpatterns = [
     path(
         "clientes-venta/", views_clientes.cliente_venta_lista
     ),  # para realizar la venta necesitamos tener accesso a cualquier cliente, no solo los que se regresan en una pagina
+    # Sugerencias de clientes mientras se escribe el nombre en la venta
+    path("clientes-venta-sugerencias/", views_clientes.cliente_venta_sugerencias),
+    # Precios de todos los clientes de la ciudad (productos y clientes una sola vez)
+    path("precios-matriz/", views_clientes.precios_matriz),
     path("crear-cliente/", views_clientes.crear_cliente),
+    # Alta de muchos clientes con sus direcciones, precios y rutas dia
+    path("importar-clientes/", views_clientes.importar_clientes),
     path("clientes/<str:pk>/", views_clientes.cliente_detail),
     path("modificar-cliente/<str:pk>/", views_clientes.modificar_cliente),
     # Ruta
@@ -0,0 +1,7 @@
+from django.urls import path
+from api.views import views_inventario
+
+urlpatterns = [
+    path("movimientos-inventario/", views_inventario.movimiento_inventario_list),
+    path("inventario-fecha/", views_inventario.inventario_a_fecha),
+]
@@ -0,0 +1,7 @@
+from django.urls import path
+from api.views import views_metricas
+
+
+urlpatterns = [
+    path("metricas/", views_metricas.metricas),
+]
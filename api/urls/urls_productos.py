@@ -5,6 +5,11 @@ from api.views import views_productos
 urlpatterns = [
     path("productos/", views_productos.producto_list),
     path("crear-producto/", views_productos.crear_producto),
+    # Catalogo completo para exportar e importar muchos productos a la vez
+    path("catalogo-productos/", views_productos.catalogo_productos),
+    path(
+        "importar-catalogo-productos/", views_productos.importar_catalogo_productos
+    ),
     path("productos/<str:pk>/", views_productos.producto_detail),
     path("modificar-producto/<str:pk>/", views_productos.modificar_producto),
 ]
@@ -6,11 +6,17 @@ urlpatterns = [
     path("salida-rutas-acciones/<str:pk>/", views_salida_ruta.salida_ruta_detail),
     path("salida-rutas-resumen/<str:pk>/", views_salida_ruta.salida_ruta_resumen),
     path("salida-rutas-venta/<str:pk>/", views_salida_ruta.salida_ruta_venta),
+    path("salida-rutas-bundle/<str:pk>/", views_salida_ruta.salida_ruta_bundle),
     path("cancelar-salida-ruta/<str:pk>/", views_salida_ruta.cancelar_salida_ruta),
+    # Varias salidas ruta PENDIENTE a la vez, por ejemplo al final del dia
+    path("cancelar-salidas-ruta/", views_salida_ruta.cancelar_salidas_ruta),
     path("crear-salida-ruta/", views_salida_ruta.crear_salida_ruta),
     path(
         "crear-venta-salida-ruta/<str:pk>/", views_salida_ruta.crear_venta_salida_ruta
     ),
+    path(
+        "crear-ventas-salida-ruta/<str:pk>/", views_salida_ruta.crear_ventas_salida_ruta
+    ),
     path(
         "devolver-producto-salida-ruta/<str:pk>/",
         views_salida_ruta.devolver_producto_salida_ruta,
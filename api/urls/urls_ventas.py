@@ -6,7 +6,9 @@ urlpatterns = [
     path(
         "ventas-reporte/", views_ventas.venta_reporte_list
     ),  # para generar el reporte necesitamos todas las venta. no una sola pagina
+    path("ventas-resumen/", views_ventas.venta_resumen_list),
     path("crear-venta/", views_ventas.crear_venta),
+    path("reservar-folios/", views_ventas.reservar_folios),
     path("ventas/<str:pk>/", views_ventas.venta_detail),
     path("modificar-venta/<str:pk>/", views_ventas.modificar_venta),
 ]
@@ -0,0 +1,169 @@
+import sqlite3
+import unicodedata
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from api.models import IndiceBusqueda
+
+# Campos por los que se puede buscar (filtrarpor) en cada modelo. Cualquier otro campo se rechaza
+# Los campos de texto se buscan en IndiceBusqueda: texto normalizado con indice trigram (PostgreSQL) o FTS5 (SQLite)
+CAMPOS_TEXTO = {
+    "Venta": ["NOMBRE_CLIENTE", "VENDEDOR", "FOLIO", "OBSERVACIONES"],
+    "SalidaRuta": [
+        "ATIENDE",
+        "REPARTIDOR_NOMBRE",
+        "RUTA_NOMBRE",
+        "FOLIO",
+        "OBSERVACIONES",
+    ],
+    "AjusteInventario": [
+        "CAJERO",
+        "BODEGA",
+        "ADMINISTRADOR",
+        "PRODUCTO_NOMBRE",
+        "OBSERVACIONES",
+    ],
+    "DevolucionSalidaRuta": [
+        "REPARTIDOR",
+        "ATIENDE",
+        "ADMINISTRADOR",
+        "PRODUCTO_NOMBRE",
+        "OBSERVACIONES",
+    ],
+    "Cliente": ["NOMBRE", "CONTACTO", "TELEFONO", "CORREO", "OBSERVACIONES"],
+}
+
+# Los campos con opciones fijas tienen pocos valores distintos y algunos cambian con update(), se buscan directo en su columna
+CAMPOS_OPCIONES = {
+    "Venta": ["TIPO_VENTA", "TIPO_PAGO", "STATUS"],
+    "SalidaRuta": ["STATUS"],
+    "AjusteInventario": ["TIPO_AJUSTE", "STATUS"],
+    "DevolucionSalidaRuta": ["STATUS"],
+    "Cliente": ["TIPO_PAGO"],
+}
+
+# Tabla FTS5 (SQLite) sobre IndiceBusqueda.TEXTO. El tokenizador trigram encuentra cualquier subcadena de 3 o mas letras
+TABLA_FTS = "api_indicebusqueda_fts"
+MINIMO_TRIGRAM = 3
+
+
+class CampoBusquedaInvalido(Exception):
+    def __init__(self, campo):
+        self.campo = campo
+        super().__init__(f"No es posible buscar por {campo}")
+
+
+def normalizar(valor):
+    # Minusculas, sin acentos y con un solo espacio entre palabras: "José  Pérez" -> "jose perez"
+    texto = unicodedata.normalize("NFKD", str(valor))
+    texto = "".join(letra for letra in texto if not unicodedata.combining(letra))
+    return " ".join(texto.lower().split())
+
+
+def filas_indice(nombre_modelo, objetos):
+    # objetos: diccionarios con el id y los campos de texto del modelo. Los campos vacios no generan fila
+    filas = []
+    for objeto in objetos:
+        for campo in CAMPOS_TEXTO[nombre_modelo]:
+            texto = normalizar(objeto[campo]) if objeto[campo] is not None else ""
+            if texto:
+                filas.append(
+                    IndiceBusqueda(
+                        MODELO=nombre_modelo,
+                        CAMPO=campo,
+                        OBJETO_ID=objeto["id"],
+                        TEXTO=texto,
+                    )
+                )
+
+    return filas
+
+
+def indexar(instancias, nuevas=False):
+    # Reemplaza las filas del indice de varias instancias de un mismo modelo con un delete y un bulk_create
+    # Con nuevas=True no hay filas anteriores que borrar
+    if not instancias:
+        return
+
+    nombre_modelo = type(instancias[0]).__name__
+    campos = CAMPOS_TEXTO[nombre_modelo]
+    objetos = [
+        {"id": instancia.pk, **{campo: getattr(instancia, campo) for campo in campos}}
+        for instancia in instancias
+    ]
+
+    if not nuevas:
+        desindexar(nombre_modelo, [instancia.pk for instancia in instancias])
+
+    IndiceBusqueda.objects.bulk_create(filas_indice(nombre_modelo, objetos))
+
+
+def desindexar(nombre_modelo, ids):
+    IndiceBusqueda.objects.filter(MODELO=nombre_modelo, OBJETO_ID__in=ids).delete()
+
+
+def fts_disponible(conexion=connection):
+    # El tokenizador trigram de FTS5 existe desde SQLite 3.34
+    return conexion.vendor == "sqlite" and sqlite3.sqlite_version_info >= (3, 34, 0)
+
+
+def crear_tabla_fts(cursor):
+    # Tabla FTS5 de contenido externo: guarda solo el indice y lee el texto de api_indicebusqueda. Los triggers la mantienen al dia
+    cursor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA_FTS} USING fts5("
+        "TEXTO, content='api_indicebusqueda', content_rowid='id', tokenize='trigram')"
+    )
+    cursor.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {TABLA_FTS}_insert AFTER INSERT ON api_indicebusqueda BEGIN "
+        f"INSERT INTO {TABLA_FTS}(rowid, TEXTO) VALUES (new.id, new.TEXTO); END"
+    )
+    cursor.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {TABLA_FTS}_delete AFTER DELETE ON api_indicebusqueda BEGIN "
+        f"INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, TEXTO) VALUES ('delete', old.id, old.TEXTO); END"
+    )
+    cursor.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {TABLA_FTS}_update AFTER UPDATE ON api_indicebusqueda BEGIN "
+        f"INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, TEXTO) VALUES ('delete', old.id, old.TEXTO); "
+        f"INSERT INTO {TABLA_FTS}(rowid, TEXTO) VALUES (new.id, new.TEXTO); END"
+    )
+
+
+def ids_por_texto(nombre_modelo, campo, texto):
+    # Subconsulta con los ids de los objetos cuyo campo contiene el texto (ya normalizado)
+    if fts_disponible() and len(texto) >= MINIMO_TRIGRAM:
+        frase = '"' + texto.replace('"', '""') + '"'
+        # CROSS JOIN fija el orden en SQLite: primero las coincidencias del FTS y despues una busqueda por id para cada una
+        # Con un JOIN normal SQLite puede recorrer todo el MODELO en api_indicebusqueda y evaluar el MATCH fila por fila
+        return RawSQL(
+            f"SELECT indice.OBJETO_ID FROM {TABLA_FTS} "
+            f"CROSS JOIN api_indicebusqueda indice ON indice.id = {TABLA_FTS}.rowid "
+            f"WHERE {TABLA_FTS} MATCH %s AND indice.MODELO = %s AND indice.CAMPO = %s",
+            [frase, nombre_modelo, campo],
+        )
+
+    # PostgreSQL resuelve el LIKE '%texto%' con el indice GIN trigram. En SQLite los textos de 1 o 2 letras recorren el indice completo
+    return IndiceBusqueda.objects.filter(
+        MODELO=nombre_modelo, CAMPO=campo, TEXTO__contains=texto
+    ).values("OBJETO_ID")
+
+
+def filtro_busqueda(nombre_modelo, filtrar_por, buscar):
+    # Reemplaza Q(**{f"{filtrar_por}__icontains": buscar}) en las listas. Lanza CampoBusquedaInvalido si el campo no esta permitido
+    if not filtrar_por or not buscar:
+        return Q()
+
+    campo = filtrar_por.upper()
+
+    if campo in CAMPOS_OPCIONES[nombre_modelo]:
+        return Q(**{f"{campo}__icontains": buscar})
+
+    if campo not in CAMPOS_TEXTO[nombre_modelo]:
+        raise CampoBusquedaInvalido(filtrar_por)
+
+    texto = normalizar(buscar)
+    if not texto:
+        return Q()
+
+    return Q(id__in=ids_por_texto(nombre_modelo, campo, texto))
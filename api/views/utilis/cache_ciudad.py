@@ -0,0 +1,115 @@
+import functools
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+from api.views.utilis.general import obtener_ciudad_registro
+
+CIUDADES = ["LAZARO", "URUAPAN"]
+
+# Etiquetas de cache. Cada vista en cache depende de una o varias y cada ciudad tiene su propia version de cada etiqueta
+ETIQUETA_PRODUCTOS = "productos"
+ETIQUETA_RUTAS = "rutas"
+ETIQUETA_CLIENTES = "clientes"
+ETIQUETA_PRECIOS = "precios"
+
+TIEMPO_CACHE = 60 * 15
+
+
+def cache_etiquetas_activa():
+    # Con una cache por proceso una invalidacion en un worker no llega a los demas, ver CACHE_ETIQUETAS en settings.py
+    return settings.CACHE_ETIQUETAS
+
+
+def llave_etiqueta(etiqueta, ciudad_registro):
+    return f"tag:{etiqueta}:{ciudad_registro}"
+
+
+def llave_modificado(etiqueta, ciudad_registro):
+    return f"tag_modificado:{etiqueta}:{ciudad_registro}"
+
+
+def versiones_etiquetas(etiquetas, ciudad_registro):
+    llaves = [llave_etiqueta(etiqueta, ciudad_registro) for etiqueta in etiquetas]
+    versiones = cache.get_many(llaves)
+
+    faltantes = [llave for llave in llaves if llave not in versiones]
+    if faltantes:
+        # Una version basada en el tiempo siempre es mayor que cualquier version anterior, aunque la etiqueta se haya perdido (reinicio o desalojo)
+        for llave in faltantes:
+            cache.add(llave, time.time_ns(), None)
+        versiones = cache.get_many(llaves)
+
+    return [versiones.get(llave, 0) for llave in llaves]
+
+
+def modificado_etiquetas(etiquetas, ciudad_registro):
+    # Momento (timestamp) del ultimo cambio de cualquiera de las etiquetas, para el Last-Modified de las vistas condicionales
+    # Si se perdio la marca de una etiqueta se toma el momento actual, igual que una version nueva
+    llaves = [llave_modificado(etiqueta, ciudad_registro) for etiqueta in etiquetas]
+    marcas = cache.get_many(llaves)
+
+    faltantes = [llave for llave in llaves if llave not in marcas]
+    if faltantes:
+        for llave in faltantes:
+            cache.add(llave, time.time(), None)
+        marcas = cache.get_many(llaves)
+
+    return max(marcas.values(), default=time.time())
+
+
+def _incrementar_version(llave):
+    try:
+        # incr es atomico tanto en Redis como en memoria local
+        cache.incr(llave)
+    except ValueError:
+        cache.add(llave, time.time_ns(), None)
+
+
+def invalidar_etiquetas(ciudad_registro, *etiquetas):
+    # Las versiones se incrementan despues del commit para que ninguna vista guarde en cache datos de una transaccion sin terminar
+    ciudades = [ciudad_registro] if ciudad_registro else CIUDADES
+
+    def incrementar():
+        for ciudad in ciudades:
+            for etiqueta in etiquetas:
+                _incrementar_version(llave_etiqueta(etiqueta, ciudad))
+                cache.set(llave_modificado(etiqueta, ciudad), time.time(), None)
+
+    transaction.on_commit(incrementar)
+
+
+def cache_por_ciudad(*etiquetas, tiempo=TIEMPO_CACHE):
+    # Guarda en cache la respuesta de una vista GET por ciudad y parametros. Se usa debajo de @api_view
+    # Cuando cambia la version de cualquiera de las etiquetas la llave cambia y la respuesta anterior ya no se usa
+    def decorador(vista):
+        @functools.wraps(vista)
+        def envoltura(request, *args, **kwargs):
+            if not cache_etiquetas_activa():
+                return vista(request, *args, **kwargs)
+
+            ciudad_registro = obtener_ciudad_registro(request)
+            versiones = versiones_etiquetas(etiquetas, ciudad_registro)
+            huella = hashlib.md5(
+                f"{versiones}|{args}|{kwargs}|{request.get_full_path()}".encode()
+            ).hexdigest()
+            cache_key = f"vista:{vista.__name__}:{ciudad_registro}:{huella}"
+
+            cached_data = cache.get(cache_key)
+            if cached_data is not None:
+                return Response(cached_data, status=status.HTTP_200_OK)
+
+            response = vista(request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                cache.set(cache_key, response.data, tiempo)
+
+            return response
+
+        return envoltura
+
+    return decorador
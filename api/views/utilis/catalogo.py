@@ -0,0 +1,209 @@
+import csv
+import io
+import json
+
+from django.db import transaction
+from django.db.models import Q
+
+from api.models import MovimientoInventario, Producto
+from api.serializers import ProductoCatalogoSerializer
+from api.views.utilis.cache_ciudad import (
+    ETIQUETA_PRECIOS,
+    ETIQUETA_PRODUCTOS,
+    invalidar_etiquetas,
+)
+from api.views.utilis.general import copiar_imagen_producto_default
+from api.views.utilis.inventario import mover_stock, registrar_movimientos
+
+# Catalogo de productos de una ciudad: se exporta, se edita (por ejemplo en una hoja de calculo) y se importa de nuevo
+# Cada fila actualiza el producto con su id, o si no tiene id el producto de la ciudad con el mismo NOMBRE, o crea uno nuevo
+# Las filas se aplican por bloques, cada bloque en su propia transaccion con un query para leer los productos, un bulk_update,
+# un bulk_create y el cambio de stock por mover_stock
+# Los precios de los clientes no se tocan: los que tienen DESCUENTO se calculan desde el PRECIO publico y los precios fijos no cambian
+
+CAMPOS_CATALOGO = ["id", "NOMBRE", "PRECIO", "CANTIDAD"]
+
+FORMATOS_CATALOGO = ["csv", "json", "ndjson"]
+
+TAMANO_BLOQUE_CATALOGO = 500
+
+
+class CatalogoInvalido(Exception):
+    pass
+
+
+def leer_catalogo(contenido, formato):
+    # contenido es el texto del archivo. Regresa una lista de diccionarios, una por fila
+    contenido = contenido.lstrip("﻿")
+
+    if formato == "csv":
+        lector = csv.DictReader(io.StringIO(contenido))
+        if not lector.fieldnames or "NOMBRE" not in lector.fieldnames:
+            raise CatalogoInvalido("El CSV debe tener encabezados con al menos la columna NOMBRE")
+        # Una celda vacia es un campo sin valor (por ejemplo un producto nuevo sin id)
+        return [
+            {
+                campo: valor
+                for campo, valor in fila.items()
+                if campo in CAMPOS_CATALOGO and valor not in ("", None)
+            }
+            for fila in lector
+        ]
+
+    try:
+        return leer_filas_json(contenido, formato, "productos")
+    except ValueError:
+        raise CatalogoInvalido("El catalogo debe ser una lista de productos en JSON")
+
+
+def leer_filas_json(contenido, formato, llave):
+    # JSON (una lista o un objeto con la lista en llave) o NDJSON (un objeto por linea). Lanza ValueError si no es una lista de objetos
+    if formato == "ndjson":
+        filas = [json.loads(linea) for linea in contenido.splitlines() if linea.strip()]
+    else:
+        filas = json.loads(contenido)
+        if isinstance(filas, dict):
+            filas = filas.get(llave)
+
+    if not isinstance(filas, list) or not all(isinstance(fila, dict) for fila in filas):
+        raise ValueError("Se esperaba una lista de objetos")
+
+    return filas
+
+
+def importar_catalogo(filas, ciudad_registro, tamano_bloque=TAMANO_BLOQUE_CATALOGO):
+    # Regresa cuantos productos se crearon, se actualizaron y no cambiaron, y los errores por numero de fila (empezando en 1)
+    # Las filas con errores se omiten, el resto se importa
+    resultado = {"creados": 0, "actualizados": 0, "sin_cambios": 0, "errores": []}
+
+    validas = []
+    for numero, fila in enumerate(filas, start=1):
+        serializer = ProductoCatalogoSerializer(data=fila)
+        if serializer.is_valid():
+            validas.append((numero, serializer.validated_data))
+        else:
+            resultado["errores"].append({"fila": numero, "errores": serializer.errors})
+
+    # Ids de los productos y nombres de los productos nuevos ya importados, un producto solo puede aparecer una vez
+    procesados = set()
+    for inicio in range(0, len(validas), tamano_bloque):
+        _importar_bloque(
+            validas[inicio : inicio + tamano_bloque],
+            ciudad_registro,
+            resultado,
+            procesados,
+        )
+
+    if resultado["creados"] or resultado["actualizados"]:
+        invalidar_etiquetas(ciudad_registro, ETIQUETA_PRODUCTOS, ETIQUETA_PRECIOS)
+
+    resultado["errores"].sort(key=lambda error: error["fila"])
+    return resultado
+
+
+@transaction.atomic
+def _importar_bloque(filas, ciudad_registro, resultado, procesados):
+    def error(numero, errores):
+        resultado["errores"].append({"fila": numero, "errores": errores})
+
+    ids = [datos["id"] for _, datos in filas if datos.get("id")]
+    nombres = [datos["NOMBRE"] for _, datos in filas if not datos.get("id")]
+
+    # Los productos del bloque se bloquean en orden de id, igual que en mover_stock
+    existentes = list(
+        Producto.objects.select_for_update()
+        .filter(Q(id__in=ids) | Q(NOMBRE__in=nombres), CIUDAD_REGISTRO=ciudad_registro)
+        .order_by("id")
+        .only("id", "NOMBRE", "PRECIO", "CANTIDAD", "CIUDAD_REGISTRO")
+    )
+    por_id = {producto.id: producto for producto in existentes}
+    por_nombre = {}
+    for producto in existentes:
+        por_nombre.setdefault(producto.NOMBRE, []).append(producto)
+
+    nuevos = []
+    modificados = []
+    cantidades = {}
+    for numero, datos in filas:
+        if datos.get("id"):
+            producto = por_id.get(datos["id"])
+            if producto is None:
+                error(numero, {"id": ["El producto con el id dado no existe en la ciudad"]})
+                continue
+        else:
+            coincidencias = por_nombre.get(datos["NOMBRE"], [])
+            if len(coincidencias) > 1:
+                error(
+                    numero,
+                    {"NOMBRE": ["Hay varios productos con este nombre, indica el id"]},
+                )
+                continue
+            producto = coincidencias[0] if coincidencias else None
+
+        llave = producto.id if producto else datos["NOMBRE"]
+        if llave in procesados:
+            error(numero, {"message": "El producto aparece mas de una vez en el catalogo"})
+            continue
+        procesados.add(llave)
+
+        if producto is None:
+            if datos.get("PRECIO") is None:
+                error(numero, {"PRECIO": ["Este campo es requerido para un producto nuevo"]})
+                continue
+            nuevos.append(
+                Producto(
+                    NOMBRE=datos["NOMBRE"],
+                    PRECIO=datos["PRECIO"],
+                    CANTIDAD=datos.get("CANTIDAD") or 0,
+                    CIUDAD_REGISTRO=ciudad_registro,
+                )
+            )
+            continue
+
+        modificado = False
+        if datos["NOMBRE"] != producto.NOMBRE:
+            producto.NOMBRE = datos["NOMBRE"]
+            modificado = True
+        if datos.get("PRECIO") is not None and datos["PRECIO"] != producto.PRECIO:
+            producto.PRECIO = datos["PRECIO"]
+            modificado = True
+        if modificado:
+            modificados.append(producto)
+
+        if datos.get("CANTIDAD") is not None and datos["CANTIDAD"] != producto.CANTIDAD:
+            cantidades[producto.id] = datos["CANTIDAD"] - producto.CANTIDAD
+
+        if modificado or producto.id in cantidades:
+            resultado["actualizados"] += 1
+        else:
+            resultado["sin_cambios"] += 1
+
+    if modificados:
+        Producto.objects.bulk_update(modificados, ["NOMBRE", "PRECIO"])
+
+    # La CANTIDAD del catalogo es el stock final, la diferencia se registra en el kardex como EDICION
+    if cantidades:
+        mover_stock(cantidades, "EDICION", "CATALOGO")
+
+    if nuevos:
+        # bulk_create no pasa por la señal que asigna la imagen por defecto
+        for producto in nuevos:
+            producto.IMAGEN = copiar_imagen_producto_default()
+        nuevos = Producto.objects.bulk_create(nuevos)
+
+        # Cantidad inicial en el kardex, igual que crear_producto
+        registrar_movimientos(
+            [
+                MovimientoInventario(
+                    PRODUCTO=producto,
+                    PRODUCTO_NOMBRE=producto.NOMBRE,
+                    CANTIDAD=producto.CANTIDAD,
+                    CANTIDAD_RESULTANTE=producto.CANTIDAD,
+                    TIPO="ALTA",
+                    REFERENCIA=f"PRODUCTO:{producto.id}",
+                    CIUDAD_REGISTRO=ciudad_registro,
+                )
+                for producto in nuevos
+            ]
+        )
+        resultado["creados"] += len(nuevos)
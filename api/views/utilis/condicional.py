@@ -0,0 +1,97 @@
+import functools
+import hashlib
+from datetime import datetime, timezone
+
+from django.db.models import F
+from django.utils.cache import patch_cache_control
+from django.utils.timezone import now
+from django.views.decorators.http import condition
+
+from api.views.utilis.cache_ciudad import (
+    cache_etiquetas_activa,
+    modificado_etiquetas,
+    versiones_etiquetas,
+)
+from api.views.utilis.general import obtener_ciudad_registro
+
+# GET condicional (ETag debil y Last-Modified) para las vistas que los frontends consultan constantemente
+# El ETag sale de datos baratos: las versiones de las etiquetas de cache o la columna VERSION de la fila, nunca del contenido serializado
+# Con un If-None-Match o If-Modified-Since que coincide se regresa un 304 sin ejecutar la vista ni los serializers
+
+
+def marcar_modificado(modelo, pk):
+    # Las vistas que cambian una Venta o una SalidaRuta (o sus productos y clientes) llaman esto dentro de su transaccion
+    modelo.objects.filter(pk=pk).update(VERSION=F("VERSION") + 1, MODIFICADO=now())
+
+
+def get_condicional(obtener):
+    # obtener(request, *args, **kwargs) regresa (etag, ultima_modificacion) o (None, None) para ejecutar la vista normalmente
+    # Se usa debajo de @api_view para que la autenticacion y los permisos se revisen antes de responder un 304
+    def decorador(vista):
+        def datos(request, *args, **kwargs):
+            # condition pide el ETag y el Last-Modified por separado, obtener se ejecuta una sola vez por request
+            if not hasattr(request, "_datos_condicionales"):
+                request._datos_condicionales = obtener(request, *args, **kwargs)
+            return request._datos_condicionales
+
+        vista_condicional = condition(
+            etag_func=lambda request, *args, **kwargs: datos(request, *args, **kwargs)[0],
+            last_modified_func=lambda request, *args, **kwargs: datos(
+                request, *args, **kwargs
+            )[1],
+        )(vista)
+
+        @functools.wraps(vista)
+        def envoltura(request, *args, **kwargs):
+            response = vista_condicional(request, *args, **kwargs)
+            if response.has_header("ETag"):
+                # El navegador guarda la respuesta pero siempre la revalida con el servidor
+                patch_cache_control(response, private=True, no_cache=True)
+            return response
+
+        return envoltura
+
+    return decorador
+
+
+def etag_debil(*partes):
+    return 'W/"' + hashlib.md5("|".join(map(str, partes)).encode()).hexdigest() + '"'
+
+
+def por_version(modelo):
+    # Detalle de una fila con VERSION y MODIFICADO: un query con values_list en lugar del select_related y prefetch de la vista
+    def obtener(request, pk):
+        fila = modelo.objects.filter(pk=pk).values_list("VERSION", "MODIFICADO").first()
+        if fila is None:
+            # La vista responde el 404
+            return None, None
+
+        version, modificado = fila
+        return etag_debil(modelo.__name__, pk, version, modificado.timestamp()), modificado
+
+    return obtener
+
+
+def por_etiquetas(*etiquetas, ciudad=None):
+    # Vistas que dependen de etiquetas de cache (ver cache_ciudad.py). Por defecto se usan las etiquetas de la ciudad del usuario
+    # ciudad(request, *args, **kwargs) permite usar otra ciudad, por ejemplo la del cliente consultado
+    # Sin una cache compartida las versiones no son confiables y la vista se ejecuta siempre
+    def obtener(request, *args, **kwargs):
+        if not cache_etiquetas_activa():
+            return None, None
+
+        if ciudad is None:
+            ciudad_registro = obtener_ciudad_registro(request)
+        else:
+            ciudad_registro = ciudad(request, *args, **kwargs)
+            if ciudad_registro is None:
+                return None, None
+
+        versiones = versiones_etiquetas(etiquetas, ciudad_registro)
+        modificado = datetime.fromtimestamp(
+            modificado_etiquetas(etiquetas, ciudad_registro), tz=timezone.utc
+        )
+        etag = etag_debil(ciudad_registro, versiones, request.get_full_path())
+        return etag, modificado
+
+    return obtener
@@ -0,0 +1,62 @@
+import csv
+import json
+from datetime import datetime
+
+from django.http import StreamingHttpResponse
+from rest_framework import serializers
+
+FORMATOS_EXPORTACION = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+# Numero de filas que se leen de la base de datos en cada viaje
+TAMANO_BLOQUE = 2000
+
+# Mismo formato de fecha que regresan los serializadores en el JSON normal
+_campo_fecha = serializers.DateTimeField()
+
+
+class _Eco:
+    # csv.writer necesita un archivo, este solo regresa la linea escrita para poder enviarla en el stream
+    def write(self, valor):
+        return valor
+
+
+def _formatear(valor):
+    if isinstance(valor, datetime):
+        return _campo_fecha.to_representation(valor)
+    return valor
+
+
+def _filas_csv(campos, filas):
+    escritor = csv.writer(_Eco())
+    # El BOM permite que Excel abra el archivo con acentos correctos
+    yield "﻿" + escritor.writerow(campos)
+    for fila in filas:
+        yield escritor.writerow([_formatear(valor) for valor in fila])
+
+
+def _filas_ndjson(campos, filas):
+    for fila in filas:
+        registro = {campo: _formatear(valor) for campo, valor in zip(campos, fila)}
+        yield json.dumps(registro, ensure_ascii=False) + "\n"
+
+
+def respuesta_exportacion(queryset, campos, formato, nombre_archivo):
+    # Las filas se leen por bloques con values_list y se envian conforme se generan, sin pasar por los serializadores
+    filas = queryset.values_list(*campos).iterator(chunk_size=TAMANO_BLOQUE)
+
+    if formato == "csv":
+        contenido = _filas_csv(campos, filas)
+    else:
+        contenido = _filas_ndjson(campos, filas)
+
+    response = StreamingHttpResponse(
+        contenido, content_type=FORMATOS_EXPORTACION[formato]
+    )
+    response["Content-Disposition"] = (
+        f'attachment; filename="{nombre_archivo}.{formato}"'
+    )
+
+    return response
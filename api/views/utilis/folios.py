@@ -0,0 +1,133 @@
+from django.db import IntegrityError, transaction
+from django.db.models import F, Max
+
+from api.models import FolioSecuencia, ReservaFolios, SalidaRuta, Venta
+
+# Las ventas usan un prefijo por TIPO_VENTA, las salidas ruta usan solo el numero
+PREFIJOS_FOLIO = {"MOSTRADOR": "M-", "RUTA": "R-", "SALIDA_RUTA": ""}
+
+
+def formatear_folio(tipo, numero):
+    if tipo == "SALIDA_RUTA":
+        return numero
+
+    return f"{PREFIJOS_FOLIO[tipo]}{numero}"
+
+
+def numero_folio(tipo, folio):
+    # Regresa el numero de un folio con prefijo ("R-15" -> 15) o None si no corresponde al tipo
+    prefijo = PREFIJOS_FOLIO[tipo]
+    folio = str(folio)
+
+    if not folio.startswith(prefijo):
+        return None
+
+    try:
+        return int(folio[len(prefijo) :])
+    except ValueError:
+        return None
+
+
+def _ultimo_folio_existente(ciudad_registro, tipo):
+    # Solo se usa la primera vez que se crea la secuencia de una ciudad, para continuar desde los folios que ya existen
+    if tipo == "SALIDA_RUTA":
+        ultimo = SalidaRuta.objects.filter(CIUDAD_REGISTRO=ciudad_registro).aggregate(
+            Max("FOLIO")
+        )["FOLIO__max"]
+        return ultimo or 0
+
+    folios = Venta.objects.filter(
+        CIUDAD_REGISTRO=ciudad_registro, FOLIO__startswith=PREFIJOS_FOLIO[tipo]
+    ).values_list("FOLIO", flat=True)
+
+    numeros = [numero_folio(tipo, folio) for folio in folios.iterator()]
+
+    return max((numero for numero in numeros if numero is not None), default=0)
+
+
+def _crear_secuencia(ciudad_registro, tipo):
+    try:
+        with transaction.atomic():
+            FolioSecuencia.objects.create(
+                CIUDAD_REGISTRO=ciudad_registro,
+                TIPO=tipo,
+                ULTIMO_FOLIO=_ultimo_folio_existente(ciudad_registro, tipo),
+            )
+    except IntegrityError:
+        # Otra transaccion creo la secuencia primero
+        pass
+
+
+def reservar_bloque_folios(ciudad_registro, tipo, cantidad=1, usuario=None):
+    # Con usuario el bloque queda registrado a su nombre y solo ese usuario puede enviar ventas con esos folios
+    if tipo not in PREFIJOS_FOLIO:
+        raise ValueError(f"Tipo de folio invalido: {tipo}")
+
+    if cantidad < 1:
+        raise ValueError("La cantidad de folios debe ser mayor a 0")
+
+    secuencia = FolioSecuencia.objects.filter(CIUDAD_REGISTRO=ciudad_registro, TIPO=tipo)
+
+    with transaction.atomic():
+        # El UPDATE bloquea la fila de la secuencia hasta el final de la transaccion, por lo que dos cajeros nunca reciben el mismo folio
+        if not secuencia.update(ULTIMO_FOLIO=F("ULTIMO_FOLIO") + cantidad):
+            _crear_secuencia(ciudad_registro, tipo)
+            secuencia.update(ULTIMO_FOLIO=F("ULTIMO_FOLIO") + cantidad)
+
+        ultimo = secuencia.values_list("ULTIMO_FOLIO", flat=True).get()
+
+        if usuario is not None:
+            ReservaFolios.objects.create(
+                CIUDAD_REGISTRO=ciudad_registro,
+                TIPO=tipo,
+                PRIMER_FOLIO=ultimo - cantidad + 1,
+                ULTIMO_FOLIO=ultimo,
+                USUARIO=usuario,
+            )
+
+    return range(ultimo - cantidad + 1, ultimo + 1)
+
+
+def siguiente_folio(ciudad_registro, tipo):
+    numero = reservar_bloque_folios(ciudad_registro, tipo)[0]
+
+    return formatear_folio(tipo, numero)
+
+
+def errores_folios_enviados(ciudad_registro, tipo, folios, usuario):
+    # Folios enviados por un dispositivo (ver reservar_folios). Un folio es valido si tiene el prefijo del tipo, cae en un bloque
+    # reservado por el mismo usuario y ninguna venta de la ciudad lo usa todavia. Regresa {folio: mensaje} con los folios invalidos
+    # Son dos queries para todos los folios. Los folios repetidos dentro de un mismo lote los revisa quien llama
+    errores = {}
+    numeros = {}
+    for folio in folios:
+        numero = numero_folio(tipo, folio)
+        if numero is None or numero < 1:
+            errores[folio] = "El folio enviado no corresponde al tipo de venta"
+        else:
+            numeros[folio] = numero
+
+    if not numeros:
+        return errores
+
+    bloques = list(
+        ReservaFolios.objects.filter(
+            CIUDAD_REGISTRO=ciudad_registro,
+            TIPO=tipo,
+            USUARIO=usuario,
+            PRIMER_FOLIO__lte=max(numeros.values()),
+            ULTIMO_FOLIO__gte=min(numeros.values()),
+        ).values_list("PRIMER_FOLIO", "ULTIMO_FOLIO")
+    )
+    for folio, numero in numeros.items():
+        if not any(primero <= numero <= ultimo for primero, ultimo in bloques):
+            errores[folio] = "El folio enviado no fue reservado por este usuario en esta ciudad"
+
+    usados = Venta.objects.filter(
+        CIUDAD_REGISTRO=ciudad_registro,
+        FOLIO__in=[folio for folio in numeros if folio not in errores],
+    ).values_list("FOLIO", flat=True)
+    for folio in usados:
+        errores[folio] = "El folio enviado ya fue usado por otra venta"
+
+    return errores
@@ -2,28 +2,56 @@ from django.utils.timezone import utc
 from django.utils.dateparse import parse_date
 from datetime import datetime, timedelta
 import pytz
+from django.core.cache import cache
+from django.core.files.storage import default_storage
 from api.models import Empleado
 
 
-def obtener_ciudad_registro(request):
+CIUDAD_REGISTRO_DEFAULT = "URUAPAN"
+
+IMAGEN_PRODUCTO_DEFAULT = "imagenes/default/producto_default.jpg"
+
+
+def cache_key_empleado(user_id):
+    return f"empleado_usuario:{user_id}"
+
 
-    # auth = request.headers.get("Authorization", None)
+# Busqueda del empleado en cache. Se invalida con las señales de Empleado (ver signals.py)
+def obtener_empleado_cache(user_id):
+    cache_key = cache_key_empleado(user_id)
+    empleado = cache.get(cache_key)
 
-    # token = auth.split()[1]
-    # decoded_token = JWTAuthentication().get_validated_token(token)
-    # user_id = decoded_token["user_id"]  # o 'user' si usas otro campo
+    if empleado is None:
+        empleado = Empleado.objects.filter(USUARIO_id=user_id).values(
+            "CIUDAD_REGISTRO", "ROLE"
+        ).first() or {"CIUDAD_REGISTRO": CIUDAD_REGISTRO_DEFAULT, "ROLE": None}
+        cache.set(cache_key, empleado, 60 * 15)
 
-    try:
-        empleado = Empleado.objects.get(USUARIO=request.user)
+    return empleado
 
-        ciudad_registro = empleado.CIUDAD_REGISTRO
-    except:
 
-        ciudad_registro = "URUAPAN"
+def obtener_ciudad_registro(request):
+    # EmpleadoJWTAuthentication resuelve la ciudad una sola vez por request (desde los claims del token)
+    ciudad_registro = getattr(request, "ciudad_registro", None)
+    if ciudad_registro is not None:
+        return ciudad_registro
+
+    if not request.user.is_authenticated:
+        return CIUDAD_REGISTRO_DEFAULT
+
+    ciudad_registro = obtener_empleado_cache(request.user.id)["CIUDAD_REGISTRO"]
+    request.ciudad_registro = ciudad_registro
 
     return ciudad_registro
 
 
+# Para productos creados con bulk_create, que no pasan por la señal set_default_product_image
+# Cada producto necesita su propia copia: al eliminar el producto la señal delete_producto_image borra el archivo de su imagen
+def copiar_imagen_producto_default():
+    with default_storage.open(IMAGEN_PRODUCTO_DEFAULT) as imagen:
+        return default_storage.save("imagenes/productos/producto_default.jpg", imagen)
+
+
 def obtener_nombre_con_sufijo(ciudad_registro, username):
 
     if ciudad_registro == "URUAPAN":
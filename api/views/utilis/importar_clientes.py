@@ -0,0 +1,233 @@
+import csv
+import io
+
+from django.db import transaction
+
+from api.models import Cliente, Direccion, PrecioCliente, Producto, RutaDia
+from api.serializers import ClienteImportacionSerializer
+from api.views.utilis.busqueda import indexar
+from api.views.utilis.cache_ciudad import (
+    ETIQUETA_CLIENTES,
+    ETIQUETA_PRECIOS,
+    invalidar_etiquetas,
+)
+from api.views.utilis.catalogo import leer_filas_json
+from api.views.utilis.precios import precio_y_descuento
+
+# Alta de muchos clientes a la vez, por ejemplo al empezar a operar en una ciudad
+# Cada fila tiene los mismos datos que recibe crear_cliente: el cliente, su direccion, sus precios (preciosCliente) y sus rutas dia (rutasIds)
+# Primero se valida todo el archivo con tres queries (productos, rutas dia y nombres de clientes de la ciudad). Si alguna fila
+# tiene errores no se guarda nada y se regresan los errores por fila. Despues se guarda por bloques, cada bloque en su propia transaccion
+# con un bulk_create por tabla: Direccion, Cliente, PrecioCliente y Cliente.RUTAS
+
+FORMATOS_CLIENTES = ["csv", "json", "ndjson"]
+
+TAMANO_BLOQUE_CLIENTES = 500
+
+CAMPOS_CLIENTE_CSV = [
+    "NOMBRE",
+    "CONTACTO",
+    "TELEFONO",
+    "CORREO",
+    "TIPO_PAGO",
+    "OBSERVACIONES",
+]
+CAMPOS_DIRECCION_CSV = ["CALLE", "NUMERO", "COLONIA", "CIUDAD", "MUNICIPIO", "CP"]
+
+
+class ArchivoClientesInvalido(Exception):
+    pass
+
+
+def leer_clientes(contenido, formato):
+    # contenido es el texto del archivo. Regresa una lista de diccionarios con el formato de crear_cliente
+    contenido = contenido.lstrip("﻿")
+
+    if formato != "csv":
+        try:
+            return leer_filas_json(contenido, formato, "clientes")
+        except ValueError:
+            raise ArchivoClientesInvalido("El archivo debe ser una lista de clientes en JSON")
+
+    # En CSV la direccion va en sus propias columnas, RUTAS son ids de rutas dia separados por ; y PRECIOS pares producto=precio
+    # separados por ;, por ejemplo "3=27.5;4=30"
+    lector = csv.DictReader(io.StringIO(contenido))
+    if not lector.fieldnames or "NOMBRE" not in lector.fieldnames:
+        raise ArchivoClientesInvalido("El CSV debe tener encabezados con al menos la columna NOMBRE")
+
+    filas = []
+    for fila in lector:
+        fila = {campo: valor for campo, valor in fila.items() if valor not in ("", None)}
+        cliente = {campo: fila[campo] for campo in CAMPOS_CLIENTE_CSV if campo in fila}
+        cliente["direccion"] = {
+            campo: fila[campo] for campo in CAMPOS_DIRECCION_CSV if campo in fila
+        }
+        cliente["rutasIds"] = [
+            ruta_dia.strip()
+            for ruta_dia in fila.get("RUTAS", "").split(";")
+            if ruta_dia.strip()
+        ]
+        cliente["preciosCliente"] = []
+        for par in fila.get("PRECIOS", "").split(";"):
+            if not par.strip():
+                continue
+            producto_id, _, precio = par.partition("=")
+            cliente["preciosCliente"].append(
+                {
+                    "precioClienteId": producto_id.strip(),
+                    "nuevoPrecioCliente": precio.strip() or None,
+                }
+            )
+        filas.append(cliente)
+
+    return filas
+
+
+def importar_clientes(filas, ciudad_registro, tamano_bloque=TAMANO_BLOQUE_CLIENTES):
+    # Regresa {"creados": n, "errores": [{"fila", "errores"}]}. Las filas empiezan en 1
+    productos = dict(
+        Producto.objects.filter(CIUDAD_REGISTRO=ciudad_registro).values_list("id", "PRECIO")
+    )
+    rutas_dia = set(
+        RutaDia.objects.filter(RUTA__CIUDAD_REGISTRO=ciudad_registro).values_list(
+            "id", flat=True
+        )
+    )
+    # Cliente.save guarda el nombre en mayusculas. Un nombre repetido casi siempre es un archivo que ya se importo
+    existentes = set(
+        Cliente.objects.filter(CIUDAD_REGISTRO=ciudad_registro).values_list("NOMBRE", flat=True)
+    )
+
+    errores = []
+    validos = []
+    filas_por_nombre = {}
+    for numero, fila in enumerate(filas, start=1):
+        serializer = ClienteImportacionSerializer(data=fila)
+        if not serializer.is_valid():
+            errores.append({"fila": numero, "errores": serializer.errors})
+            continue
+
+        datos = serializer.validated_data
+        errores_fila = {}
+
+        nombre = datos["NOMBRE"].upper()
+        if nombre in existentes:
+            errores_fila["NOMBRE"] = ["Ya existe un cliente con este nombre en la ciudad"]
+        elif nombre in filas_por_nombre:
+            errores_fila["NOMBRE"] = [
+                f"El nombre se repite en la fila {filas_por_nombre[nombre]}"
+            ]
+        else:
+            filas_por_nombre[nombre] = numero
+
+        rutas_invalidas = [
+            ruta_dia for ruta_dia in datos.get("rutasIds", []) if ruta_dia not in rutas_dia
+        ]
+        if rutas_invalidas:
+            errores_fila["rutasIds"] = [
+                f"La ruta dia {ruta_dia} no existe en la ciudad" for ruta_dia in rutas_invalidas
+            ]
+
+        # Igual que guardar_precios_cliente: un precio igual al publico (DESCUENTO 0) no se guarda
+        precios = {}
+        for precio_cliente in datos.get("preciosCliente", []):
+            producto_id = precio_cliente["precioClienteId"]
+            if producto_id not in productos:
+                errores_fila.setdefault("preciosCliente", []).append(
+                    f"El producto {producto_id} no existe"
+                )
+                continue
+            if producto_id in precios:
+                errores_fila.setdefault("preciosCliente", []).append(
+                    f"El producto {producto_id} aparece mas de una vez"
+                )
+                continue
+            try:
+                precios[producto_id] = precio_y_descuento(
+                    productos[producto_id],
+                    precio_cliente.get("nuevoPrecioCliente"),
+                    precio_cliente.get("nuevoDescuento"),
+                )
+            except ValueError as error:
+                errores_fila.setdefault("preciosCliente", []).append(str(error))
+
+        if errores_fila:
+            errores.append({"fila": numero, "errores": errores_fila})
+            continue
+
+        validos.append((datos, precios))
+
+    if errores:
+        return {"creados": 0, "errores": errores}
+
+    creados = 0
+    for inicio in range(0, len(validos), tamano_bloque):
+        creados += _importar_bloque(
+            validos[inicio : inicio + tamano_bloque], ciudad_registro
+        )
+
+    if creados:
+        invalidar_etiquetas(ciudad_registro, ETIQUETA_CLIENTES, ETIQUETA_PRECIOS)
+
+    return {"creados": creados, "errores": []}
+
+
+def _direccion(datos):
+    # Mismas mayusculas que Direccion.save, bulk_create no llama a save
+    direccion = dict(datos)
+    for campo in ["CALLE", "COLONIA", "CIUDAD", "MUNICIPIO"]:
+        if direccion.get(campo):
+            direccion[campo] = direccion[campo].upper()
+    return Direccion(**direccion)
+
+
+@transaction.atomic
+def _importar_bloque(validos, ciudad_registro):
+    direcciones = Direccion.objects.bulk_create(
+        [_direccion(datos["direccion"]) for datos, _ in validos]
+    )
+
+    # Mismas mayusculas que Cliente.save
+    clientes = Cliente.objects.bulk_create(
+        [
+            Cliente(
+                NOMBRE=datos["NOMBRE"].upper(),
+                CONTACTO=datos.get("CONTACTO") and datos["CONTACTO"].upper(),
+                TELEFONO=datos["TELEFONO"],
+                CORREO=datos.get("CORREO"),
+                TIPO_PAGO=datos["TIPO_PAGO"],
+                OBSERVACIONES=datos.get("OBSERVACIONES", ""),
+                DIRECCION=direccion,
+                CIUDAD_REGISTRO=ciudad_registro,
+            )
+            for (datos, _), direccion in zip(validos, direcciones)
+        ]
+    )
+
+    PrecioCliente.objects.bulk_create(
+        [
+            PrecioCliente(
+                CLIENTE=cliente,
+                PRODUCTO_id=producto_id,
+                PRECIO=precio,
+                DESCUENTO=descuento,
+            )
+            for (_, precios), cliente in zip(validos, clientes)
+            for producto_id, (precio, descuento) in precios.items()
+            if descuento != 0
+        ]
+    )
+
+    Asignacion = Cliente.RUTAS.through
+    Asignacion.objects.bulk_create(
+        [
+            Asignacion(cliente_id=cliente.id, rutadia_id=ruta_dia)
+            for (datos, _), cliente in zip(validos, clientes)
+            for ruta_dia in set(datos.get("rutasIds", []))
+        ]
+    )
+
+    # bulk_create no dispara la señal que indexa los clientes para la busqueda
+    indexar(clientes, nuevas=True)
+
+    return len(clientes)
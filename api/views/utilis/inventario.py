@@ -0,0 +1,185 @@
+from datetime import datetime
+
+from django.db import transaction
+from django.db.models import (
+    Case,
+    F,
+    FloatField,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from api.models import InventarioSnapshot, MovimientoInventario, Producto
+from api.views.utilis.cache_ciudad import ETIQUETA_PRODUCTOS, invalidar_etiquetas
+
+
+class StockInsuficiente(Exception):
+    def __init__(self, productos):
+        self.productos = productos
+        super().__init__(
+            "No existen productos suficientes para realizar esta operación: "
+            + ", ".join(productos)
+        )
+
+
+def mover_stock(deltas, tipo, referencia=""):
+    # Unico punto donde se modifica Producto.CANTIDAD. deltas = {producto_id: cantidad}, negativo descuenta del almacen
+    # Regresa {producto_id: {"NOMBRE", "ANTES", "DESPUES"}} de los productos que existen
+    # Si algun producto quedaria en negativo se lanza StockInsuficiente y no se aplica ningun cambio
+    # Cada cambio queda registrado en el kardex (MovimientoInventario) con el tipo y la referencia dados
+    # Los ids pueden llegar como texto desde el request
+    deltas = {int(producto_id): delta for producto_id, delta in deltas.items()}
+    if not deltas:
+        return {}
+
+    with transaction.atomic():
+        # Las filas se bloquean siempre en orden de id para que dos transacciones que mueven los mismos productos no se bloqueen mutuamente
+        productos = (
+            Producto.objects.select_for_update()
+            .filter(id__in=list(deltas))
+            .order_by("id")
+            .values_list("id", "NOMBRE", "CANTIDAD", "CIUDAD_REGISTRO")
+        )
+
+        movimientos = {}
+        insuficientes = []
+        ciudades = {}
+        for producto_id, nombre, cantidad, ciudad_registro in productos:
+            delta = deltas[producto_id]
+            movimientos[producto_id] = {
+                "NOMBRE": nombre,
+                "ANTES": cantidad,
+                "DESPUES": cantidad + delta,
+            }
+            if cantidad + delta < 0:
+                insuficientes.append(nombre)
+            ciudades[producto_id] = ciudad_registro
+
+        if insuficientes:
+            raise StockInsuficiente(insuficientes)
+
+        cambios = {
+            producto_id: deltas[producto_id]
+            for producto_id in movimientos
+            if deltas[producto_id]
+        }
+        if not cambios:
+            return movimientos
+
+        # Un solo UPDATE con la condicion de no quedar en negativo en la misma sentencia
+        condicion = Q()
+        for producto_id, delta in cambios.items():
+            if delta < 0:
+                condicion |= Q(id=producto_id, CANTIDAD__gte=-delta)
+            else:
+                condicion |= Q(id=producto_id)
+
+        actualizados = Producto.objects.filter(condicion).update(
+            CANTIDAD=F("CANTIDAD")
+            + Case(
+                *[
+                    When(id=producto_id, then=Value(delta))
+                    for producto_id, delta in cambios.items()
+                ],
+                default=Value(0.0),
+                output_field=FloatField(),
+            )
+        )
+
+        if actualizados != len(cambios):
+            # Otra transaccion cambio el stock despues de leerlo (bases de datos sin select_for_update). El atomic revierte el UPDATE
+            raise StockInsuficiente([movimientos[i]["NOMBRE"] for i in cambios])
+
+        registrar_movimientos(
+            [
+                MovimientoInventario(
+                    PRODUCTO_id=producto_id,
+                    PRODUCTO_NOMBRE=movimientos[producto_id]["NOMBRE"],
+                    CANTIDAD=delta,
+                    CANTIDAD_RESULTANTE=movimientos[producto_id]["DESPUES"],
+                    TIPO=tipo,
+                    REFERENCIA=referencia,
+                    CIUDAD_REGISTRO=ciudades[producto_id],
+                )
+                for producto_id, delta in cambios.items()
+            ]
+        )
+
+    for ciudad_registro in set(ciudades.values()):
+        invalidar_etiquetas(ciudad_registro, ETIQUETA_PRODUCTOS)
+
+    return movimientos
+
+
+def registrar_movimientos(movimientos):
+    # Todos los movimientos de una operacion se insertan con la misma fecha
+    fecha = timezone.now()
+    for movimiento in movimientos:
+        movimiento.FECHA = fecha
+
+    MovimientoInventario.objects.bulk_create(movimientos)
+
+
+def registrar_movimiento_producto(producto, cantidad, tipo):
+    # Cambios de cantidad que se guardaron con el producto (alta o edicion) y no pasaron por mover_stock
+    registrar_movimientos(
+        [
+            MovimientoInventario(
+                PRODUCTO=producto,
+                PRODUCTO_NOMBRE=producto.NOMBRE,
+                CANTIDAD=cantidad,
+                CANTIDAD_RESULTANTE=producto.CANTIDAD,
+                TIPO=tipo,
+                REFERENCIA=f"PRODUCTO:{producto.id}",
+                CIUDAD_REGISTRO=producto.CIUDAD_REGISTRO,
+            )
+        ]
+    )
+
+
+# Fecha anterior a cualquier movimiento, se usa cuando el producto no tiene snapshot
+FECHA_INICIAL = datetime(2000, 1, 1, tzinfo=timezone.utc)
+
+
+def anotar_stock_a_fecha(productos, fecha):
+    # Anota en cada producto el stock que tenia en la fecha dada: ultimo snapshot anterior + movimientos posteriores al snapshot
+    # Ambas busquedas usan los indices (PRODUCTO, FECHA) por lo que no importa el tamaño del kardex
+    snapshots = InventarioSnapshot.objects.filter(
+        PRODUCTO=OuterRef("pk"), FECHA__lte=fecha
+    ).order_by("-FECHA")
+
+    productos = productos.annotate(
+        SNAPSHOT_FECHA=Subquery(snapshots.values("FECHA")[:1]),
+        SNAPSHOT_CANTIDAD=Subquery(snapshots.values("CANTIDAD")[:1]),
+    )
+
+    movimientos = (
+        MovimientoInventario.objects.filter(
+            PRODUCTO=OuterRef("pk"),
+            FECHA__lte=fecha,
+            FECHA__gt=Coalesce(OuterRef("SNAPSHOT_FECHA"), Value(FECHA_INICIAL)),
+        )
+        .order_by()
+        .values("PRODUCTO")
+        .annotate(TOTAL=Sum("CANTIDAD"))
+    )
+
+    return productos.annotate(
+        MOVIMIENTOS_CANTIDAD=Subquery(
+            movimientos.values("TOTAL")[:1], output_field=FloatField()
+        )
+    )
+
+
+def stock_anotado(producto):
+    # None cuando no hay informacion del producto en esa fecha (todavia no existia o es anterior al primer snapshot)
+    if producto.SNAPSHOT_CANTIDAD is None and producto.MOVIMIENTOS_CANTIDAD is None:
+        return None
+
+    return (producto.SNAPSHOT_CANTIDAD or 0) + (producto.MOVIMIENTOS_CANTIDAD or 0)
@@ -0,0 +1,150 @@
+import base64
+import hashlib
+import json
+import math
+
+from django.core.cache import cache
+from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.db.models import F, Q
+from django.utils.dateparse import parse_datetime
+
+# Ordenamientos que se pueden paginar por cursor (keyset). El id siempre se usa como desempate
+ORDENAMIENTOS_CURSOR = {
+    "-id": None,
+    "id": None,
+    "-FECHA": "FECHA",
+    "FECHA": "FECHA",
+}
+
+# El total en modo cursor es aproximado: se guarda en cache por este tiempo
+TIEMPO_CACHE_CONTEO = 60
+
+
+def paginar_queryset(request, queryset, por_pagina):
+    # Modo cursor (opcional): ?cursor= para la primera pagina y luego el cursor que regresa cada respuesta
+    # Si no se envia cursor se usa el Paginator con el contrato de siempre: {"page", "pages"}
+    ordenamiento = queryset.query.order_by
+
+    if (
+        "cursor" in request.GET
+        and len(ordenamiento) == 1
+        and ordenamiento[0] in ORDENAMIENTOS_CURSOR
+    ):
+        return paginar_por_cursor(request, queryset, ordenamiento[0], por_pagina)
+
+    page = request.GET.get("page", "")
+    paginator = Paginator(queryset, por_pagina)
+
+    try:
+        objetos = paginator.page(page)
+    except PageNotAnInteger:
+        page = 1
+        objetos = paginator.page(page)
+    except EmptyPage:
+        page = paginator.num_pages
+        objetos = paginator.page(page)
+
+    return objetos, {"page": page, "pages": paginator.num_pages}
+
+
+def codificar_cursor(valores):
+    texto = json.dumps(valores, separators=(",", ":"))
+    return base64.urlsafe_b64encode(texto.encode()).decode()
+
+
+def decodificar_cursor(cursor, campo):
+    # Regresa (valor del campo, id) o None si el cursor no es valido. Sin campo el valor del campo siempre es None
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+    if not isinstance(valores, list) or len(valores) != (2 if campo else 1):
+        return None
+
+    id_cursor = valores[-1]
+    if type(id_cursor) is not int:
+        return None
+
+    if not campo or valores[0] is None:
+        return None, id_cursor
+
+    valor_campo = parse_datetime(valores[0]) if isinstance(valores[0], str) else None
+    if valor_campo is None:
+        return None
+
+    return valor_campo, id_cursor
+
+
+def paginar_por_cursor(request, queryset, ordenamiento, por_pagina):
+    campo = ORDENAMIENTOS_CURSOR[ordenamiento]
+    descendente = ordenamiento.startswith("-")
+    comparacion = "lt" if descendente else "gt"
+
+    if campo:
+        # Las filas sin FECHA tambien se paginan: se ordenan como si su FECHA fuera la mayor (al final en ascendente y al
+        # principio en descendente), igual que los indices de PostgreSQL, y dentro de ellas por id
+        if descendente:
+            queryset = queryset.order_by(F(campo).desc(nulls_first=True), "-id")
+        else:
+            queryset = queryset.order_by(F(campo).asc(nulls_last=True), "id")
+    else:
+        queryset = queryset.order_by("-id" if descendente else "id")
+
+    total = contar_con_cache(request, queryset)
+
+    # Un cursor invalido se trata como la primera pagina (igual que PageNotAnInteger)
+    cursor = decodificar_cursor(request.GET.get("cursor", ""), campo)
+    if cursor:
+        valor_campo, id_cursor = cursor
+        despues_del_id = Q(**{f"id__{comparacion}": id_cursor})
+        if not campo:
+            queryset = queryset.filter(despues_del_id)
+        elif valor_campo is None:
+            # El cursor esta en las filas sin FECHA: siguen las demas sin FECHA y, en descendente, todas las que tienen FECHA
+            siguientes = Q(despues_del_id, **{f"{campo}__isnull": True})
+            if descendente:
+                siguientes |= Q(**{f"{campo}__isnull": False})
+            queryset = queryset.filter(siguientes)
+        else:
+            siguientes = Q(**{f"{campo}__{comparacion}": valor_campo}) | Q(
+                despues_del_id, **{campo: valor_campo}
+            )
+            if not descendente:
+                siguientes |= Q(**{f"{campo}__isnull": True})
+            queryset = queryset.filter(siguientes)
+
+    # Se pide un registro extra para saber si existe una pagina siguiente
+    objetos = list(queryset[: por_pagina + 1])
+    siguiente_cursor = None
+
+    if len(objetos) > por_pagina:
+        objetos = objetos[:por_pagina]
+        ultimo = objetos[-1]
+        if campo:
+            valor_campo = getattr(ultimo, campo)
+            siguiente_cursor = codificar_cursor(
+                [valor_campo.isoformat() if valor_campo else None, ultimo.id]
+            )
+        else:
+            siguiente_cursor = codificar_cursor([ultimo.id])
+
+    return objetos, {
+        "cursor": siguiente_cursor,
+        "pages": max(math.ceil(total / por_pagina), 1),
+        "total": total,
+    }
+
+
+def contar_con_cache(request, queryset):
+    # El COUNT(*) es lo mas caro de la paginacion, en modo cursor se reutiliza por unos segundos
+    parametros = sorted(
+        (llave, valor)
+        for llave, valor in request.GET.items()
+        if llave not in ("cursor", "page")
+    )
+    huella = hashlib.md5(
+        f"{request.path}|{request.user.id}|{parametros}".encode()
+    ).hexdigest()
+
+    return cache.get_or_set(f"conteo:{huella}", queryset.count, TIEMPO_CACHE_CONTEO)
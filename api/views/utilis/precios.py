@@ -0,0 +1,242 @@
+from collections import defaultdict
+
+from django.core.files.storage import default_storage
+
+from api.models import (
+    Cliente,
+    PrecioCliente,
+    Producto,
+    calcular_precio_cliente,
+    descuento_desde_precio,
+)
+from api.views.utilis.cache_ciudad import ETIQUETA_PRECIOS, invalidar_etiquetas
+
+
+def url_imagen(imagen):
+    # Misma url que regresa serializers.ImageField cuando no hay request en el contexto
+    return default_storage.url(imagen) if imagen else None
+
+
+def precio_y_descuento(precio_publico, precio=None, descuento=None):
+    # Valores de PRECIO y DESCUENTO para un precio capturado. Un descuento capturado tiene prioridad sobre el precio
+    # Un precio capturado se guarda como el descuento equivalente para que se conserve cuando cambie el precio publico
+    if descuento is not None:
+        descuento = float(descuento)
+        if not 0 <= descuento <= 1:
+            raise ValueError("El descuento debe estar entre 0 y 1")
+        return calcular_precio_cliente(None, descuento, precio_publico), descuento
+
+    precio = float(precio)
+    return precio, descuento_desde_precio(precio, precio_publico)
+
+
+def precios_completos(clientes_ids, ciudad_registro=None):
+    # Un precio por cada producto de la ciudad de cada cliente, en orden de producto: {cliente_id: [fila, ...]}
+    # Solo los precios distintos al publico estan guardados. Los demas se completan con el precio publico y sin precio_id
+    # Cada fila es un diccionario armado con values_list: precio_id (None si no esta guardado), producto_id, producto_nombre,
+    # producto_imagen (url), producto_cantidad, precio_publico, PRECIO (el que paga el cliente) y DESCUENTO
+    # Tres queries sin importar el numero de clientes: ciudades (si no se da ciudad_registro), productos y precios guardados
+    if ciudad_registro is None:
+        ciudades = dict(
+            Cliente.objects.filter(id__in=clientes_ids).values_list(
+                "id", "CIUDAD_REGISTRO"
+            )
+        )
+    else:
+        ciudades = {cliente_id: ciudad_registro for cliente_id in clientes_ids}
+
+    productos = defaultdict(list)
+    for producto_id, nombre, imagen, cantidad, precio_publico, ciudad in (
+        Producto.objects.filter(CIUDAD_REGISTRO__in=set(ciudades.values()))
+        .order_by("id")
+        .values_list("id", "NOMBRE", "IMAGEN", "CANTIDAD", "PRECIO", "CIUDAD_REGISTRO")
+    ):
+        productos[ciudad].append(
+            (producto_id, nombre, url_imagen(imagen), cantidad, precio_publico)
+        )
+
+    guardados = {
+        (cliente_id, producto_id): (precio_id, precio, descuento)
+        for precio_id, cliente_id, producto_id, precio, descuento in PrecioCliente.objects.filter(
+            CLIENTE_id__in=list(ciudades)
+        ).values_list("id", "CLIENTE_id", "PRODUCTO_id", "PRECIO", "DESCUENTO")
+    }
+
+    precios = {}
+    for cliente_id, ciudad in ciudades.items():
+        precios[cliente_id] = []
+        for producto_id, nombre, imagen, cantidad, precio_publico in productos[ciudad]:
+            precio_id, precio, descuento = guardados.get(
+                (cliente_id, producto_id), (None, None, 0.0)
+            )
+            precios[cliente_id].append(
+                {
+                    "precio_id": precio_id,
+                    "producto_id": producto_id,
+                    "producto_nombre": nombre,
+                    "producto_imagen": imagen,
+                    "producto_cantidad": cantidad,
+                    "precio_publico": precio_publico,
+                    "PRECIO": calcular_precio_cliente(precio, descuento, precio_publico),
+                    "DESCUENTO": descuento,
+                }
+            )
+
+    return precios
+
+
+def _con_id(fila, datos):
+    # Los precios sin guardar no tienen id: el frontend los edita con productoId (PRODUCTO)
+    if fila["precio_id"] is not None:
+        return {"id": fila["precio_id"], **datos}
+    return datos
+
+
+def formato_precio_cliente(fila):
+    # Mismas llaves que PrecioClienteSerializer
+    precio_publico = fila["precio_publico"] or 1
+    return _con_id(
+        fila,
+        {
+            "producto_nombre": fila["producto_nombre"],
+            "producto_imagen": fila["producto_imagen"],
+            "porcentage_precio": round((1 - (fila["PRECIO"] or 0) / precio_publico) * 100, 2),
+            "PRECIO": fila["PRECIO"],
+            "DESCUENTO": fila["DESCUENTO"],
+            "PRODUCTO": fila["producto_id"],
+        },
+    )
+
+
+def formato_precio_cliente_venta(fila):
+    # Mismas llaves que PrecioClienteVentaSerializer
+    return _con_id(
+        fila,
+        {
+            "producto_nombre": fila["producto_nombre"],
+            "producto_imagen": fila["producto_imagen"],
+            "producto_cantidad": fila["producto_cantidad"],
+            "PRECIO": fila["PRECIO"],
+            "PRODUCTO": fila["producto_id"],
+        },
+    )
+
+
+def precios_por_cliente(clientes_ids):
+    # Todos los precios de varios clientes (junto con los datos del producto)
+    # Regresa {cliente_id: [{"precio", "producto_nombre", "productoId", "producto_imagen"}, ...]}
+    return {
+        cliente_id: [
+            {
+                "precio": fila["PRECIO"],
+                "producto_nombre": fila["producto_nombre"],
+                "productoId": fila["producto_id"],
+                "producto_imagen": fila["producto_imagen"],
+            }
+            for fila in filas
+        ]
+        for cliente_id, filas in precios_completos(clientes_ids).items()
+    }
+
+
+def guardar_precios_cliente(cliente, capturados):
+    # capturados: {producto_id: (nuevoPrecio, nuevoDescuento)}. Lanza ValueError con un precio o un producto invalido
+    # Un precio igual al publico (DESCUENTO 0) no se guarda y se borra si existia
+    productos = dict(
+        Producto.objects.filter(
+            id__in=list(capturados), CIUDAD_REGISTRO=cliente.CIUDAD_REGISTRO
+        ).values_list("id", "PRECIO")
+    )
+    guardados = {
+        precio.PRODUCTO_id: precio
+        for precio in PrecioCliente.objects.filter(
+            CLIENTE=cliente, PRODUCTO_id__in=list(capturados)
+        )
+    }
+
+    nuevos = []
+    modificados = []
+    borrar = []
+    for producto_id, (precio_capturado, descuento_capturado) in capturados.items():
+        if producto_id not in productos:
+            raise ValueError(f"El producto {producto_id} no existe")
+
+        precio, descuento = precio_y_descuento(
+            productos[producto_id], precio_capturado, descuento_capturado
+        )
+        guardado = guardados.get(producto_id)
+
+        if descuento == 0:
+            if guardado is not None:
+                borrar.append(guardado.id)
+        elif guardado is not None:
+            guardado.PRECIO, guardado.DESCUENTO = precio, descuento
+            modificados.append(guardado)
+        else:
+            nuevos.append(
+                PrecioCliente(
+                    CLIENTE=cliente,
+                    PRODUCTO_id=producto_id,
+                    PRECIO=precio,
+                    DESCUENTO=descuento,
+                )
+            )
+
+    PrecioCliente.objects.filter(id__in=borrar).delete()
+    PrecioCliente.objects.bulk_update(modificados, ["PRECIO", "DESCUENTO"])
+    PrecioCliente.objects.bulk_create(nuevos)
+
+    # bulk_update y bulk_create no disparan señales
+    invalidar_etiquetas(cliente.CIUDAD_REGISTRO, ETIQUETA_PRECIOS)
+
+
+def matriz_precios(ciudad_registro, densa=False):
+    # Todos los precios de una ciudad sin repetir los datos del producto en cada cliente
+    # Triples [cliente_id, producto_id, precio] solo de los precios guardados (los demas clientes pagan el precio publico del producto)
+    # o, con densa=True, una fila por cliente con una columna por producto ya con el precio publico donde no hay precio guardado
+    productos = [
+        {"id": producto_id, "NOMBRE": nombre, "IMAGEN": url_imagen(imagen), "PRECIO": precio}
+        for producto_id, nombre, imagen, precio in Producto.objects.filter(
+            CIUDAD_REGISTRO=ciudad_registro
+        )
+        .order_by("id")
+        .values_list("id", "NOMBRE", "IMAGEN", "PRECIO")
+    ]
+
+    clientes = [
+        {"id": cliente_id, "NOMBRE": nombre, "TIPO_PAGO": tipo_pago}
+        for cliente_id, nombre, tipo_pago in Cliente.objects.filter(
+            CIUDAD_REGISTRO=ciudad_registro
+        )
+        .order_by("id")
+        .values_list("id", "NOMBRE", "TIPO_PAGO")
+    ]
+
+    filas = (
+        PrecioCliente.objects.filter(CLIENTE__CIUDAD_REGISTRO=ciudad_registro)
+        .order_by("CLIENTE_id", "PRODUCTO_id")
+        .values_list(
+            "CLIENTE_id", "PRODUCTO_id", "PRECIO", "DESCUENTO", "PRODUCTO__PRECIO"
+        )
+    )
+    triples = [
+        [cliente_id, producto_id, calcular_precio_cliente(precio, descuento, publico)]
+        for cliente_id, producto_id, precio, descuento, publico in filas
+    ]
+
+    if not densa:
+        precios = triples
+    else:
+        columnas = {producto["id"]: i for i, producto in enumerate(productos)}
+        filas = {cliente["id"]: i for i, cliente in enumerate(clientes)}
+        publicos = [
+            calcular_precio_cliente(None, 0.0, producto["PRECIO"])
+            for producto in productos
+        ]
+        precios = [list(publicos) for _ in clientes]
+        for cliente_id, producto_id, precio in triples:
+            # Un precio de un producto de otra ciudad no tiene columna en la matriz
+            if producto_id in columnas:
+                precios[filas[cliente_id]][columnas[producto_id]] = precio
+
+    return {"productos": productos, "clientes": clientes, "precios": precios}
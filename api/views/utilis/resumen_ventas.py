@@ -0,0 +1,220 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import pytz
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, Max, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from api.models import (
+    ProductoVenta,
+    ProductoVentaResumenDiario,
+    Venta,
+    VentaResumenDiario,
+)
+
+# Los dias del resumen son dias en horario de Mexico, igual que los filtros de fecha (ver filter_by_date)
+mexico_tz = pytz.timezone("America/Mexico_City")
+
+CAMPOS_LLAVE = ["CIUDAD_REGISTRO", "TIPO_VENTA", "TIPO_PAGO", "STATUS", "VENDEDOR"]
+
+
+def fecha_resumen(fecha):
+    return timezone.localtime(fecha, mexico_tz).date()
+
+
+def _llave_resumen(venta, status):
+    return {
+        "CIUDAD_REGISTRO": venta.CIUDAD_REGISTRO,
+        "FECHA": fecha_resumen(venta.FECHA),
+        "TIPO_VENTA": venta.TIPO_VENTA,
+        "TIPO_PAGO": venta.TIPO_PAGO,
+        "STATUS": status,
+        "VENDEDOR": venta.VENDEDOR,
+    }
+
+
+def _sumar_resumen(llave, monto, numero_ventas, productos_venta, signo):
+    resumen, _ = VentaResumenDiario.objects.get_or_create(**llave)
+
+    # Los incrementos se hacen en la base de datos para que dos ventas simultaneas no se pisen
+    VentaResumenDiario.objects.filter(pk=resumen.pk).update(
+        MONTO=F("MONTO") + signo * monto,
+        NUMERO_VENTAS=F("NUMERO_VENTAS") + signo * numero_ventas,
+    )
+
+    # Las filas de productos se identifican por PRODUCTO, NOMBRE_PRODUCTO solo es la etiqueta (un producto renombrado sigue en su fila)
+    # Los productos eliminados (PRODUCTO en null) se agrupan por nombre
+    cantidades = defaultdict(float)
+    nombres = {}
+    sin_producto = defaultdict(float)
+    for producto_venta in productos_venta:
+        if producto_venta.PRODUCTO_id is None:
+            sin_producto[producto_venta.NOMBRE_PRODUCTO] += producto_venta.CANTIDAD_VENTA
+            continue
+        cantidades[producto_venta.PRODUCTO_id] += producto_venta.CANTIDAD_VENTA
+        nombres.setdefault(producto_venta.PRODUCTO_id, producto_venta.NOMBRE_PRODUCTO)
+
+    if cantidades:
+        ProductoVentaResumenDiario.objects.bulk_create(
+            [
+                ProductoVentaResumenDiario(
+                    RESUMEN=resumen,
+                    PRODUCTO_id=producto_id,
+                    NOMBRE_PRODUCTO=nombres[producto_id],
+                )
+                for producto_id in cantidades
+            ],
+            ignore_conflicts=True,
+        )
+
+        # Un solo UPDATE para todos los productos de la venta
+        ProductoVentaResumenDiario.objects.filter(
+            RESUMEN=resumen, PRODUCTO_id__in=list(cantidades)
+        ).update(
+            CANTIDAD=F("CANTIDAD")
+            + Case(
+                *[
+                    When(PRODUCTO_id=producto_id, then=Value(signo * cantidad))
+                    for producto_id, cantidad in cantidades.items()
+                ],
+                default=Value(0.0),
+                output_field=FloatField(),
+            )
+        )
+
+    for nombre, cantidad in sin_producto.items():
+        # Solo pasa al cambiar el STATUS de una venta cuyo producto ya se elimino, la restriccion unica no cubre los PRODUCTO en null
+        actualizados = ProductoVentaResumenDiario.objects.filter(
+            RESUMEN=resumen, PRODUCTO__isnull=True, NOMBRE_PRODUCTO=nombre
+        ).update(CANTIDAD=F("CANTIDAD") + signo * cantidad)
+        if not actualizados:
+            ProductoVentaResumenDiario.objects.create(
+                RESUMEN=resumen, NOMBRE_PRODUCTO=nombre, CANTIDAD=signo * cantidad
+            )
+
+    if signo < 0:
+        # La fila se elimina cuando ya no le queda ninguna venta (con sus productos por el CASCADE)
+        VentaResumenDiario.objects.filter(pk=resumen.pk, NUMERO_VENTAS__lte=0).delete()
+
+
+def aplicar_venta_resumen(venta, productos_venta, signo=1, status=None, monto=None):
+    # signo=1 suma la venta a su fila del resumen y signo=-1 la resta. status y monto permiten restar los valores anteriores a un cambio
+    if venta.FECHA is None:
+        # Sin fecha la venta no pertenece a ningun dia (tampoco se cuenta al reconstruir)
+        return
+
+    status = status or venta.STATUS
+    monto = venta.MONTO if monto is None else monto
+
+    _sumar_resumen(_llave_resumen(venta, status), monto, 1, productos_venta, signo)
+
+
+def aplicar_ventas_resumen(ventas_productos):
+    # Varias ventas nuevas a la vez: [(venta, productos_venta), ...]. Las ventas con la misma fila del resumen se suman juntas
+    grupos = {}
+    for venta, productos_venta in ventas_productos:
+        if venta.FECHA is None:
+            continue
+
+        llave = _llave_resumen(venta, venta.STATUS)
+        grupo = grupos.setdefault(
+            tuple(llave.values()), {"llave": llave, "monto": 0, "numero": 0, "productos": []}
+        )
+        grupo["monto"] += venta.MONTO
+        grupo["numero"] += 1
+        grupo["productos"].extend(productos_venta)
+
+    for grupo in grupos.values():
+        _sumar_resumen(
+            grupo["llave"], grupo["monto"], grupo["numero"], grupo["productos"], 1
+        )
+
+
+def mover_venta_resumen(venta, productos_venta, status_anterior, monto_anterior):
+    # Cambio de STATUS (y de MONTO al cancelar): la venta sale de la fila anterior y entra a la nueva
+    if status_anterior == venta.STATUS and monto_anterior == venta.MONTO:
+        return
+
+    productos_venta = list(productos_venta)
+    aplicar_venta_resumen(
+        venta, productos_venta, -1, status=status_anterior, monto=monto_anterior
+    )
+    aplicar_venta_resumen(venta, productos_venta, 1)
+
+
+def reconstruir_resumen_ventas(desde, hasta, ciudad_registro=None):
+    # Recalcula desde cero el resumen de los dias [desde, hasta] a partir de Venta y ProductoVenta
+    inicio = mexico_tz.localize(datetime.combine(desde, datetime.min.time()))
+    fin = mexico_tz.localize(
+        datetime.combine(hasta + timedelta(days=1), datetime.min.time())
+    )
+    dia = TruncDate("FECHA", tzinfo=mexico_tz)
+
+    ventas = Venta.objects.filter(FECHA__gte=inicio, FECHA__lt=fin)
+    resumenes = VentaResumenDiario.objects.filter(FECHA__range=(desde, hasta))
+    if ciudad_registro:
+        ventas = ventas.filter(CIUDAD_REGISTRO=ciudad_registro)
+        resumenes = resumenes.filter(CIUDAD_REGISTRO=ciudad_registro)
+
+    with transaction.atomic():
+        resumenes.delete()
+
+        filas = (
+            ventas.annotate(DIA=dia)
+            .values("DIA", *CAMPOS_LLAVE)
+            .annotate(MONTO_TOTAL=Sum("MONTO"), NUMERO=Count("id"))
+            .order_by()
+        )
+        VentaResumenDiario.objects.bulk_create(
+            [
+                VentaResumenDiario(
+                    FECHA=fila["DIA"],
+                    MONTO=fila["MONTO_TOTAL"],
+                    NUMERO_VENTAS=fila["NUMERO"],
+                    **{campo: fila[campo] for campo in CAMPOS_LLAVE},
+                )
+                for fila in filas
+            ],
+            batch_size=1000,
+        )
+
+        resumen_ids = {
+            tuple(fila[1:]): fila[0]
+            for fila in resumenes.values_list("id", "FECHA", *CAMPOS_LLAVE)
+        }
+
+        campos_venta = [f"VENTA__{campo}" for campo in CAMPOS_LLAVE]
+        # Igual que _sumar_resumen: una fila por PRODUCTO, y por nombre para los productos eliminados
+        productos = (
+            ProductoVenta.objects.filter(VENTA__in=ventas)
+            .annotate(
+                DIA=TruncDate("VENTA__FECHA", tzinfo=mexico_tz),
+                NOMBRE_SIN_PRODUCTO=Case(
+                    When(PRODUCTO__isnull=True, then=F("NOMBRE_PRODUCTO")),
+                    default=Value(""),
+                ),
+            )
+            .values("DIA", *campos_venta, "PRODUCTO", "NOMBRE_SIN_PRODUCTO")
+            .annotate(
+                CANTIDAD_TOTAL=Sum("CANTIDAD_VENTA"), NOMBRE=Max("NOMBRE_PRODUCTO")
+            )
+            .order_by()
+        )
+        ProductoVentaResumenDiario.objects.bulk_create(
+            [
+                ProductoVentaResumenDiario(
+                    RESUMEN_id=resumen_ids[
+                        (fila["DIA"], *(fila[campo] for campo in campos_venta))
+                    ],
+                    PRODUCTO_id=fila["PRODUCTO"],
+                    NOMBRE_PRODUCTO=fila["NOMBRE"],
+                    CANTIDAD=fila["CANTIDAD_TOTAL"],
+                )
+                for fila in productos
+            ],
+            batch_size=1000,
+        )
+
+    return len(resumen_ids)
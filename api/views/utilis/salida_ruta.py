@@ -1,35 +1,195 @@
-from api.models import ClienteSalidaRuta, ProductoSalidaRuta, SalidaRuta,  Empleado
+from api.models import (
+    ClienteSalidaRuta,
+    MovimientoInventario,
+    Producto,
+    ProductoSalidaRuta,
+    SalidaRuta,
+    Empleado,
+)
 
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Greatest
+from django.utils.timezone import now
+
+from api.views.utilis.cache_ciudad import ETIQUETA_PRODUCTOS, invalidar_etiquetas
+from api.views.utilis.inventario import registrar_movimientos
 
 # Obtener todos los  productos de la salida ruta
 
 
-def verificar_salida_ruta_completada(salida_ruta):
-    clientes_salida_ruta = ClienteSalidaRuta.objects.filter(SALIDA_RUTA=salida_ruta)
-    productos_salida_ruta = ProductoSalidaRuta.objects.filter(SALIDA_RUTA=salida_ruta)
+def ajustar_contadores(salida_ruta_id, clientes_pendientes=0, productos_cargados=0):
+    # Las vistas llaman esto con el cambio de clientes PENDIENTE y productos CARGADO que acaban de hacer, el UPDATE con F() no pisa a otra transaccion
+    # Greatest evita que un contador desfasado baje de 0, lo que en Postgres viola el CHECK del PositiveIntegerField. recalcular_contadores lo corrige despues
+    if clientes_pendientes or productos_cargados:
+        SalidaRuta.objects.filter(pk=salida_ruta_id).update(
+            CLIENTES_PENDIENTES=Greatest(F("CLIENTES_PENDIENTES") + clientes_pendientes, 0),
+            PRODUCTOS_CARGADOS=Greatest(F("PRODUCTOS_CARGADOS") + productos_cargados, 0),
+        )
+
+
+def contadores_reales():
+    # Subqueries con los contadores calculados desde los clientes y productos de cada salida ruta
+    def contar(modelo, status):
+        return Coalesce(
+            Subquery(
+                modelo.objects.filter(SALIDA_RUTA=OuterRef("pk"), STATUS=status)
+                .order_by()
+                .values("SALIDA_RUTA")
+                .annotate(total=Count("id"))
+                .values("total")
+            ),
+            0,
+        )
+
+    return {
+        "CLIENTES_PENDIENTES": contar(ClienteSalidaRuta, "PENDIENTE"),
+        "PRODUCTOS_CARGADOS": contar(ProductoSalidaRuta, "CARGADO"),
+    }
+
 
-    # Verificar si el STATUS de todos los clientes salida ruta es VISITADO
-    all_clientes_visited = all(
-        cliente.STATUS == "VISITADO" for cliente in clientes_salida_ruta
+def recalcular_contadores(salidas_ruta):
+    # Corrige los contadores de las salidas ruta del queryset que no coinciden con sus clientes y productos. Regresa cuantas se corrigieron
+    reales = contadores_reales()
+    incorrectas = list(
+        salidas_ruta.annotate(
+            PENDIENTES_REALES=reales["CLIENTES_PENDIENTES"],
+            CARGADOS_REALES=reales["PRODUCTOS_CARGADOS"],
+        )
+        .exclude(
+            CLIENTES_PENDIENTES=F("PENDIENTES_REALES"),
+            PRODUCTOS_CARGADOS=F("CARGADOS_REALES"),
+        )
+        .values_list("id", flat=True)
     )
 
-    # Verificar si el STATUS de todos los productos salida ruta es VENDIDO
-    all_productos_sold = all(
-        producto.STATUS == "VENDIDO" for producto in productos_salida_ruta
+    SalidaRuta.objects.filter(id__in=incorrectas).update(**contadores_reales())
+
+    return len(incorrectas)
+
+
+def verificar_salida_ruta_completada(salida_ruta):
+    # Solo lee los contadores de la salida ruta en lugar de todos sus clientes y productos
+    salida_ruta.CLIENTES_PENDIENTES, salida_ruta.PRODUCTOS_CARGADOS = (
+        SalidaRuta.objects.filter(pk=salida_ruta.pk)
+        .values_list("CLIENTES_PENDIENTES", "PRODUCTOS_CARGADOS")
+        .get()
     )
-    # Si esto se cumple cambia el STATUS de salida ruta a realizado
-    if all_productos_sold and all_clientes_visited:
+
+    # Si todos los clientes fueron visitados y todos los productos vendidos cambia el STATUS de salida ruta a realizado
+    if salida_ruta.CLIENTES_PENDIENTES == 0 and salida_ruta.PRODUCTOS_CARGADOS == 0:
         salida_ruta.STATUS = "REALIZADO"
     # Si no se cumple verifica si el STATUS de salida ruta es PENDIENTE
     elif salida_ruta.STATUS == "PENDIENTE":
         # Si esto se cumple cambia el STATUS de salida ruta de PROGRESO
         salida_ruta.STATUS = "PROGRESO"
 
-    salida_ruta.save()
+    # Sin update_fields se sobreescribirian los contadores con los valores en memoria
+    salida_ruta.save(update_fields=["STATUS", "FECHA"])
+
+
+
+
+def cancelar_salidas_pendientes(salidas_ids, ciudad_registro=None):
+    # Cancela las salidas ruta PENDIENTE de salidas_ids y regresa sus productos al almacen con el mismo numero de queries sin importar
+    # cuantas salidas o productos sean: un solo UPDATE de Producto.CANTIDAD con la suma de CANTIDAD_RUTA por producto (subquery),
+    # un DELETE de sus productos, uno de sus clientes y un UPDATE de las salidas
+    # Regresa {salida_ruta_id: [{"PRODUCTO", "NOMBRE", "CANTIDAD", "CANTIDAD_RESULTANTE"}, ...]} con lo que regreso al almacen cada salida
+    # Las salidas que no existen, no estan PENDIENTE o no son de ciudad_registro (si se da) no se cancelan y no aparecen en el resultado
+    pendientes = SalidaRuta.objects.filter(id__in=salidas_ids, STATUS="PENDIENTE")
+    if ciudad_registro is not None:
+        pendientes = pendientes.filter(CIUDAD_REGISTRO=ciudad_registro)
+
+    with transaction.atomic():
+        salidas = dict(
+            pendientes.select_for_update()
+            .order_by("id")
+            .values_list("id", "CIUDAD_REGISTRO")
+        )
+        if not salidas:
+            return {}
+
+        productos_salidas = ProductoSalidaRuta.objects.filter(
+            SALIDA_RUTA_id__in=list(salidas)
+        )
+
+        # Cantidades por salida y producto para el kardex y la respuesta
+        cantidades = list(
+            productos_salidas.order_by("SALIDA_RUTA_id", "PRODUCTO_RUTA_id")
+            .values("SALIDA_RUTA_id", "PRODUCTO_RUTA_id")
+            .annotate(CANTIDAD=Sum("CANTIDAD_RUTA"))
+            .values_list("SALIDA_RUTA_id", "PRODUCTO_RUTA_id", "CANTIDAD")
+        )
+
+        # Las filas se bloquean en orden de id, igual que en mover_stock
+        productos = {
+            producto_id: [nombre, cantidad]
+            for producto_id, nombre, cantidad in Producto.objects.select_for_update()
+            .filter(id__in={producto_id for _, producto_id, _ in cantidades})
+            .order_by("id")
+            .values_list("id", "NOMBRE", "CANTIDAD")
+        }
+
+        Producto.objects.filter(id__in=list(productos)).update(
+            CANTIDAD=F("CANTIDAD")
+            + Coalesce(
+                Subquery(
+                    productos_salidas.filter(PRODUCTO_RUTA=OuterRef("pk"))
+                    .order_by()
+                    .values("PRODUCTO_RUTA")
+                    .annotate(total=Sum("CANTIDAD_RUTA"))
+                    .values("total")
+                ),
+                0.0,
+            )
+        )
+
+        # Un movimiento por salida y producto, como cuando se cancelaba una salida a la vez
+        devueltos = {salida_id: [] for salida_id in salidas}
+        movimientos = []
+        for salida_id, producto_id, cantidad in cantidades:
+            nombre, cantidad_producto = productos[producto_id]
+            productos[producto_id][1] = cantidad_producto + cantidad
+            devueltos[salida_id].append(
+                {
+                    "PRODUCTO": producto_id,
+                    "NOMBRE": nombre,
+                    "CANTIDAD": cantidad,
+                    "CANTIDAD_RESULTANTE": cantidad_producto + cantidad,
+                }
+            )
+            movimientos.append(
+                MovimientoInventario(
+                    PRODUCTO_id=producto_id,
+                    PRODUCTO_NOMBRE=nombre,
+                    CANTIDAD=cantidad,
+                    CANTIDAD_RESULTANTE=cantidad_producto + cantidad,
+                    TIPO="CANCELACION_SALIDA_RUTA",
+                    REFERENCIA=f"SALIDA_RUTA:{salida_id}",
+                    CIUDAD_REGISTRO=salidas[salida_id],
+                )
+            )
+        registrar_movimientos(movimientos)
+
+        productos_salidas.delete()
+        ClienteSalidaRuta.objects.filter(SALIDA_RUTA_id__in=list(salidas)).delete()
 
+        # Mismo efecto que marcar_modificado. FECHA tiene auto_now y update() no la cambia
+        momento = now()
+        SalidaRuta.objects.filter(id__in=list(salidas)).update(
+            STATUS="CANCELADO",
+            CLIENTES_PENDIENTES=0,
+            PRODUCTOS_CARGADOS=0,
+            FECHA=momento,
+            VERSION=F("VERSION") + 1,
+            MODIFICADO=momento,
+        )
 
+    for ciudad_registro in set(salidas.values()):
+        invalidar_etiquetas(ciudad_registro, ETIQUETA_PRODUCTOS)
 
+    return devueltos
 
 
 def getLastSalidaRutaIdValido(username):
@@ -0,0 +1,160 @@
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.cache import parse_etags
+
+from api.models import (
+    ClienteSalidaRuta,
+    PrecioCliente,
+    ProductoSalidaRuta,
+    calcular_precio_cliente,
+)
+from api.views.utilis.cache_ciudad import (
+    ETIQUETA_CLIENTES,
+    ETIQUETA_PRECIOS,
+    cache_etiquetas_activa,
+    versiones_etiquetas,
+)
+from api.views.utilis.precios import url_imagen
+
+# Paquete de sincronizacion de una salida ruta: todo lo que el dispositivo del repartidor necesita al iniciar el dia en una sola respuesta
+# Un dispositivo que ya tiene el paquete recibe un 304 sin cuerpo. El ETag sale de la VERSION de la salida ruta y de las versiones
+# de las etiquetas de cache, el paquete solo se arma cuando no coincide
+
+# Ademas de la salida ruta (sus productos y clientes cambian su VERSION) el paquete depende del precio y la imagen de los productos,
+# del telefono y la direccion de los clientes y de los precios guardados
+# No depende de ETIQUETA_PRODUCTOS: mover_stock la incrementa en cada movimiento de stock y el paquete no lleva el stock del almacen.
+# Los cambios de nombre, precio o imagen de un producto (Producto.save y la importacion del catalogo) tambien incrementan ETIQUETA_PRECIOS
+ETIQUETAS_BUNDLE = [ETIQUETA_CLIENTES, ETIQUETA_PRECIOS]
+
+
+def digest_imagen(imagen):
+    # sha256 del archivo de la imagen para que el dispositivo solo descargue las imagenes que cambiaron
+    # Se guarda en cache por nombre, tamanio y fecha de modificacion del archivo (un archivo nuevo puede reutilizar el nombre de uno borrado)
+    if not imagen:
+        return None
+
+    try:
+        tamanio = default_storage.size(imagen)
+        try:
+            modificado = default_storage.get_modified_time(imagen).timestamp()
+        except NotImplementedError:
+            modificado = None
+    except OSError:
+        return None
+
+    cache_key = f"digest_imagen:{hashlib.md5(imagen.encode()).hexdigest()}:{tamanio}:{modificado}"
+    digest = cache.get(cache_key)
+    if digest is None:
+        hash_archivo = hashlib.sha256()
+        with default_storage.open(imagen) as archivo:
+            for bloque in archivo.chunks():
+                hash_archivo.update(bloque)
+        digest = hash_archivo.hexdigest()
+        cache.set(cache_key, digest, 60 * 60 * 24)
+
+    return digest
+
+
+def armar_bundle(salida_ruta):
+    # Cuatro queries: la salida ruta (la vista), sus productos, sus clientes con direccion y los precios guardados de esos clientes
+    productos = [
+        {
+            "id": producto.id,
+            "PRODUCTO": producto.PRODUCTO_RUTA_id,
+            "NOMBRE": producto.PRODUCTO_NOMBRE,
+            "CANTIDAD_RUTA": producto.CANTIDAD_RUTA,
+            "CANTIDAD_DISPONIBLE": producto.CANTIDAD_DISPONIBLE,
+            "STATUS": producto.STATUS,
+            # Precio de los clientes sin un precio guardado para este producto
+            "PRECIO": producto.PRODUCTO_RUTA.PRECIO,
+            "IMAGEN": url_imagen(producto.PRODUCTO_RUTA.IMAGEN.name),
+            "IMAGEN_DIGEST": digest_imagen(producto.PRODUCTO_RUTA.IMAGEN.name),
+        }
+        for producto in ProductoSalidaRuta.objects.filter(SALIDA_RUTA=salida_ruta)
+        .select_related("PRODUCTO_RUTA")
+        .order_by("id")
+    ]
+
+    clientes = []
+    for cliente_salida_ruta in (
+        ClienteSalidaRuta.objects.filter(SALIDA_RUTA=salida_ruta)
+        .select_related("CLIENTE_RUTA__DIRECCION")
+        .order_by("id")
+    ):
+        cliente = cliente_salida_ruta.CLIENTE_RUTA
+        direccion = cliente.DIRECCION if cliente else None
+        clientes.append(
+            {
+                "id": cliente_salida_ruta.id,
+                "CLIENTE": cliente_salida_ruta.CLIENTE_RUTA_id,
+                "NOMBRE": cliente_salida_ruta.CLIENTE_NOMBRE,
+                "STATUS": cliente_salida_ruta.STATUS,
+                "TIPO_PAGO": cliente.TIPO_PAGO if cliente else None,
+                "TELEFONO": cliente.TELEFONO if cliente else None,
+                "DIRECCION": {
+                    campo: getattr(direccion, campo)
+                    for campo in ["CALLE", "NUMERO", "COLONIA", "CIUDAD", "MUNICIPIO", "CP"]
+                }
+                if direccion
+                else None,
+            }
+        )
+
+    # Igual que precios-matriz: solo los precios guardados, el resto de los pares cliente producto usa el PRECIO del producto
+    precios = [
+        [cliente_id, producto_id, calcular_precio_cliente(precio, descuento, publico)]
+        for cliente_id, producto_id, precio, descuento, publico in (
+            PrecioCliente.objects.filter(
+                CLIENTE_id__in=[cliente["CLIENTE"] for cliente in clientes],
+                PRODUCTO_id__in=[producto["PRODUCTO"] for producto in productos],
+            )
+            .order_by("CLIENTE_id", "PRODUCTO_id")
+            .values_list(
+                "CLIENTE_id", "PRODUCTO_id", "PRECIO", "DESCUENTO", "PRODUCTO__PRECIO"
+            )
+        )
+    ]
+
+    return {
+        "salida_ruta": {
+            "id": salida_ruta.id,
+            "FOLIO": salida_ruta.FOLIO,
+            "STATUS": salida_ruta.STATUS,
+            "RUTA_NOMBRE": salida_ruta.RUTA_NOMBRE,
+            "REPARTIDOR_NOMBRE": salida_ruta.REPARTIDOR_NOMBRE,
+            "ATIENDE": salida_ruta.ATIENDE,
+            "OBSERVACIONES": salida_ruta.OBSERVACIONES,
+            "FECHA": salida_ruta.FECHA,
+        },
+        "productos": productos,
+        "clientes": clientes,
+        "precios": precios,
+    }
+
+
+def etag_version_bundle(salida_ruta):
+    # Sin queries ademas de la salida ruta. Sin una cache compartida las versiones no son confiables y regresa None
+    if not cache_etiquetas_activa():
+        return None
+
+    versiones = versiones_etiquetas(ETIQUETAS_BUNDLE, salida_ruta.CIUDAD_REGISTRO)
+    partes = [salida_ruta.id, salida_ruta.VERSION, salida_ruta.MODIFICADO.timestamp(), *versiones]
+    return '"' + hashlib.sha256("|".join(map(str, partes)).encode()).hexdigest() + '"'
+
+
+def etag_bundle(bundle):
+    # Hash del contenido, solo cuando no hay etag_version_bundle
+    contenido = json.dumps(bundle, cls=DjangoJSONEncoder, sort_keys=True)
+    return '"' + hashlib.sha256(contenido.encode()).hexdigest() + '"'
+
+
+def etag_coincide(request, etag):
+    # Comparacion debil: GZipMiddleware convierte el ETag en W/"..." cuando comprime la respuesta
+    etags = parse_etags(request.headers.get("If-None-Match", ""))
+    return "*" in etags or etag in [
+        valor[2:] if valor.startswith("W/") else valor for valor in etags
+    ]
@@ -0,0 +1,134 @@
+import threading
+import time
+from bisect import bisect_left
+
+from api.models import Cliente
+from api.views.utilis.busqueda import normalizar
+from api.views.utilis.cache_ciudad import (
+    ETIQUETA_CLIENTES,
+    cache_etiquetas_activa,
+    versiones_etiquetas,
+)
+from api.views.utilis.precios import formato_precio_cliente_venta, precios_completos
+
+# Indice en memoria (por proceso) de los nombres de los clientes de cada ciudad para las sugerencias mientras se escribe
+# Cada indice guarda la version de la etiqueta de clientes con la que se construyo. Las señales de Cliente incrementan la version
+# (ver signals.py) y el siguiente request de cualquier proceso reconstruye el indice de esa ciudad con un solo query
+_indices = {}
+_candado = threading.Lock()
+
+# Sin una cache compartida la version solo cambia con los clientes modificados en este proceso. Los cambios hechos en otros procesos
+# se ven cuando el indice cumple estos segundos y se reconstruye
+TIEMPO_INDICE_LOCAL = 30
+
+
+def _construir_indice(ciudad_registro, version):
+    clientes = {}
+    nombres = []
+    palabras = []
+
+    filas = Cliente.objects.filter(CIUDAD_REGISTRO=ciudad_registro).values_list(
+        "id", "NOMBRE", "TIPO_PAGO"
+    )
+    for cliente_id, nombre, tipo_pago in filas:
+        clientes[cliente_id] = (nombre, tipo_pago)
+        texto = normalizar(nombre)
+        nombres.append((texto, cliente_id))
+
+        # "maria lopez" tambien se encuentra con "lop": una clave desde cada palabra despues de la primera
+        inicio = texto.find(" ")
+        while inicio != -1:
+            palabras.append((texto[inicio + 1 :], cliente_id))
+            inicio = texto.find(" ", inicio + 1)
+
+    nombres.sort()
+    palabras.sort()
+
+    return {
+        "version": version,
+        "construido": time.monotonic(),
+        "clientes": clientes,
+        "nombres": nombres,
+        "palabras": palabras,
+    }
+
+
+def _vigente(indice, version):
+    if indice is None or indice["version"] != version:
+        return False
+
+    return (
+        cache_etiquetas_activa()
+        or time.monotonic() - indice["construido"] < TIEMPO_INDICE_LOCAL
+    )
+
+
+def obtener_indice(ciudad_registro):
+    (version,) = versiones_etiquetas([ETIQUETA_CLIENTES], ciudad_registro)
+
+    indice = _indices.get(ciudad_registro)
+    if _vigente(indice, version):
+        return indice
+
+    with _candado:
+        # Otro hilo pudo haberlo reconstruido mientras se esperaba el candado
+        indice = _indices.get(ciudad_registro)
+        if not _vigente(indice, version):
+            indice = _construir_indice(ciudad_registro, version)
+            _indices[ciudad_registro] = indice
+
+    return indice
+
+
+def _agregar_coincidencias(claves, prefijo, limite, encontrados):
+    posicion = bisect_left(claves, (prefijo,))
+    while (
+        len(encontrados) < limite
+        and posicion < len(claves)
+        and claves[posicion][0].startswith(prefijo)
+    ):
+        cliente_id = claves[posicion][1]
+        if cliente_id not in encontrados:
+            encontrados.append(cliente_id)
+        posicion += 1
+
+
+def buscar_ids(indice, texto, limite):
+    # Primero los clientes cuyo nombre empieza con el texto y despues los que tienen una palabra que empieza con el texto
+    # Cada grupo en orden alfabetico
+    prefijo = normalizar(texto)
+    encontrados = []
+    if not prefijo:
+        return encontrados
+
+    _agregar_coincidencias(indice["nombres"], prefijo, limite, encontrados)
+    _agregar_coincidencias(indice["palabras"], prefijo, limite, encontrados)
+
+    return encontrados
+
+
+def id_mostrador(indice):
+    mostrador = normalizar("MOSTRADOR")
+    posicion = bisect_left(indice["nombres"], (mostrador,))
+    if posicion < len(indice["nombres"]) and indice["nombres"][posicion][0] == mostrador:
+        return indice["nombres"][posicion][1]
+
+    return None
+
+
+def clientes_con_precios(indice, clientes_ids, ciudad_registro):
+    # Mismo formato que ClienteVentaSerializer. Los productos de la ciudad (con su cantidad actual) y los precios guardados en dos queries
+    precios = precios_completos(clientes_ids, ciudad_registro)
+
+    return [
+        {
+            "id": cliente_id,
+            "precios_cliente": [
+                formato_precio_cliente_venta(fila) for fila in precios[cliente_id]
+            ],
+            "NOMBRE": indice["clientes"][cliente_id][0],
+            "CIUDAD_REGISTRO": ciudad_registro,
+            "TIPO_PAGO": indice["clientes"][cliente_id][1],
+        }
+        for cliente_id in clientes_ids
+    ]
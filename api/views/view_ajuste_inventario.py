@@ -8,10 +8,12 @@ from api.serializers import (
     AjusteInventarioSerializer,
     AjusteInventarioReporteSerializer,
 )
-from django.db.models import Q
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 
 from api.views.utilis.general import obtener_ciudad_registro, filter_by_date
+from api.views.utilis.paginacion import paginar_queryset
+from api.views.utilis.exportar import FORMATOS_EXPORTACION, respuesta_exportacion
+from api.views.utilis.inventario import StockInsuficiente, mover_stock
+from api.views.utilis.busqueda import CampoBusquedaInvalido, filtro_busqueda
 
 
 # I need to add pagination and filtering to this view
@@ -22,13 +24,13 @@ def ajuste_inventario_list(request):
     fechainicio = request.GET.get("fechainicio", "")
     fechafinal = request.GET.get("fechafinal", "")
     ordenar_por = request.GET.get("ordenarpor", "")
-    page = request.GET.get("page", "")
 
     ciudad_registro = obtener_ciudad_registro(request)
 
-    filters = Q()
-    if filtrar_por and buscar:
-        filters = Q(**{f"{filtrar_por.upper()}__icontains": buscar})
+    try:
+        filters = filtro_busqueda("AjusteInventario", filtrar_por, buscar)
+    except CampoBusquedaInvalido as error:
+        return Response({"message": str(error)}, status=status.HTTP_400_BAD_REQUEST)
 
     queryset = AjusteInventario.objects.select_related("PRODUCTO").filter(
         filters, CIUDAD_REGISTRO=ciudad_registro
@@ -47,23 +49,13 @@ def ajuste_inventario_list(request):
     queryset = queryset.order_by(ordering_dict.get(ordenar_por, "-id"))
 
     # Pagination
-    paginator = Paginator(queryset, 10)
-
-    try:
-        ajuste_inventario = paginator.page(page)
-    except PageNotAnInteger:
-        page = 1
-        ajuste_inventario = paginator.page(page)
-    except EmptyPage:
-        page = paginator.num_pages
-        ajuste_inventario = paginator.page(page)
+    ajuste_inventario, paginacion = paginar_queryset(request, queryset, 10)
 
     serializer = AjusteInventarioSerializer(ajuste_inventario, many=True)
 
     response_data = {
         "ajustes_inventario": serializer.data,
-        "page": page,
-        "pages": paginator.num_pages,
+        **paginacion,
     }
 
     return Response(response_data, status=status.HTTP_200_OK)
@@ -74,9 +66,8 @@ def ajuste_inventario_list(request):
 def crear_ajuste_inventario(request):
     data = request.data
 
-    try:
-        producto = Producto.objects.get(id=data.get("PRODUCTO"))
-    except Producto.DoesNotExist:
+    producto_id = data.get("PRODUCTO")
+    if not Producto.objects.filter(id=producto_id).exists():
         return Response(
             {"message": "Producto con el id dado no existe"},
             status=status.HTTP_404_NOT_FOUND,
@@ -84,12 +75,23 @@ def crear_ajuste_inventario(request):
 
     serializer = AjusteInventarioSerializer(data=data)
     if serializer.is_valid():
-        # Validacion de suficiente cantidad en inventario
         tipo_ajuste = data.get("TIPO_AJUSTE")
-        cantidad = data.get("CANTIDAD")
+        cantidad = serializer.validated_data["CANTIDAD"]
+
+        delta = 0
+        if tipo_ajuste == "FALTANTE":
+            delta = -cantidad
+
+        elif tipo_ajuste in ["SOBRANTE", "PRODUCCION"]:
+            delta = cantidad
+
+        ajuste = serializer.save()
 
-        # Validación para asegurar que producto.CANTIDAD no se vuelva negativo
-        if tipo_ajuste == "FALTANTE" and producto.CANTIDAD < cantidad:
+        # Validación para asegurar que producto.CANTIDAD no se vuelva negativo (en la misma sentencia que el ajuste)
+        try:
+            mover_stock({producto_id: delta}, "AJUSTE", f"AJUSTE_INVENTARIO:{ajuste.id}")
+        except StockInsuficiente:
+            transaction.set_rollback(True)
             return Response(
                 {
                     "message": "No hay suficiente cantidad en el inventario para este ajuste."
@@ -97,16 +99,6 @@ def crear_ajuste_inventario(request):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        serializer.save()
-
-        if tipo_ajuste == "FALTANTE":
-            producto.CANTIDAD -= cantidad
-
-        elif tipo_ajuste in ["SOBRANTE", "PRODUCCION"]:
-            producto.CANTIDAD += cantidad
-
-        producto.save()
-
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     print(serializer.errors)
@@ -126,9 +118,10 @@ def ajuste_inventario_reporte_list(request):
 
     # const url = `/ajuste-inventarios?filtrarpor=${filtrarPor}&buscar=${buscar}&ordenarpor=${ordenarPor}&fechainicio=${fechaInicio}&fechafinal=${fechaFinal}`;
 
-    filters = Q()
-    if filtrar_por and buscar:
-        filters = Q(**{f"{filtrar_por.upper()}__icontains": buscar})
+    try:
+        filters = filtro_busqueda("AjusteInventario", filtrar_por, buscar)
+    except CampoBusquedaInvalido as error:
+        return Response({"message": str(error)}, status=status.HTTP_400_BAD_REQUEST)
 
     queryset = AjusteInventario.objects.only(
         "id",
@@ -152,6 +145,16 @@ def ajuste_inventario_reporte_list(request):
     }
     queryset = queryset.order_by(ordering_dict.get(ordenar_por, "-id"))
 
+    # Para rangos grandes el reporte se puede descargar en streaming (?formato=csv o ?formato=ndjson)
+    formato = request.GET.get("formato", "")
+    if formato in FORMATOS_EXPORTACION:
+        return respuesta_exportacion(
+            queryset,
+            AjusteInventarioReporteSerializer.Meta.fields,
+            formato,
+            "ajustes_inventario",
+        )
+
     # Serialize the queryset
     serializer = AjusteInventarioReporteSerializer(queryset, many=True)
     response_data = serializer.data
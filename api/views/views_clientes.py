@@ -26,11 +26,35 @@ from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.core.cache import cache
 
 # Changes
-from django.db.models import Q
 from django.db import transaction
 from django.db.models import Prefetch
 
 from api.views.utilis.general import obtener_ciudad_registro, obtener_nombre_con_sufijo
+from api.views.utilis.cache_ciudad import (
+    ETIQUETA_CLIENTES,
+    ETIQUETA_PRECIOS,
+    ETIQUETA_RUTAS,
+    cache_por_ciudad,
+)
+from api.views.utilis.precios import (
+    guardar_precios_cliente,
+    matriz_precios,
+    precios_completos,
+)
+from api.views.utilis.busqueda import CampoBusquedaInvalido, filtro_busqueda
+from api.views.utilis.condicional import get_condicional, por_etiquetas
+from api.views.utilis.importar_clientes import (
+    FORMATOS_CLIENTES,
+    ArchivoClientesInvalido,
+    importar_clientes as importar_filas_clientes,
+    leer_clientes,
+)
+from api.views.utilis.sugerencias_clientes import (
+    buscar_ids,
+    clientes_con_precios,
+    id_mostrador,
+    obtener_indice,
+)
 
 
 @api_view(["GET"])
@@ -44,16 +68,16 @@ def cliente_list(request):
     # if cached_data:
     #     return Response(cached_data, status=status.HTTP_200_OK)
 
-    # Construct a Q object for filtering
-    q_objects = Q()
     ciudad_registro = obtener_ciudad_registro(request)
 
     # Filtrar usando clientefiltrarpor y clientebuscar
-    filtrar_por = request.GET.get("clientefiltrarpor", "").upper()
+    filtrar_por = request.GET.get("clientefiltrarpor", "")
     buscar = request.GET.get("clientebuscar", "")
 
-    if filtrar_por and buscar:
-        q_objects = Q(**{f"{filtrar_por}__icontains": buscar})
+    try:
+        q_objects = filtro_busqueda("Cliente", filtrar_por, buscar)
+    except CampoBusquedaInvalido as error:
+        return Response({"message": str(error)}, status=status.HTTP_400_BAD_REQUEST)
 
     # prefetch_related with a reverse relation like precios_cliente makes sense if you expect to access the related PrecioCliente objects when dealing with a Cliente object. Doing so will fetch the related PrecioCliente objects in a single query, reducing the number of database hits when you loop through Cliente objects later on.
 
@@ -62,14 +86,11 @@ def cliente_list(request):
     # select_related: one to one field and foreign key relationships
     # prefetch_related: many to many fields and reverse relationships
 
-    precios_cliente_prefetch = Prefetch(
-        "precios_cliente", queryset=PrecioCliente.objects.select_related("PRODUCTO")
-    )
-
+    # Los precios no se prefetchean: solo los distintos al publico estan guardados y se completan para la pagina con precios_completos
     queryset = (
         Cliente.objects.filter(q_objects, CIUDAD_REGISTRO=ciudad_registro)
         .select_related("DIRECCION")
-        .prefetch_related("RUTAS", precios_cliente_prefetch)
+        .prefetch_related("RUTAS")
     )
 
     # Ordenar usando clienteordenarpor
@@ -104,7 +125,10 @@ def cliente_list(request):
         page = paginator.num_pages
         clientes = paginator.page(page)
 
-    serializer = ClienteSerializer(clientes, many=True)
+    precios = precios_completos([cliente.id for cliente in clientes], ciudad_registro)
+    serializer = ClienteSerializer(
+        clientes, many=True, context={"precios_cliente": precios}
+    )
 
     # response_data = {
     #     "clientes": serializer.data,
@@ -148,10 +172,6 @@ def cliente_venta_lista(request):
     # if cached_data:
     #     return Response(cached_data, status=status.HTTP_200_OK)
 
-    precios_cliente_prefetch = Prefetch(
-        "precios_cliente", queryset=PrecioCliente.objects.select_related("PRODUCTO")
-    )
-
     if nombre:
         # Use .only() to limit the fields fetched from the Cliente model.
 
@@ -159,29 +179,29 @@ def cliente_venta_lista(request):
             Cliente.objects.filter(
                 NOMBRE__icontains=nombre, CIUDAD_REGISTRO=ciudad_registro
             )
-            .only("id", "NOMBRE")
-            .order_by("NOMBRE")
-            .prefetch_related(precios_cliente_prefetch)[:5]
+            .only("id", "NOMBRE", "CIUDAD_REGISTRO", "TIPO_PAGO")
+            .order_by("NOMBRE")[:5]
         )
         if not queryset.exists():
             queryset = (
                 Cliente.objects.filter(
                     NOMBRE="MOSTRADOR", CIUDAD_REGISTRO=ciudad_registro
                 )
-                .only("id", "NOMBRE")
-                .prefetch_related(precios_cliente_prefetch)
+                .only("id", "NOMBRE", "CIUDAD_REGISTRO", "TIPO_PAGO")
             )
     else:
-        queryset = (
-            Cliente.objects.filter(NOMBRE="MOSTRADOR", CIUDAD_REGISTRO=ciudad_registro)
-            .only("id", "NOMBRE")
-            .prefetch_related(precios_cliente_prefetch)
-        )
+        queryset = Cliente.objects.filter(
+            NOMBRE="MOSTRADOR", CIUDAD_REGISTRO=ciudad_registro
+        ).only("id", "NOMBRE", "CIUDAD_REGISTRO", "TIPO_PAGO")
 
     # Serialize data manually. This is necessary in order to obtain precios_cliente. Even though I don't understand why.
     # After you've obtained the queryset, iterate through the instances to call the ClienteVentaSerializer.
     # serialized_data = [ClienteVentaSerializer(instance).data for instance in queryset]
-    serialized_data = ClienteVentaSerializer(queryset, many=True).data
+    clientes = list(queryset)
+    precios = precios_completos([cliente.id for cliente in clientes], ciudad_registro)
+    serialized_data = ClienteVentaSerializer(
+        clientes, many=True, context={"precios_cliente": precios}
+    ).data
 
     # Cache for 5 minutes
     # cache.set(cache_key, serialized_data, 60 * 15)
@@ -194,6 +214,56 @@ def cliente_venta_lista(request):
     return Response(serialized_data, status=status.HTTP_200_OK)
 
 
+# Sugerencias mientras se escribe en la pantalla de venta. Los nombres se buscan en un indice en memoria por ciudad
+# (ver api/views/utilis/sugerencias_clientes.py) y solo los precios de los clientes encontrados se consultan en la base de datos
+@api_view(["GET"])
+def cliente_venta_sugerencias(request):
+    nombre = request.GET.get("nombre", "")
+    ciudad_registro = obtener_ciudad_registro(request)
+
+    try:
+        limite = min(max(int(request.GET.get("limite", 5)), 1), 20)
+    except ValueError:
+        limite = 5
+
+    indice = obtener_indice(ciudad_registro)
+    clientes_ids = buscar_ids(indice, nombre, limite)
+
+    # Igual que cliente_venta_lista: sin coincidencias se regresa el cliente MOSTRADOR
+    if not clientes_ids:
+        mostrador = id_mostrador(indice)
+        clientes_ids = [mostrador] if mostrador is not None else []
+
+    return Response(
+        clientes_con_precios(indice, clientes_ids, ciudad_registro),
+        status=status.HTTP_200_OK,
+    )
+
+
+# Todos los precios de la ciudad en un solo payload para los dispositivos de ruta y las terminales de venta
+# Los productos y los clientes aparecen una sola vez y los precios como triples [cliente_id, producto_id, precio] (?forma=densa para una matriz)
+# Cambios de productos, clientes o precios incrementan la etiqueta de precios
+@api_view(["GET"])
+@cache_por_ciudad(ETIQUETA_PRECIOS)
+def precios_matriz(request):
+    ciudad_registro = obtener_ciudad_registro(request)
+    forma = request.GET.get("forma", "triples")
+
+    if forma not in ["triples", "densa"]:
+        return Response(
+            {"message": "forma debe ser triples o densa"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    return Response(
+        {
+            "forma": forma,
+            **matriz_precios(ciudad_registro, densa=forma == "densa"),
+        },
+        status=status.HTTP_200_OK,
+    )
+
+
 @api_view(["POST"])
 @transaction.atomic  # Ensures atomic transaction
 def crear_cliente(request):
@@ -209,19 +279,18 @@ def crear_cliente(request):
         cliente = serializer.save()
 
         # 2. Create PrecioCliente
-        precios_cliente = data["preciosCliente"]
-
-        # Create instances but don't save them yet
-        precio_cliente_instances = [
-            PrecioCliente(
-                CLIENTE=cliente,
-                PRODUCTO_id=precio_cliente["precioClienteId"],
-                PRECIO=precio_cliente["nuevoPrecioCliente"],
-            )
-            for precio_cliente in precios_cliente
-        ]
-
-        PrecioCliente.objects.bulk_create(precio_cliente_instances)
+        # Solo se guardan los precios distintos al publico, basta con enviar esos (precioClienteId es el id del producto)
+        # Cada precio se guarda como descuento relativo al precio publico (nuevoDescuento opcional, 0.1 = 10%)
+        guardar_precios_cliente(
+            cliente,
+            {
+                int(precio_cliente["precioClienteId"]): (
+                    precio_cliente.get("nuevoPrecioCliente"),
+                    precio_cliente.get("nuevoDescuento"),
+                )
+                for precio_cliente in data.get("preciosCliente", [])
+            },
+        )
 
         # 3. Create Direccion
         direccion = data["direccion"]
@@ -241,18 +310,69 @@ def crear_cliente(request):
 
     except Exception as e:
         # Any exception will cause a rollback
+        transaction.set_rollback(True)
         return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 
+# Alta de muchos clientes a la vez (ver api/views/utilis/importar_clientes.py)
+# Recibe un archivo CSV, JSON o NDJSON en "archivo" o un JSON {"clientes": [...]} con el formato de crear_cliente
+# Si alguna fila tiene errores no se guarda ningun cliente. Sin transaction.atomic: cada bloque de clientes se guarda en su propia transaccion
+@api_view(["POST"])
+def importar_clientes(request):
+    ciudad_registro = obtener_ciudad_registro(request)
+
+    archivo = request.FILES.get("archivo")
+    if archivo:
+        formato = request.data.get("formato") or archivo.name.rsplit(".", 1)[-1].lower()
+        if formato not in FORMATOS_CLIENTES:
+            return Response(
+                {"message": f"Formato no soportado, usa {', '.join(FORMATOS_CLIENTES)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            filas = leer_clientes(archivo.read().decode("utf-8"), formato)
+        except UnicodeDecodeError:
+            return Response(
+                {"message": "El archivo debe estar en UTF-8"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        except ArchivoClientesInvalido as error:
+            return Response({"message": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+    else:
+        filas = request.data.get("clientes")
+        if not isinstance(filas, list) or not all(
+            isinstance(fila, dict) for fila in filas
+        ):
+            return Response(
+                {"message": "clientes debe ser una lista de clientes"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+    resultado = importar_filas_clientes(filas, ciudad_registro)
+
+    if resultado["errores"]:
+        return Response(resultado, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response(resultado, status=status.HTTP_201_CREATED)
+
+
+def _ciudad_cliente(request, pk):
+    # Las etiquetas del cliente son las de su ciudad, no las del usuario que lo consulta
+    return Cliente.objects.filter(pk=pk).values_list("CIUDAD_REGISTRO", flat=True).first()
+
+
 @api_view(["GET"])
+@get_condicional(
+    # Datos del cliente y su direccion, sus precios y los dias de ruta en los que esta
+    por_etiquetas(
+        ETIQUETA_CLIENTES, ETIQUETA_PRECIOS, ETIQUETA_RUTAS, ciudad=_ciudad_cliente
+    )
+)
 def cliente_detail(request, pk):
     try:
-        precios_cliente_prefetch = Prefetch(
-            "precios_cliente", queryset=PrecioCliente.objects.select_related("PRODUCTO")
-        )
         cliente = (
             Cliente.objects.select_related("DIRECCION")
-            .prefetch_related("RUTAS", precios_cliente_prefetch)
+            .prefetch_related("RUTAS")
             .get(pk=pk)
         )
     except Cliente.DoesNotExist:
@@ -288,26 +408,60 @@ def modificar_cliente(request, pk):
             # 2. Modificar el precio de los clientes
             nuevos_precios_cliente = data["nuevosPreciosCliente"]
 
-            precio_cliente_ids = [
-                precio["precioClienteId"] for precio in nuevos_precios_cliente
-            ]
+            # Los precios al publico no estan guardados (id null), esos se identifican con productoId
+            # Los precios guardados se siguen aceptando con precioClienteId
+            productos_por_precio = dict(
+                PrecioCliente.objects.filter(
+                    CLIENTE=cliente,
+                    id__in=[
+                        precio["precioClienteId"]
+                        for precio in nuevos_precios_cliente
+                        if precio.get("precioClienteId")
+                    ],
+                ).values_list("id", "PRODUCTO_id")
+            )
 
-            precio_map = {
-                precio["precioClienteId"]: precio["nuevoPrecioCliente"]
-                for precio in nuevos_precios_cliente
-            }
+            capturados = {}
+            sin_producto = []
+            for indice, precio in enumerate(nuevos_precios_cliente):
+                if precio.get("productoId"):
+                    producto_id = int(precio["productoId"])
+                elif precio.get("precioClienteId"):
+                    producto_id = productos_por_precio.get(int(precio["precioClienteId"]))
+                else:
+                    producto_id = None
+
+                if producto_id is None:
+                    sin_producto.append(
+                        f"El precio {indice} no tiene productoId ni un precioClienteId de este cliente"
+                    )
+                    continue
+
+                capturados[producto_id] = (
+                    precio.get("nuevoPrecioCliente"),
+                    precio.get("nuevoDescuento"),
+                )
 
-            precio_cliente_instances = PrecioCliente.objects.filter(
-                id__in=precio_cliente_ids
-            )
-            # Updating Instances in Memory:
-            for instance in precio_cliente_instances:
-                instance.PRECIO = precio_map[instance.id]
+            # Igual que importar_clientes: si algun precio no corresponde a un producto no se guarda nada
+            if sin_producto:
+                transaction.set_rollback(True)
+                return Response(
+                    {
+                        "message": "Algunos precios no corresponden a ningun producto",
+                        "nuevosPreciosCliente": sin_producto,
+                    },
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
 
-            # Updating Instances in data base:
-            PrecioCliente.objects.bulk_update(
-                precio_cliente_instances, ["PRECIO"]
-            )  # This is much more efficient than calling save() on each individual instance.
+            # El precio capturado se guarda como descuento relativo al precio publico (nuevoDescuento opcional, 0.1 = 10%)
+            # Un precio igual al publico borra el precio guardado
+            try:
+                guardar_precios_cliente(cliente, capturados)
+            except (TypeError, ValueError) as error:
+                transaction.set_rollback(True)
+                return Response(
+                    {"message": str(error)}, status=status.HTTP_400_BAD_REQUEST
+                )
 
             # 3. Update Address
             nueva_direccion = data["nuevaDireccion"]
@@ -337,6 +491,7 @@ def modificar_cliente(request, pk):
 
 # Esta vista permite seleccionar las ruta dia cuando se registra un cliente
 @api_view(["GET"])
+@cache_por_ciudad(ETIQUETA_RUTAS)
 def rutas_registrar_cliente(request):
 
     ciudad_registro = obtener_ciudad_registro(request)
@@ -361,6 +516,8 @@ def clientes_ruta(request, pk):
 
 # Rutas
 @api_view(["GET"])
+@get_condicional(por_etiquetas(ETIQUETA_RUTAS))
+@cache_por_ciudad(ETIQUETA_RUTAS)
 def ruta_list(request):
 
     ciudad_registro = obtener_ciudad_registro(request)
@@ -500,6 +657,7 @@ def modificar_ruta_dia(request, pk):
 
 # I have to change this view. Instead of sending clients with a list of ruta_dia_ids I should send a ruta dia with a list of clientes (maybe only the cliente id or maybe the cliente and NOMBRE)
 @api_view(["GET"])
+@cache_por_ciudad(ETIQUETA_CLIENTES)
 def clientes_salida_ruta_list(request):
 
     ciudad_registro = obtener_ciudad_registro(request)
@@ -517,6 +675,7 @@ def clientes_salida_ruta_list(request):
 
 # Esto se usa al momento de generar una salida ruta
 @api_view(["GET"])
+@cache_por_ciudad(ETIQUETA_RUTAS)
 def ruta_salida_ruta_list(request):
 
     ciudad_registro = obtener_ciudad_registro(request)
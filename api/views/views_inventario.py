@@ -0,0 +1,85 @@
+from rest_framework.decorators import api_view
+from rest_framework.response import Response
+from rest_framework import status
+from datetime import datetime, timedelta
+from django.utils.dateparse import parse_date
+import pytz
+
+from api.models import MovimientoInventario, Producto
+from api.serializers import MovimientoInventarioSerializer
+
+from api.views.utilis.general import obtener_ciudad_registro, filter_by_date
+from api.views.utilis.paginacion import paginar_queryset
+from api.views.utilis.inventario import anotar_stock_a_fecha, stock_anotado
+
+
+# Kardex: movimientos de inventario de la ciudad, opcionalmente de un solo producto o de un solo tipo
+@api_view(["GET"])
+def movimiento_inventario_list(request):
+    producto = request.GET.get("producto", "")
+    tipo = request.GET.get("tipo", "")
+    fechainicio = request.GET.get("fechainicio", "")
+    fechafinal = request.GET.get("fechafinal", "")
+
+    ciudad_registro = obtener_ciudad_registro(request)
+
+    queryset = MovimientoInventario.objects.filter(CIUDAD_REGISTRO=ciudad_registro)
+
+    if producto:
+        queryset = queryset.filter(PRODUCTO=producto)
+    if tipo:
+        queryset = queryset.filter(TIPO=tipo.upper())
+
+    queryset = filter_by_date(queryset, fechainicio, fechafinal)
+
+    queryset = queryset.order_by("-id")
+
+    movimientos, paginacion = paginar_queryset(request, queryset, 10)
+
+    serializer = MovimientoInventarioSerializer(movimientos, many=True)
+
+    response_data = {
+        "movimientos": serializer.data,
+        **paginacion,
+    }
+
+    return Response(response_data, status=status.HTTP_200_OK)
+
+
+# Cantidad de cada producto al final del dia dado (horario de Mexico)
+@api_view(["GET"])
+def inventario_a_fecha(request):
+    fecha = parse_date(request.GET.get("fecha", ""))
+    producto = request.GET.get("producto", "")
+
+    if fecha is None:
+        return Response(
+            {"message": "La fecha es requerida con el formato YYYY-MM-DD"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    mexico_tz = pytz.timezone("America/Mexico_City")
+    limite = mexico_tz.localize(
+        datetime.combine(fecha + timedelta(days=1), datetime.min.time())
+    ) - timedelta(microseconds=1)
+
+    ciudad_registro = obtener_ciudad_registro(request)
+
+    productos = Producto.objects.filter(CIUDAD_REGISTRO=ciudad_registro).only(
+        "id", "NOMBRE"
+    )
+    if producto:
+        productos = productos.filter(id=producto)
+
+    productos = anotar_stock_a_fecha(productos, limite).order_by("NOMBRE")
+
+    response_data = [
+        {
+            "id": producto.id,
+            "NOMBRE": producto.NOMBRE,
+            "CANTIDAD": stock_anotado(producto),
+        }
+        for producto in productos
+    ]
+
+    return Response(response_data, status=status.HTTP_200_OK)
@@ -0,0 +1,22 @@
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden, HttpResponseNotFound
+from django.views.decorators.http import require_GET
+
+from api.metricas import texto_prometheus
+
+
+# Vista de Django sin api_view: Prometheus manda su propio token, no un JWT de empleado
+@require_GET
+def metricas(request):
+    if not settings.METRICAS_TOKEN:
+        return HttpResponseNotFound()
+
+    autorizacion = request.headers.get("Authorization", "")
+    if not hmac.compare_digest(autorizacion, f"Bearer {settings.METRICAS_TOKEN}"):
+        return HttpResponseForbidden()
+
+    return HttpResponse(
+        texto_prometheus(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
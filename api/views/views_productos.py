@@ -5,16 +5,27 @@ from django.db import transaction
 
 from api.models import (
     Producto,
-    Cliente,
-    PrecioCliente,
 )
 from api.serializers import (
     ProductoSerializer,
 )
 from api.views.utilis.general import obtener_ciudad_registro
+from api.views.utilis.catalogo import (
+    CAMPOS_CATALOGO,
+    FORMATOS_CATALOGO,
+    CatalogoInvalido,
+    importar_catalogo,
+    leer_catalogo,
+)
+from api.views.utilis.exportar import FORMATOS_EXPORTACION, respuesta_exportacion
+from api.views.utilis.cache_ciudad import ETIQUETA_PRODUCTOS, cache_por_ciudad
+from api.views.utilis.condicional import get_condicional, por_etiquetas
+from api.views.utilis.inventario import registrar_movimiento_producto
 
 
 @api_view(["GET"])
+@get_condicional(por_etiquetas(ETIQUETA_PRODUCTOS))
+@cache_por_ciudad(ETIQUETA_PRODUCTOS)
 def producto_list(request):
 
     ciudad_registro = obtener_ciudad_registro(request)
@@ -40,34 +51,76 @@ def crear_producto(request):
     if serializer.is_valid():
         producto = serializer.save()
 
-        # 2. Crear un precio cliente para cada cliente existente usando el precio del producto
-
-        # Retrieving only the IDs of Cliente using .only("id") is generally efficient because it minimizes the amount of data loaded from the database. However, if you're interested solely in the IDs and not the Cliente model instances, fetching the IDs as a list using .values_list('id', flat=True) would be even more efficient. This is because .values_list() retrieves just the specified fields directly, without constructing model instances, which can save memory when dealing with a large number of objects.
-        # clientes = Cliente.objects.only("id")
-        cliente_ids = Cliente.objects.filter(
-            CIUDAD_REGISTRO=ciudad_registro
-        ).values_list("id", flat=True)
-
-        # Crear una lista de objetos PrecioCliente para insertar en lote
-        precios_clientes_instances = [
-            PrecioCliente(
-                # CLIENTE_id=cliente.id,
-                CLIENTE_id=cliente_id,
-                PRODUCTO=producto,
-                PRECIO=producto.PRECIO,
-                # CLIENTE=cliente, PRODUCTO=producto, PRECIO=producto.PRECIO
-            )
-            # for cliente in clientes
-            for cliente_id in cliente_ids
-        ]
+        # Cantidad inicial en el kardex
+        registrar_movimiento_producto(producto, producto.CANTIDAD, "ALTA")
 
-        PrecioCliente.objects.bulk_create(precios_clientes_instances)
+        # No se crean precios para los clientes: sin un precio guardado el cliente paga el precio publico (ver precios_completos)
 
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+# Catalogo de productos de la ciudad para editarlo e importarlo con importar-catalogo-productos/ (?formato=csv o ?formato=ndjson)
+@api_view(["GET"])
+def catalogo_productos(request):
+    ciudad_registro = obtener_ciudad_registro(request)
+
+    queryset = Producto.objects.filter(CIUDAD_REGISTRO=ciudad_registro).order_by("id")
+
+    formato = request.GET.get("formato", "")
+    if formato in FORMATOS_EXPORTACION:
+        return respuesta_exportacion(
+            queryset, CAMPOS_CATALOGO, formato, "catalogo_productos"
+        )
+
+    return Response(list(queryset.values(*CAMPOS_CATALOGO)))
+
+
+# Alta y actualizacion de muchos productos a la vez (ver api/views/utilis/catalogo.py)
+# Recibe un archivo CSV, JSON o NDJSON en "archivo" o un JSON {"productos": [...]}
+# Sin transaction.atomic: cada bloque de productos se guarda en su propia transaccion
+@api_view(["POST"])
+def importar_catalogo_productos(request):
+    ciudad_registro = obtener_ciudad_registro(request)
+
+    archivo = request.FILES.get("archivo")
+    if archivo:
+        formato = request.data.get("formato") or archivo.name.rsplit(".", 1)[-1].lower()
+        if formato not in FORMATOS_CATALOGO:
+            return Response(
+                {"message": f"Formato no soportado, usa {', '.join(FORMATOS_CATALOGO)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            filas = leer_catalogo(archivo.read().decode("utf-8"), formato)
+        except UnicodeDecodeError:
+            return Response(
+                {"message": "El archivo debe estar en UTF-8"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        except CatalogoInvalido as error:
+            return Response({"message": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+    else:
+        filas = request.data.get("productos")
+        if not isinstance(filas, list) or not all(
+            isinstance(fila, dict) for fila in filas
+        ):
+            return Response(
+                {"message": "productos debe ser una lista de productos"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+    resultado = importar_catalogo(filas, ciudad_registro)
+
+    if resultado["errores"] and not (
+        resultado["creados"] or resultado["actualizados"] or resultado["sin_cambios"]
+    ):
+        return Response(resultado, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response(resultado, status=status.HTTP_200_OK)
+
+
 @api_view(["GET"])
 def producto_detail(request, pk):
     try:
@@ -86,24 +139,31 @@ def producto_detail(request, pk):
 @transaction.atomic
 def modificar_producto(request, pk):
     try:
-        producto = Producto.objects.get(pk=pk)
+        # Bloqueo de la fila para que la diferencia de cantidad que va al kardex sea correcta
+        producto = Producto.objects.select_for_update().get(pk=pk)
     except Producto.DoesNotExist:
         return Response(status=status.HTTP_404_NOT_FOUND)
 
     if request.method == "PUT":
         data = request.data.copy()  # Create a mutable copy of QueryDict
         precio = data.get("PRECIO")
-        producto_id = data.get("productoId")
         del data["PRECIO"]
 
+        cantidad_antes = producto.CANTIDAD
+
         serializer = ProductoSerializer(producto, data=data, partial=True)
         if serializer.is_valid():
             serializer.save()
 
-            # Aqui es donde voy a actualizar el precio de los clientes
+            if producto.CANTIDAD != cantidad_antes:
+                registrar_movimiento_producto(
+                    producto, producto.CANTIDAD - cantidad_antes, "EDICION"
+                )
+
+            # Los precios de los clientes con DESCUENTO se calculan desde el precio publico, basta con guardar el producto
+            # Los precios fijos (sin DESCUENTO) no cambian
             if data.get("update_price"):
                 producto.PRECIO = precio
-                actualizar_producto_precio(precio, producto_id)
                 producto.save()
             return Response(serializer.data)
         print(serializer.errors)
@@ -115,10 +175,3 @@ def modificar_producto(request, pk):
             {"message": "El producto fuel eliminado exitosamente"},
             status=status.HTTP_204_NO_CONTENT,
         )
-
-
-def actualizar_producto_precio(precio, producto_id):
-    # Update price for all clients in the database
-    # Correction, update price for clients from the same CIUDAD_REGISTRO than product
-    # I don't need to modify the code because this product_id only exist for clients from that CIUDAD_REGISTRO
-    PrecioCliente.objects.filter(PRODUCTO__id=producto_id).update(PRECIO=precio)
@@ -1,11 +1,10 @@
 from rest_framework.response import Response
 from rest_framework.decorators import api_view
 from rest_framework import status
-from django.db import transaction  # Import the transaction module
+from django.db import IntegrityError, transaction  # Import the transaction module
 from django.db.models import Prefetch
-from django.db.models import Q
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.utils import timezone
+from django.views.decorators.gzip import gzip_page
 
 from api.models import (
     Venta,
@@ -29,12 +28,41 @@ from api.serializers import (
     SalidaRutaSerializerLigero,
 )
 from api.views.utilis.salida_ruta import (
+    ajustar_contadores,
+    cancelar_salidas_pendientes,
     verificar_salida_ruta_completada,
 )
 from django.db.models import Case, When, Value, IntegerField
 
 from api.views.utilis.general import obtener_ciudad_registro, filter_by_date
+from api.views.utilis.paginacion import paginar_queryset
+from api.views.utilis.exportar import FORMATOS_EXPORTACION, respuesta_exportacion
+from api.views.utilis.resumen_ventas import (
+    aplicar_venta_resumen,
+    aplicar_ventas_resumen,
+)
+from api.views.utilis.precios import precios_por_cliente
+from api.views.utilis.inventario import StockInsuficiente, mover_stock
+from api.views.utilis.folios import (
+    errores_folios_enviados,
+    formatear_folio,
+    reservar_bloque_folios,
+    siguiente_folio,
+)
+from api.views.utilis.busqueda import (
+    CampoBusquedaInvalido,
+    filtro_busqueda,
+    indexar,
+)
+from api.views.utilis.sincronizacion import (
+    armar_bundle,
+    etag_bundle,
+    etag_coincide,
+    etag_version_bundle,
+)
+from api.views.utilis.condicional import get_condicional, marcar_modificado, por_version
 
+from collections import defaultdict
 from datetime import datetime
 
 
@@ -45,14 +73,14 @@ def salida_ruta_list(request):
     fechainicio = request.GET.get("fechainicio", "")
     fechafinal = request.GET.get("fechafinal", "")
     ordenar_por = request.GET.get("ordenarpor", "")
-    page = request.GET.get("page", "")
     role = request.GET.get("role", "")
 
     ciudad_registro = ciudad_registro = obtener_ciudad_registro(request)
 
-    filters = Q()
-    if filtrar_por and buscar:
-        filters = Q(**{f"{filtrar_por.upper()}__icontains": buscar})
+    try:
+        filters = filtro_busqueda("SalidaRuta", filtrar_por, buscar)
+    except CampoBusquedaInvalido as error:
+        return Response({"message": str(error)}, status=status.HTTP_400_BAD_REQUEST)
 
     productos_salida_ruta_prefetch = Prefetch(
         "productos", queryset=ProductoSalidaRuta.objects.select_related("PRODUCTO_RUTA")
@@ -82,23 +110,13 @@ def salida_ruta_list(request):
     queryset = queryset.order_by(ordering_dict.get(ordenar_por, "-id"))
 
     # Pagination
-    paginator = Paginator(queryset, 10)
-
-    try:
-        salida_rutas = paginator.page(page)
-    except PageNotAnInteger:
-        page = 1
-        salida_rutas = paginator.page(page)
-    except EmptyPage:
-        page = paginator.num_pages
-        salida_rutas = paginator.page(page)
+    salida_rutas, paginacion = paginar_queryset(request, queryset, 10)
 
     serializer = SalidaRutaSerializerLigero(salida_rutas, many=True)
 
     response_data = {
         "salida_rutas": serializer.data,
-        "page": page,
-        "pages": paginator.num_pages,
+        **paginacion,
     }
 
     return Response(response_data, status=status.HTTP_200_OK)
@@ -115,9 +133,10 @@ def salida_ruta_reporte_list(request):
 
     ciudad_registro = ciudad_registro = obtener_ciudad_registro(request)
 
-    filters = Q()
-    if filtrar_por and buscar:
-        filters = Q(**{f"{filtrar_por.upper()}__icontains": buscar})
+    try:
+        filters = filtro_busqueda("SalidaRuta", filtrar_por, buscar)
+    except CampoBusquedaInvalido as error:
+        return Response({"message": str(error)}, status=status.HTTP_400_BAD_REQUEST)
 
     queryset = SalidaRuta.objects.only(
         "id",
@@ -142,12 +161,20 @@ def salida_ruta_reporte_list(request):
     }
     queryset = queryset.order_by(ordering_dict.get(ordenar_por, "-id"))
 
+    # Para rangos grandes el reporte se puede descargar en streaming (?formato=csv o ?formato=ndjson)
+    formato = request.GET.get("formato", "")
+    if formato in FORMATOS_EXPORTACION:
+        return respuesta_exportacion(
+            queryset, SalidaRutaReporteSerializer.Meta.fields, formato, "salidas_ruta"
+        )
+
     serializer = SalidaRutaReporteSerializer(queryset, many=True)
 
     return Response(serializer.data, status=status.HTTP_200_OK)
 
 
 @api_view(["GET"])
+@get_condicional(por_version(SalidaRuta))
 def salida_ruta_detail(request, pk):
     try:
         productos_salida_ruta_prefetch = Prefetch(
@@ -180,7 +207,9 @@ def salida_ruta_venta(request, pk):
 
         clientes_salida_ruta_prefetch = Prefetch(
             "clientes",
-            queryset=ClienteSalidaRuta.objects.select_related("CLIENTE_RUTA"),
+            queryset=ClienteSalidaRuta.objects.select_related(
+                "CLIENTE_RUTA__DIRECCION"
+            ),
         )
         salida_ruta = (
             SalidaRuta.objects.select_related("RUTA", "REPARTIDOR")
@@ -192,12 +221,51 @@ def salida_ruta_venta(request, pk):
     except SalidaRuta.DoesNotExist:
         return Response(status=status.HTTP_404_NOT_FOUND)
 
-    serializer = SalidaRutaSerializer(salida_ruta)
+    # Precios de todos los clientes de la salida ruta en un solo query en lugar de uno por cliente
+    precios = precios_por_cliente(
+        [cliente.CLIENTE_RUTA_id for cliente in salida_ruta.clientes.all()]
+    )
+
+    serializer = SalidaRutaSerializer(
+        salida_ruta, context={"precios_por_cliente": precios}
+    )
 
     return Response(serializer.data)
 
 
+# Paquete de sincronizacion para el dispositivo del repartidor al iniciar el dia (ver api/views/utilis/sincronizacion.py)
+# Productos con el digest de su imagen, clientes con direccion y precios en una respuesta comprimida con gzip
+# Con If-None-Match y el ETag del paquete anterior regresa 304 si nada cambio, sin armar el paquete
+@gzip_page
+@api_view(["GET"])
+def salida_ruta_bundle(request, pk):
+    try:
+        salida_ruta = SalidaRuta.objects.get(
+            pk=pk, CIUDAD_REGISTRO=obtener_ciudad_registro(request)
+        )
+    except SalidaRuta.DoesNotExist:
+        return Response(status=status.HTTP_404_NOT_FOUND)
+
+    etag = etag_version_bundle(salida_ruta)
+    bundle = None
+    if etag is None:
+        bundle = armar_bundle(salida_ruta)
+        etag = etag_bundle(bundle)
+
+    # El dispositivo guarda el paquete pero siempre debe revalidarlo con el ETag
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if etag_coincide(request, etag):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    if bundle is None:
+        bundle = armar_bundle(salida_ruta)
+
+    return Response(bundle, headers=headers)
+
+
 @api_view(["GET"])
+@get_condicional(por_version(SalidaRuta))
 def salida_ruta_resumen(request, pk):
     try:
         productos_salida_ruta_prefetch = Prefetch(
@@ -248,29 +316,53 @@ def cancelar_salida_ruta(request, pk):
             status=status.HTTP_404_NOT_FOUND,
         )
 
-    # Cancel the SalidaRuta instance
-    salida_ruta.STATUS = "CANCELADO"
-    salida_ruta.save()
+    # Regresa los productos al almacen y elimina los ProductoSalidaRuta y ClienteSalidaRuta (ver cancelar_salidas_pendientes)
+    devueltos = cancelar_salidas_pendientes([salida_ruta.id])
 
-    # Retrieve associated ProductSalidaRutaand ClienteSalidaRuta instances
-    productos_salida = list(salida_ruta.productos.all())
-    clientes_salida = list(salida_ruta.clientes.all())
+    return Response(
+        {
+            "message": "La salida ruta ha sido cancelada y los productos y clientes asociados han sido eliminados de la salida ruta",
+            "productos": devueltos.get(salida_ruta.id, []),
+        },
+        status=status.HTTP_200_OK,
+    )
 
-    # Update stock for each Producto
-    productos_to_update = []
-    for producto_salida in productos_salida:
-        producto = producto_salida.PRODUCTO_RUTA
-        producto.CANTIDAD += producto_salida.CANTIDAD_RUTA
-        productos_to_update.append(producto)
 
-    # Bulk update Productos and delete ProductoSalidaRuta and ClienteSalidaRuta instances
-    Producto.objects.bulk_update(productos_to_update, ["CANTIDAD"])
-    ProductoSalidaRuta.objects.filter(id__in=[p.id for p in productos_salida]).delete()
-    ClienteSalidaRuta.objects.filter(id__in=[c.id for c in clientes_salida]).delete()
+# Cancelacion de varias salidas ruta en una sola llamada, por ejemplo las que quedaron PENDIENTE al final del dia
+# Recibe {"salidas": [id, ...]} y regresa lo que cada salida regreso al almacen. Las que no son de la ciudad o ya no estan PENDIENTE
+# se regresan en no_canceladas
+@api_view(["PUT"])
+@transaction.atomic
+def cancelar_salidas_ruta(request):
+    salidas_ids = request.data.get("salidas")
+    try:
+        assert isinstance(salidas_ids, list) and salidas_ids
+        salidas_ids = [int(salida_id) for salida_id in salidas_ids]
+    except (AssertionError, TypeError, ValueError):
+        return Response(
+            {"message": "salidas debe ser una lista con al menos un id de salida ruta"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    devueltos = cancelar_salidas_pendientes(
+        salidas_ids, obtener_ciudad_registro(request)
+    )
+
+    if not devueltos:
+        return Response(
+            {
+                "message": "Ninguna de las salidas ruta tiene STATUS pendiente, no se cancelo ninguna"
+            },
+            status=status.HTTP_400_BAD_REQUEST,
+        )
 
     return Response(
         {
-            "message": "La salida ruta ha sido cancelada y los productos y clientes asociados han sido eliminados de la salida ruta"
+            "canceladas": [
+                {"id": salida_id, "productos": productos}
+                for salida_id, productos in devueltos.items()
+            ],
+            "no_canceladas": sorted(set(salidas_ids) - set(devueltos)),
         },
         status=status.HTTP_200_OK,
     )
@@ -289,25 +381,12 @@ def crear_salida_ruta(request):
     ciudad_registro = ciudad_registro = obtener_ciudad_registro(request)
     data["CIUDAD_REGISTRO"] = ciudad_registro
 
-    ultimo_folio = (
-        SalidaRuta.objects.filter(
-            CIUDAD_REGISTRO=ciudad_registro,
-        )
-        .order_by("-id")
-        .values_list("FOLIO", flat=True)
-        .first()
-    )
-
-    print("ULTIMO FOLIO", ultimo_folio)
-    if ultimo_folio is not None:
-        data["FOLIO"] = ultimo_folio + 1
-    else:
-        data["FOLIO"] = 1
-
     serializer = SalidaRutaSerializerSinClientes(data=data)
 
     if serializer.is_valid():
-        salida_ruta = serializer.save()
+        salida_ruta = serializer.save(
+            FOLIO=siguiente_folio(ciudad_registro, "SALIDA_RUTA")
+        )
 
         # Get data to create productos salida ruta
         salida_ruta_productos_data = data["salidaRutaProductos"]
@@ -316,7 +395,9 @@ def crear_salida_ruta(request):
             producto["productoId"] for producto in salida_ruta_productos_data
         ]
 
-        productos_to_update_instances = Producto.objects.filter(id__in=producto_ids)
+        productos_to_update_instances = Producto.objects.filter(
+            id__in=producto_ids
+        ).only("id", "NOMBRE")
 
         productos_to_create_instances = []
 
@@ -338,10 +419,22 @@ def crear_salida_ruta(request):
 
             productos_to_create_instances.append(nuevo_producto_salida_ruta)
 
-            producto.CANTIDAD -= cantidad_ruta
-
         # Update productos
-        Producto.objects.bulk_update(productos_to_update_instances, ["CANTIDAD"])
+        try:
+            mover_stock(
+                {
+                    producto.id: -producto_cantidad_map[producto.id]
+                    for producto in productos_to_update_instances
+                },
+                "SALIDA_RUTA",
+                f"SALIDA_RUTA:{salida_ruta.id}",
+            )
+        except StockInsuficiente as error:
+            transaction.set_rollback(True)
+            return Response(
+                {"message": str(error)}, status=status.HTTP_400_BAD_REQUEST
+            )
+
         # Create productos salida ruta
         ProductoSalidaRuta.objects.bulk_create(productos_to_create_instances)
 
@@ -395,6 +488,15 @@ def crear_salida_ruta(request):
 
         ClienteSalidaRuta.objects.bulk_create(clientes_to_create)
 
+        # Contadores de la salida ruta (el cliente RUTA se crea como visitado)
+        ajustar_contadores(
+            salida_ruta.id,
+            clientes_pendientes=sum(
+                cliente.STATUS == "PENDIENTE" for cliente in clientes_to_create
+            ),
+            productos_cargados=len(productos_to_create_instances),
+        )
+
         return Response(serializer.data)
 
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -416,34 +518,36 @@ def crear_venta_salida_ruta(request, pk):
     if 'FECHA' not in data:
         data['FECHA'] = timezone.now()
 
-    # Asignar folio con prefijo por TIPO_VENTA y secuencia independiente por ciudad
-    tipo_venta = data.get("TIPO_VENTA")
-    prefijo = "M-" if tipo_venta == "MOSTRADOR" else "R-"
-    ultimo_folio = (
-        Venta.objects.filter(
-            CIUDAD_REGISTRO=ciudad_registro,
-            TIPO_VENTA=tipo_venta,
-            FOLIO__startswith=prefijo,
-        )
-        .order_by("-id")
-        .values_list("FOLIO", flat=True)
-        .first()
-    )
-    try:
-        siguiente_num = (
-            int(str(ultimo_folio).split("-", 1)[1]) + 1 if ultimo_folio else 1
-        )
-    except Exception:
-        siguiente_num = 1
-    data["FOLIO"] = f"{prefijo}{siguiente_num}"
-
-    if "FECHA" not in data:
-        data["FECHA"] = timezone.now()
-
     # 1. Valida data for creating venta
     serializer = VentaSerializer(data=data)
     if serializer.is_valid():
-        venta = serializer.save()
+        # Asignar folio con prefijo por TIPO_VENTA y secuencia independiente por ciudad
+        # Los dispositivos sin conexion envian un folio que reservaron antes (ver reservar_folios)
+        tipo_venta = serializer.validated_data["TIPO_VENTA"]
+        folio = data.get("FOLIO")
+        if not folio:
+            folio = siguiente_folio(ciudad_registro, tipo_venta)
+        else:
+            folio = str(folio)
+            errores_folio = errores_folios_enviados(
+                ciudad_registro, tipo_venta, [folio], request.user
+            )
+            if errores_folio:
+                return Response(
+                    {"message": errores_folio[folio]},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+        try:
+            # Otro envio con el mismo folio pudo registrarse despues de la validacion
+            with transaction.atomic():
+                venta = serializer.save(FOLIO=folio)
+        except IntegrityError:
+            transaction.set_rollback(True)
+            return Response(
+                {"message": "El folio enviado ya fue usado por otra venta"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
         # 2. Create ProductoVenta instances
         productos_venta = data["productosVenta"]
@@ -473,10 +577,11 @@ def crear_venta_salida_ruta(request, pk):
         ]
 
         ProductoVenta.objects.bulk_create(producto_venta_instances)
+        aplicar_venta_resumen(venta, producto_venta_instances)
 
         # 3. Actualizar cliente salida ruta
-        ClienteSalidaRuta.objects.filter(
-            SALIDA_RUTA=pk, CLIENTE_RUTA=data.get("CLIENTE")
+        visitados = ClienteSalidaRuta.objects.filter(
+            SALIDA_RUTA=pk, CLIENTE_RUTA=data.get("CLIENTE"), STATUS="PENDIENTE"
         ).update(STATUS="VISITADO")
 
         # 4. Actualizar productos salida ruta
@@ -484,18 +589,24 @@ def crear_venta_salida_ruta(request, pk):
         productos_salida_ruta_instances = ProductoSalidaRuta.objects.filter(
             SALIDA_RUTA=pk, PRODUCTO_RUTA__in=productos_ids
         )
+        vendidos = 0
         for product_salida_ruta in productos_salida_ruta_instances:
             product_salida_ruta.CANTIDAD_DISPONIBLE -= producto_cantidad_venta_map[
-                product_salida_ruta.PRODUCTO_RUTA.id
+                product_salida_ruta.PRODUCTO_RUTA_id
             ]
 
             if product_salida_ruta.CANTIDAD_DISPONIBLE == 0:
+                if product_salida_ruta.STATUS == "CARGADO":
+                    vendidos += 1
                 product_salida_ruta.STATUS = "VENDIDO"
 
         ProductoSalidaRuta.objects.bulk_update(
             productos_salida_ruta_instances, ["CANTIDAD_DISPONIBLE", "STATUS"]
         )
 
+        ajustar_contadores(pk, -visitados, -vendidos)
+        marcar_modificado(SalidaRuta, pk)
+
         salida_ruta = SalidaRuta.objects.get(id=pk)
 
         verificar_salida_ruta_completada(salida_ruta)
@@ -505,6 +616,290 @@ def crear_venta_salida_ruta(request, pk):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+def _validar_productos_venta(productos_venta, productos):
+    # Regresa el mensaje de error de la lista productosVenta de una venta del lote o None si es valida
+    if not isinstance(productos_venta, list):
+        return "productosVenta debe ser una lista"
+
+    for producto_venta in productos_venta:
+        try:
+            producto_id = int(producto_venta["PRODUCTO_RUTA"])
+            cantidad = float(producto_venta["cantidadVenta"])
+            precio = float(producto_venta["precioVenta"])
+        except (KeyError, TypeError, ValueError):
+            return "Cada producto necesita PRODUCTO_RUTA, cantidadVenta y precioVenta"
+
+        if producto_id not in productos:
+            return f"El producto {producto_id} no existe"
+        if cantidad < 0 or precio < 0:
+            return "La cantidad y el precio no pueden ser negativos"
+
+    return None
+
+
+# Ventas capturadas sin conexion por el dispositivo del repartidor, enviadas en un solo lote: {"ventas": [venta, ...]}
+# Cada venta tiene el mismo formato que en crear_venta_salida_ruta mas CLAVE_IDEMPOTENCIA, una clave unica generada por el dispositivo
+# Las ventas cuya clave ya se registro (un reenvio despues de perder la respuesta) se regresan como duplicadas sin volver a aplicarse
+# Todo el lote se registra o, si alguna venta tiene errores, ninguna
+@api_view(["POST"])
+@transaction.atomic
+def crear_ventas_salida_ruta(request, pk):
+    ciudad_registro = obtener_ciudad_registro(request)
+    # Un cuerpo JSON que no es un objeto (por ejemplo una lista) no tiene la llave ventas
+    ventas_data = request.data.get("ventas") if isinstance(request.data, dict) else None
+
+    if not isinstance(ventas_data, list) or not ventas_data:
+        return Response(
+            {"message": "ventas debe ser una lista con al menos una venta"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    if not all(isinstance(venta_data, dict) for venta_data in ventas_data):
+        return Response(
+            {"message": "Cada venta debe ser un objeto"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    claves = [venta_data.get("CLAVE_IDEMPOTENCIA") for venta_data in ventas_data]
+    if not all(isinstance(clave, str) and clave for clave in claves):
+        return Response(
+            {"message": "Cada venta debe tener CLAVE_IDEMPOTENCIA"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    try:
+        # Dos lotes de la misma salida ruta se registran uno despues del otro
+        salida_ruta = SalidaRuta.objects.select_for_update().get(
+            pk=pk, CIUDAD_REGISTRO=ciudad_registro
+        )
+    except SalidaRuta.DoesNotExist:
+        return Response(status=status.HTTP_404_NOT_FOUND)
+
+    # Las claves solo se comparan con las ventas de esta salida ruta, otro dispositivo pudo generar la misma clave
+    registradas = {
+        clave: {"CLAVE_IDEMPOTENCIA": clave, "id": venta_id, "FOLIO": folio}
+        for clave, venta_id, folio in Venta.objects.filter(
+            SALIDA_RUTA=salida_ruta, CLAVE_IDEMPOTENCIA__in=claves
+        ).values_list("CLAVE_IDEMPOTENCIA", "id", "FOLIO")
+    }
+
+    # Una clave repetida dentro del mismo lote se registra una sola vez
+    nuevas = {}
+    for venta_data in ventas_data:
+        if venta_data["CLAVE_IDEMPOTENCIA"] not in registradas:
+            nuevas.setdefault(venta_data["CLAVE_IDEMPOTENCIA"], venta_data)
+
+    # 1. Validar todas las ventas antes de escribir
+    productos = dict(
+        Producto.objects.filter(
+            id__in=[
+                producto_venta.get("PRODUCTO_RUTA")
+                for venta_data in nuevas.values()
+                if isinstance(venta_data.get("productosVenta"), list)
+                for producto_venta in venta_data["productosVenta"]
+                if isinstance(producto_venta, dict)
+                and str(producto_venta.get("PRODUCTO_RUTA", "")).isdigit()
+            ]
+        ).values_list("id", "NOMBRE")
+    )
+
+    # Los clientes se cargan en un query en lugar de que el serializador busque el cliente de cada venta
+    clientes = Cliente.objects.only("id", "TIPO_PAGO").in_bulk(
+        [
+            venta_data["CLIENTE"]
+            for venta_data in nuevas.values()
+            if str(venta_data.get("CLIENTE", "")).isdigit()
+        ]
+    )
+
+    errores = {}
+    validadas = []
+    for clave, venta_data in nuevas.items():
+        data = {**venta_data, "CIUDAD_REGISTRO": ciudad_registro}
+        data.setdefault("FECHA", timezone.now())
+        cliente_id = data.pop("CLIENTE", None)
+
+        serializer = VentaSerializer(data=data)
+        if not serializer.is_valid():
+            errores[clave] = serializer.errors
+            continue
+
+        cliente = clientes.get(int(cliente_id)) if str(cliente_id).isdigit() else None
+        if cliente is None:
+            errores[clave] = {"CLIENTE": ["El cliente con el id dado no existe"]}
+            continue
+        serializer.validated_data["CLIENTE"] = cliente
+
+        if (
+            serializer.validated_data["TIPO_PAGO"] == "CREDITO"
+            and cliente.TIPO_PAGO != "CREDITO"
+        ):
+            errores[clave] = {
+                "message": "No puede utilizarse crédito en un usuario no habilitado para usarlo"
+            }
+            continue
+
+        error = _validar_productos_venta(venta_data.get("productosVenta"), productos)
+        if error:
+            errores[clave] = {"message": error}
+            continue
+
+        validadas.append((clave, serializer.validated_data, venta_data))
+
+    # Los folios reservados antes por el dispositivo (ver reservar_folios) se validan con dos queries por TIPO_VENTA
+    folios_enviados = defaultdict(dict)
+    claves_por_folio = defaultdict(list)
+    for clave, validated_data, venta_data in validadas:
+        if venta_data.get("FOLIO"):
+            folio = str(venta_data["FOLIO"])
+            folios_enviados[validated_data["TIPO_VENTA"]][clave] = folio
+            claves_por_folio[folio].append(clave)
+    for tipo_venta, folios in folios_enviados.items():
+        errores_folios = errores_folios_enviados(
+            ciudad_registro, tipo_venta, set(folios.values()), request.user
+        )
+        for clave, folio in folios.items():
+            if folio in errores_folios:
+                errores[clave] = {"message": errores_folios[folio]}
+    for folio, claves_folio in claves_por_folio.items():
+        for clave in claves_folio[1:]:
+            errores[clave] = {
+                "message": f"El folio {folio} se repite en el lote (CLAVE_IDEMPOTENCIA {claves_folio[0]})"
+            }
+
+    if errores:
+        return Response(
+            {
+                "message": "Ninguna venta fue registrada porque hay ventas con errores",
+                "errores": errores,
+            },
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    # 2. Folios: un bloque de la secuencia por TIPO_VENTA para todas las ventas sin folio
+    sin_folio = defaultdict(int)
+    for clave, validated_data, venta_data in validadas:
+        if not venta_data.get("FOLIO"):
+            sin_folio[validated_data["TIPO_VENTA"]] += 1
+    folios_nuevos = {
+        tipo_venta: iter(reservar_bloque_folios(ciudad_registro, tipo_venta, cantidad))
+        for tipo_venta, cantidad in sin_folio.items()
+    }
+
+    # 3. Ventas y sus productos con un bulk_create cada uno
+    ventas = []
+    for clave, validated_data, venta_data in validadas:
+        if venta_data.get("FOLIO"):
+            folio = str(venta_data["FOLIO"])
+        else:
+            folio = formatear_folio(
+                validated_data["TIPO_VENTA"],
+                next(folios_nuevos[validated_data["TIPO_VENTA"]]),
+            )
+        ventas.append(
+            Venta(
+                **{**validated_data, "FOLIO": folio, "CLAVE_IDEMPOTENCIA": clave},
+                SALIDA_RUTA=salida_ruta,
+            )
+        )
+    try:
+        # Otro envio con los mismos folios pudo registrarse despues de la validacion
+        with transaction.atomic():
+            Venta.objects.bulk_create(ventas)
+    except IntegrityError:
+        # Los lotes de una salida ruta se registran uno despues del otro, una clave repetida solo puede venir de otra escritura
+        if Venta.objects.filter(
+            SALIDA_RUTA=salida_ruta, CLAVE_IDEMPOTENCIA__in=list(nuevas)
+        ).exists():
+            message = "Ninguna venta fue registrada porque otro envio ya registro alguna de estas CLAVE_IDEMPOTENCIA, vuelve a enviar el lote"
+        else:
+            message = "Ninguna venta fue registrada porque un folio ya fue usado por otra venta"
+        transaction.set_rollback(True)
+        return Response({"message": message}, status=status.HTTP_400_BAD_REQUEST)
+    # bulk_create no dispara post_save
+    indexar(ventas, nuevas=True)
+
+    ventas_productos = []
+    cantidades_vendidas = defaultdict(float)
+    for venta, (clave, validated_data, venta_data) in zip(ventas, validadas):
+        productos_venta = [
+            ProductoVenta(
+                VENTA=venta,
+                PRODUCTO_id=int(producto_venta["PRODUCTO_RUTA"]),
+                NOMBRE_PRODUCTO=productos[int(producto_venta["PRODUCTO_RUTA"])],
+                CANTIDAD_VENTA=float(producto_venta["cantidadVenta"]),
+                PRECIO_VENTA=float(producto_venta["precioVenta"]),
+            )
+            for producto_venta in venta_data["productosVenta"]
+        ]
+        ventas_productos.append((venta, productos_venta))
+        for producto_venta in productos_venta:
+            cantidades_vendidas[producto_venta.PRODUCTO_id] += producto_venta.CANTIDAD_VENTA
+
+    ProductoVenta.objects.bulk_create(
+        [
+            producto_venta
+            for venta, productos_venta in ventas_productos
+            for producto_venta in productos_venta
+        ]
+    )
+    aplicar_ventas_resumen(ventas_productos)
+
+    # 4. Clientes visitados en un solo UPDATE
+    visitados = ClienteSalidaRuta.objects.filter(
+        SALIDA_RUTA=salida_ruta,
+        CLIENTE_RUTA__in=[venta.CLIENTE_id for venta in ventas],
+        STATUS="PENDIENTE",
+    ).update(STATUS="VISITADO")
+
+    # 5. Productos de la salida ruta: todas las cantidades vendidas en un solo bulk_update
+    productos_salida_ruta = list(
+        ProductoSalidaRuta.objects.filter(
+            SALIDA_RUTA=salida_ruta, PRODUCTO_RUTA__in=list(cantidades_vendidas)
+        )
+    )
+    vendidos = 0
+    for producto_salida_ruta in productos_salida_ruta:
+        producto_salida_ruta.CANTIDAD_DISPONIBLE -= cantidades_vendidas[
+            producto_salida_ruta.PRODUCTO_RUTA_id
+        ]
+        if producto_salida_ruta.CANTIDAD_DISPONIBLE == 0:
+            if producto_salida_ruta.STATUS == "CARGADO":
+                vendidos += 1
+            producto_salida_ruta.STATUS = "VENDIDO"
+
+    ProductoSalidaRuta.objects.bulk_update(
+        productos_salida_ruta, ["CANTIDAD_DISPONIBLE", "STATUS"]
+    )
+    ajustar_contadores(salida_ruta.id, -visitados, -vendidos)
+    if ventas:
+        marcar_modificado(SalidaRuta, salida_ruta.id)
+
+    # 6. El status de la salida ruta se revisa una vez por lote
+    verificar_salida_ruta_completada(salida_ruta)
+
+    creadas = {
+        venta.CLAVE_IDEMPOTENCIA: {
+            "CLAVE_IDEMPOTENCIA": venta.CLAVE_IDEMPOTENCIA,
+            "id": venta.id,
+            "FOLIO": venta.FOLIO,
+        }
+        for venta in ventas
+    }
+    # Cada venta que no se registro en este envio (ya existia o venia repetida) se regresa con la venta existente
+    duplicadas = []
+    for venta_data in ventas_data:
+        clave = venta_data["CLAVE_IDEMPOTENCIA"]
+        if clave in creadas and nuevas[clave] is venta_data:
+            continue
+        duplicadas.append(registradas.get(clave) or creadas[clave])
+
+    return Response(
+        {"creadas": list(creadas.values()), "duplicadas": duplicadas},
+        status=status.HTTP_201_CREATED if ventas else status.HTTP_200_OK,
+    )
+
+
 @api_view(["POST"])
 @transaction.atomic
 def devolver_producto_salida_ruta(request, pk):
@@ -529,7 +924,7 @@ def devolver_producto_salida_ruta(request, pk):
     serializer = DevolucionSalidaRutaSerializer(data=data)
 
     if serializer.is_valid():
-        serializer.save()
+        devolucion = serializer.save()
 
         # 2. Devolver producto al almacen
         producto_salida_ruta = ProductoSalidaRuta.objects.get(
@@ -538,17 +933,22 @@ def devolver_producto_salida_ruta(request, pk):
 
         producto_salida_ruta.CANTIDAD_DISPONIBLE -= data.get("CANTIDAD_DEVOLUCION")
 
-        producto = Producto.objects.get(id=data.get("PRODUCTO_DEVOLUCION"))
-
-        producto.CANTIDAD += data.get("CANTIDAD_DEVOLUCION")
-
-        producto.save()
+        mover_stock(
+            {data.get("PRODUCTO_DEVOLUCION"): data.get("CANTIDAD_DEVOLUCION")},
+            "DEVOLUCION",
+            f"DEVOLUCION:{devolucion.id}",
+        )
 
         # Revisar si con los productos devueltos ya no hay mas productos disponibles
         if producto_salida_ruta.CANTIDAD_DISPONIBLE == 0:
+            if producto_salida_ruta.STATUS == "CARGADO":
+                ajustar_contadores(
+                    producto_salida_ruta.SALIDA_RUTA_id, productos_cargados=-1
+                )
             producto_salida_ruta.STATUS = "VENDIDO"
 
         producto_salida_ruta.save()
+        marcar_modificado(SalidaRuta, salida_ruta.id)
 
         # Obtener todos los  productos de la salida ruta
 
@@ -588,6 +988,8 @@ def realizar_aviso_visita(request, pk):
     cliente_salida_ruta.STATUS = "VISITADO"
 
     cliente_salida_ruta.save()
+    ajustar_contadores(cliente_salida_ruta.SALIDA_RUTA_id, clientes_pendientes=-1)
+    marcar_modificado(SalidaRuta, cliente_salida_ruta.SALIDA_RUTA_id)
 
     verificar_salida_ruta_completada(salida_ruta)
 
@@ -604,13 +1006,13 @@ def devolucion_list(request):
     fechainicio = request.GET.get("fechainicio", "")
     fechafinal = request.GET.get("fechafinal", "")
     ordenar_por = request.GET.get("ordenarpor", "")
-    page = request.GET.get("page", "")
 
     ciudad_registro = obtener_ciudad_registro(request)
 
-    filters = Q()
-    if filtrar_por and buscar:
-        filters = Q(**{f"{filtrar_por.upper()}__icontains": buscar})
+    try:
+        filters = filtro_busqueda("DevolucionSalidaRuta", filtrar_por, buscar)
+    except CampoBusquedaInvalido as error:
+        return Response({"message": str(error)}, status=status.HTTP_400_BAD_REQUEST)
 
     queryset = DevolucionSalidaRuta.objects.select_related(
         "SALIDA_RUTA", "PRODUCTO_DEVOLUCION"
@@ -640,23 +1042,13 @@ def devolucion_list(request):
         queryset = queryset.order_by(ordering_dict.get(ordenar_por, "-id"))
 
     # Pagination
-    paginator = Paginator(queryset, 10)
-
-    try:
-        devoluciones = paginator.page(page)
-    except PageNotAnInteger:
-        page = 1
-        devoluciones = paginator.page(page)
-    except EmptyPage:
-        page = paginator.num_pages
-        devoluciones = paginator.page(page)
+    devoluciones, paginacion = paginar_queryset(request, queryset, 10)
 
     serializer = DevolucionSalidaRutaSerializer(devoluciones, many=True)
 
     response_data = {
         "devoluciones": serializer.data,
-        "page": page,
-        "pages": paginator.num_pages,
+        **paginacion,
     }
 
     return Response(response_data, status=status.HTTP_200_OK)
@@ -710,19 +1102,18 @@ def realizar_recarga_salida_ruta(request, pk):
 
     # 1. Remover producto de almacen
     try:
-        producto = Producto.objects.get(id=producto_id)
-
-        if cantidad > producto.CANTIDAD:
-            return Response(
-                {
-                    "message": "Cantidad de recarga excede la cantidad disponible en almacen"
-                },
-                status=status.HTTP_400_BAD_REQUEST,
-            )
+        movimientos = mover_stock(
+            {producto_id: -cantidad}, "RECARGA", f"SALIDA_RUTA:{pk}"
+        )
+    except StockInsuficiente:
+        return Response(
+            {
+                "message": "Cantidad de recarga excede la cantidad disponible en almacen"
+            },
+            status=status.HTTP_400_BAD_REQUEST,
+        )
 
-        producto.CANTIDAD -= cantidad
-        producto.save()
-    except Producto.DoesNotExist:
+    if not movimientos:
         return Response(
             {"message": "Producto con el id dado no existe"},
             status=status.HTTP_404_NOT_FOUND,
@@ -733,6 +1124,7 @@ def realizar_recarga_salida_ruta(request, pk):
         producto_salida_ruta = ProductoSalidaRuta.objects.get(
             SALIDA_RUTA_id=pk, PRODUCTO_RUTA_id=producto_id
         )
+        status_anterior = producto_salida_ruta.STATUS
         producto_salida_ruta.CANTIDAD_DISPONIBLE = data.get(
             "CANTIDAD_DISPONIBLE", producto_salida_ruta.CANTIDAD_DISPONIBLE
         )
@@ -741,15 +1133,28 @@ def realizar_recarga_salida_ruta(request, pk):
         )
         producto_salida_ruta.STATUS = data.get("STATUS", producto_salida_ruta.STATUS)
         producto_salida_ruta.save()
+        ajustar_contadores(
+            pk,
+            productos_cargados=(producto_salida_ruta.STATUS == "CARGADO")
+            - (status_anterior == "CARGADO"),
+        )
+        marcar_modificado(SalidaRuta, pk)
     except ProductoSalidaRuta.DoesNotExist:
         serializer = ProductoSalidaRutaSerializer(data=data)
         if serializer.is_valid():
-            serializer.save()
+            producto_salida_ruta = serializer.save()
+            if producto_salida_ruta.STATUS == "CARGADO":
+                ajustar_contadores(
+                    producto_salida_ruta.SALIDA_RUTA_id, productos_cargados=1
+                )
+            marcar_modificado(SalidaRuta, producto_salida_ruta.SALIDA_RUTA_id)
             return Response(
                 {"message": "Salida ruta creada exitosamente"},
                 status=status.HTTP_200_OK,
             )
 
+        # El producto ya se desconto del almacen
+        transaction.set_rollback(True)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     return Response(
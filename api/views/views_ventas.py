@@ -6,19 +6,30 @@ from api.models import (
     Producto,
     Venta,
     ProductoVenta,
+    VentaResumenDiario,
 )
 from api.serializers import (
     VentaReporteSerializer,
+    VentaResumenDiarioSerializer,
     VentaSerializer,
 )
 from django.db.models import Case, When, Value, IntegerField
 from django.utils.dateparse import parse_date
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from datetime import timedelta
 
 from api.views.utilis.general import obtener_ciudad_registro, filter_by_date
+from api.views.utilis.paginacion import paginar_queryset
+from api.views.utilis.exportar import FORMATOS_EXPORTACION, respuesta_exportacion
+from api.views.utilis.resumen_ventas import aplicar_venta_resumen, mover_venta_resumen
+from api.views.utilis.inventario import StockInsuficiente, mover_stock
+from api.views.utilis.folios import (
+    formatear_folio,
+    reservar_bloque_folios,
+    siguiente_folio,
+)
+from api.views.utilis.busqueda import CampoBusquedaInvalido, filtro_busqueda
+from api.views.utilis.condicional import get_condicional, marcar_modificado, por_version
 
-from django.db.models import Q
 from django.core.cache import cache
 from django.db.models import Prefetch
 from django.db import transaction
@@ -41,13 +52,13 @@ def venta_list(request):
     fechainicio = request.GET.get("fechainicio", "")
     fechafinal = request.GET.get("fechafinal", "")
     ordenar_por = request.GET.get("ordenarpor", "")
-    page = request.GET.get("page", "")
     ciudad_registro = obtener_ciudad_registro(request)
     role = request.GET.get("role", "")
     # One of the reasons I added NOMBRE_CLIENTE is to use this field as filtering
-    filters = Q()
-    if filtrar_por and buscar:
-        filters = Q(**{f"{filtrar_por.upper()}__icontains": buscar})
+    try:
+        filters = filtro_busqueda("Venta", filtrar_por, buscar)
+    except CampoBusquedaInvalido as error:
+        return Response({"message": str(error)}, status=status.HTTP_400_BAD_REQUEST)
 
     productos_venta_prefetch = Prefetch(
         "productos_venta", queryset=ProductoVenta.objects.select_related("PRODUCTO")
@@ -70,22 +81,13 @@ def venta_list(request):
     }
     queryset = queryset.order_by(ordering_dict.get(ordenar_por, "-id"))
 
-    paginator = Paginator(queryset, 10)
-    try:
-        ventas = paginator.page(page)
-    except PageNotAnInteger:
-        page = 1
-        ventas = paginator.page(page)
-    except EmptyPage:
-        page = paginator.num_pages
-        ventas = paginator.page(page)
+    ventas, paginacion = paginar_queryset(request, queryset, 10)
 
     serializer = VentaSerializer(ventas, many=True)
 
     response_data = {
         "ventas": serializer.data,
-        "page": page,
-        "pages": paginator.num_pages,
+        **paginacion,
     }
 
     # Cache the result
@@ -119,9 +121,10 @@ def venta_reporte_list(request):
 
     ciudad_registro = obtener_ciudad_registro(request)
 
-    filters = Q()
-    if filtrar_por and buscar:
-        filters = Q(**{f"{filtrar_por.upper()}__icontains": buscar})
+    try:
+        filters = filtro_busqueda("Venta", filtrar_por, buscar)
+    except CampoBusquedaInvalido as error:
+        return Response({"message": str(error)}, status=status.HTTP_400_BAD_REQUEST)
 
     queryset = Venta.objects.only(
         "id",
@@ -146,6 +149,13 @@ def venta_reporte_list(request):
     }
     queryset = queryset.order_by(ordering_dict.get(ordenar_por, "-id"))
 
+    # Para rangos grandes el reporte se puede descargar en streaming (?formato=csv o ?formato=ndjson)
+    formato = request.GET.get("formato", "")
+    if formato in FORMATOS_EXPORTACION:
+        return respuesta_exportacion(
+            queryset, VentaReporteSerializer.Meta.fields, formato, "ventas"
+        )
+
     # Serialize the queryset
     serializer = VentaReporteSerializer(queryset, many=True)
     response_data = serializer.data
@@ -161,6 +171,31 @@ def venta_reporte_list(request):
     return Response(response_data, status=status.HTTP_200_OK)
 
 
+# Resumen diario para dashboards y reportes mensuales: regresa una fila por dia, tipo de venta, tipo de pago, status y vendedor
+@api_view(["GET"])
+def venta_resumen_list(request):
+    fechainicio = parse_date(request.GET.get("fechainicio", ""))
+    fechafinal = parse_date(request.GET.get("fechafinal", ""))
+
+    ciudad_registro = obtener_ciudad_registro(request)
+
+    queryset = VentaResumenDiario.objects.filter(
+        CIUDAD_REGISTRO=ciudad_registro
+    ).prefetch_related("productos_resumen")
+
+    # Las fechas del resumen ya estan en horario de Mexico, se comparan directamente
+    if fechainicio:
+        queryset = queryset.filter(FECHA__gte=fechainicio)
+    if fechafinal:
+        queryset = queryset.filter(FECHA__lte=fechafinal)
+
+    queryset = queryset.order_by("FECHA", "id")
+
+    serializer = VentaResumenDiarioSerializer(queryset, many=True)
+
+    return Response(serializer.data, status=status.HTTP_200_OK)
+
+
 @api_view(["POST"])
 @transaction.atomic
 def crear_venta(request):
@@ -176,39 +211,22 @@ def crear_venta(request):
             "No puede utilizarse crédito en un usuario no habilitado para usarlo"
         )
 
-    # Asignar folio con prefijo por TIPO_VENTA y secuencia independiente por ciudad
-    tipo_venta = data.get("TIPO_VENTA")
-    prefijo = "M-" if tipo_venta == "MOSTRADOR" else "R-"
-    ultimo_folio = (
-        Venta.objects.filter(
-            CIUDAD_REGISTRO=ciudad_registro,
-            TIPO_VENTA=tipo_venta,
-            FOLIO__startswith=prefijo,
-        )
-        .order_by("-id")
-        .values_list("FOLIO", flat=True)
-        .first()
-    )
-    try:
-        siguiente_num = (
-            int(str(ultimo_folio).split("-", 1)[1]) + 1 if ultimo_folio else 1
-        )
-    except Exception:
-        siguiente_num = 1
-    data["FOLIO"] = f"{prefijo}{siguiente_num}"
-
     if "FECHA" not in data:
         data["FECHA"] = timezone.now()
 
     # Aqui la data va a cambiar para ventas en salida ruta, en especifico tipo_venta es ruta
     serializer = VentaSerializer(data=data)
     if serializer.is_valid():
-        venta = serializer.save()
+        # Asignar folio con prefijo por TIPO_VENTA y secuencia independiente por ciudad
+        folio = siguiente_folio(ciudad_registro, serializer.validated_data["TIPO_VENTA"])
+        venta = serializer.save(FOLIO=folio)
         productos_venta = data["productosVenta"]
         productos_ids = [
             producto_venta["productoId"] for producto_venta in productos_venta
         ]
-        producto_instances = Producto.objects.filter(id__in=productos_ids)
+        producto_instances = Producto.objects.filter(id__in=productos_ids).only(
+            "id", "NOMBRE"
+        )
         producto_cantidad_venta_map = {
             producto_venta["productoId"]: producto_venta["cantidadVenta"]
             for producto_venta in productos_venta
@@ -227,17 +245,65 @@ def crear_venta(request):
                 PRECIO_VENTA=producto_precio_venta_map[producto.id],
             )
             producto_venta_instances.append(nuevo_producto_venta)
-            # Aqui tampoco quiero descontar cantidad del producto si la venta es en salida ruta, porque el producto ya fue descontado del inventario al generar la salida ruta
-            if data["STATUS"] == "REALIZADO":
-                producto.CANTIDAD -= nuevo_producto_venta.CANTIDAD_VENTA
-        Producto.objects.bulk_update(producto_instances, ["CANTIDAD"])
+
+        # Aqui tampoco quiero descontar cantidad del producto si la venta es en salida ruta, porque el producto ya fue descontado del inventario al generar la salida ruta
+        if data["STATUS"] == "REALIZADO":
+            try:
+                mover_stock(
+                    {
+                        producto_venta.PRODUCTO_id: -producto_venta.CANTIDAD_VENTA
+                        for producto_venta in producto_venta_instances
+                    },
+                    "VENTA",
+                    f"VENTA:{venta.id}",
+                )
+            except StockInsuficiente as error:
+                transaction.set_rollback(True)
+                return Response(
+                    {"message": str(error)}, status=status.HTTP_400_BAD_REQUEST
+                )
+
         ProductoVenta.objects.bulk_create(producto_venta_instances)
+        aplicar_venta_resumen(venta, producto_venta_instances)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     print(serializer.errors)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+# Los dispositivos de ruta reservan un bloque de folios para poder registrar ventas sin conexion
+@api_view(["POST"])
+def reservar_folios(request):
+    tipo = request.data.get("TIPO", "RUTA")
+    cantidad = request.data.get("CANTIDAD", 1)
+
+    try:
+        cantidad = int(cantidad)
+    except (TypeError, ValueError):
+        cantidad = 0
+
+    if tipo not in ["MOSTRADOR", "RUTA"] or not 0 < cantidad <= 1000:
+        return Response(
+            {
+                "message": "Datos invalidos: TIPO debe ser MOSTRADOR o RUTA y CANTIDAD debe estar entre 1 y 1000"
+            },
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    ciudad_registro = obtener_ciudad_registro(request)
+
+    folios = reservar_bloque_folios(ciudad_registro, tipo, cantidad, request.user)
+
+    return Response(
+        {
+            "TIPO": tipo,
+            "folios": [formatear_folio(tipo, numero) for numero in folios],
+        },
+        status=status.HTTP_201_CREATED,
+    )
+
+
 @api_view(["GET"])
+@get_condicional(por_version(Venta))
 def venta_detail(request, pk):
     try:
         productos_venta_prefetch = Prefetch(
@@ -272,6 +338,7 @@ def modificar_venta(request, pk):
         return modificar_venta_put(request, venta)
 
     elif request.method == "DELETE":
+        aplicar_venta_resumen(venta, venta.productos_venta.all(), -1)
         venta.delete()
         return Response(
             {"message": "Product has been deleted successfully"},
@@ -288,6 +355,7 @@ def modificar_venta_put(request, venta):
         )
 
     status_actual = venta.STATUS
+    monto_actual = venta.MONTO
     status_cambios = {"ANTES": status_actual, "DESPUES": data}
 
     tipo_venta = venta.TIPO_VENTA
@@ -296,46 +364,44 @@ def modificar_venta_put(request, venta):
     if tipo_venta == "RUTA":
         venta.STATUS = data
         venta.save()
+        marcar_modificado(Venta, venta.pk)
+        mover_venta_resumen(
+            venta, venta.productos_venta.all(), status_actual, monto_actual
+        )
         reporte_cambios["STATUS"] = status_cambios
         return Response(reporte_cambios)
 
     # Obtener productos venta de la venta
     productos_venta = venta.productos_venta.all()
 
-    productos_to_update = []
-
+    # This is why i need the foreign key relationship from producto_venta to producto
+    deltas = {}
     for producto_venta in productos_venta:
-        # This is why i need the foreign key relationship from producto_venta to producto
-        producto = producto_venta.PRODUCTO
-        print(producto, data)
-        producto_cambios = {"ANTES": producto.CANTIDAD}
-
-        cantidad_venta = producto_venta.CANTIDAD_VENTA
-        producto.CANTIDAD = calcular_cantidad(
-            status_actual, data, producto.CANTIDAD, cantidad_venta
-        )
+        if producto_venta.PRODUCTO_id is None:
+            continue
+        deltas[producto_venta.PRODUCTO_id] = deltas.get(
+            producto_venta.PRODUCTO_id, 0
+        ) + calcular_cantidad(status_actual, data, 0, producto_venta.CANTIDAD_VENTA)
 
-        try:
-            assert producto.CANTIDAD >= 0
-        except AssertionError:
-            return Response(
-                {
-                    "message": "No existen productos suficientes para realizar esta operación"
-                },
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-
-        productos_to_update.append(producto)
-
-        producto_cambios["DESPUES"] = producto.CANTIDAD
-        reporte_cambios[producto.NOMBRE] = producto_cambios
+    try:
+        movimientos = mover_stock(deltas, "STATUS_VENTA", f"VENTA:{venta.id}")
+    except StockInsuficiente as error:
+        return Response({"message": str(error)}, status=status.HTTP_400_BAD_REQUEST)
 
-    Producto.objects.bulk_update(productos_to_update, ["CANTIDAD"])
+    for producto_venta in productos_venta:
+        movimiento = movimientos.get(producto_venta.PRODUCTO_id)
+        if movimiento:
+            reporte_cambios[movimiento["NOMBRE"]] = {
+                "ANTES": movimiento["ANTES"],
+                "DESPUES": movimiento["DESPUES"],
+            }
 
     venta.STATUS = data
     if data == "CANCELADO":
         venta.MONTO = 0
     venta.save()
+    marcar_modificado(Venta, venta.pk)
+    mover_venta_resumen(venta, productos_venta, status_actual, monto_actual)
 
     reporte_cambios["STATUS"] = status_cambios
     return Response(reporte_cambios)
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -51,6 +52,8 @@ SIMPLE_JWT = {
 }
 
 MIDDLEWARE = [
+    # Primero para medir el request completo (ver api/metricas.py)
+    "api.metricas.MetricasMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -85,12 +88,43 @@ WSGI_APPLICATION = "backend.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+# Ajustes de SQLite para sucursales que se quedan con un solo servidor (con SQLITE_WAL se usa el motor backend.sqlite_wal)
+# SQLITE_WAL=1 activa el modo WAL: las lecturas ya no esperan a que termine una escritura
+SQLITE_WAL = os.environ.get("SQLITE_WAL", "") == "1"
+# Milisegundos que una escritura espera el bloqueo antes de fallar con "database is locked"
+SQLITE_BUSY_TIMEOUT = int(os.environ.get("SQLITE_BUSY_TIMEOUT", "5000"))
+# OFF, NORMAL, FULL o EXTRA. Con WAL, NORMAL es seguro ante fallas de la aplicacion y evita un fsync por commit
+SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL").upper()
+
+# DB_ENGINE=postgres usa PostgreSQL con los datos de conexion DB_*. Sin DB_ENGINE se usa SQLite (desarrollo y pruebas)
+# SQLite solo permite una escritura a la vez, por lo que en produccion todas las ventas de ambas ciudades quedarian en fila
+DB_ENGINE = os.environ.get("DB_ENGINE", "sqlite")
+
+if DB_ENGINE == "postgres":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.environ.get("DB_NAME", "gran_pacifico"),
+            "USER": os.environ.get("DB_USER", "postgres"),
+            "PASSWORD": os.environ.get("DB_PASSWORD", ""),
+            "HOST": os.environ.get("DB_HOST", "localhost"),
+            "PORT": os.environ.get("DB_PORT", "5432"),
+            # Conexiones persistentes: cada worker reutiliza su conexion en lugar de abrir una por request
+            "CONN_MAX_AGE": int(os.environ.get("DB_CONN_MAX_AGE", "600")),
+            # Antes de reutilizar una conexion se verifica que siga viva (reinicio de la base de datos o timeout del servidor)
+            "CONN_HEALTH_CHECKS": True,
+            "OPTIONS": {
+                "connect_timeout": int(os.environ.get("DB_CONNECT_TIMEOUT", "5")),
+            },
+        }
+    }
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "backend.sqlite_wal" if SQLITE_WAL else "django.db.backends.sqlite3",
+            "NAME": BASE_DIR / "db.sqlite3",
+        }
     }
-}
 
 # DATABASES = {
 #     'default': {
@@ -104,6 +138,39 @@ DATABASES = {
 # }
 
 
+# Cache
+# Redis en produccion (REDIS_URL=redis://host:6379/1). Sin REDIS_URL se usa memoria local (desarrollo y pruebas)
+REDIS_URL = os.environ.get("REDIS_URL")
+
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django_redis.cache.RedisCache",
+            "LOCATION": REDIS_URL,
+            "OPTIONS": {"CLIENT_CLASS": "django_redis.client.DefaultClient"},
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "gran_pacifico",
+        }
+    }
+
+# Las vistas en cache por ciudad, los ETag por etiquetas y el indice de sugerencias de clientes dependen de las versiones de las
+# etiquetas guardadas en la cache (api/views/utilis/cache_ciudad.py). Solo son correctas si todos los procesos comparten la cache,
+# por eso sin Redis las vistas en cache y los ETag se desactivan y el indice de sugerencias se reconstruye cada 30 segundos
+# (TIEMPO_INDICE_LOCAL). CACHE_UN_PROCESO=1 las activa con memoria local cuando corre un solo proceso (runserver)
+CACHE_ETIQUETAS = bool(REDIS_URL) or os.environ.get("CACHE_UN_PROCESO") == "1"
+
+
+# Metricas por vista (api/metricas.py). Cada proceso suma sus metricas a la cache cada METRICAS_INTERVALO segundos
+# El endpoint api/metricas/ pide el encabezado "Authorization: Bearer <METRICAS_TOKEN>" y sin METRICAS_TOKEN esta deshabilitado
+METRICAS_INTERVALO = int(os.environ.get("METRICAS_INTERVALO", "15"))
+METRICAS_TOKEN = os.environ.get("METRICAS_TOKEN", "")
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
@@ -162,7 +229,7 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "api.authentication.EmpleadoJWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": ("rest_framework.permissions.IsAuthenticated",),
 }
@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+# Motor de SQLite para las sucursales que activan SQLITE_WAL (ver settings.py)
+# Cada conexion nueva queda en modo WAL con SQLITE_BUSY_TIMEOUT y SQLITE_SYNCHRONOUS, y las transacciones empiezan con BEGIN IMMEDIATE
+
+NIVELES_SYNCHRONOUS = ["OFF", "NORMAL", "FULL", "EXTRA"]
+
+# Django 4.1 abre los transaction.atomic con un BEGIN diferido: la transaccion empieza leyendo y al escribir pide el bloqueo.
+# Si otra conexion ya escribio, SQLite responde "database is locked" de inmediato sin esperar el busy_timeout.
+# Este motor cambia el BEGIN en _start_transaction_under_autocommit. Si una version de Django ya no tiene ese metodo el servidor
+# no arranca, en lugar de volver sin avisar al BEGIN diferido (desde Django 5.1 se usa OPTIONS["transaction_mode"] = "IMMEDIATE")
+if not callable(getattr(base.DatabaseWrapper, "_start_transaction_under_autocommit", None)):
+    raise ImproperlyConfigured(
+        "Esta version de Django no tiene DatabaseWrapper._start_transaction_under_autocommit, "
+        "backend.sqlite_wal debe usar OPTIONS['transaction_mode'] = 'IMMEDIATE'"
+    )
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_new_connection(self, conn_params):
+        if settings.SQLITE_SYNCHRONOUS not in NIVELES_SYNCHRONOUS:
+            raise ImproperlyConfigured(
+                f"SQLITE_SYNCHRONOUS debe ser uno de {', '.join(NIVELES_SYNCHRONOUS)}"
+            )
+
+        conexion = super().get_new_connection(conn_params)
+        # journal_mode=WAL queda guardado en el archivo, busy_timeout y synchronous son por conexion
+        conexion.execute("PRAGMA journal_mode=WAL")
+        conexion.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT)}")
+        conexion.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+        return conexion
+
+    def _start_transaction_under_autocommit(self):
+        # El bloqueo de escritura se pide al inicio y la transaccion espera su turno hasta SQLITE_BUSY_TIMEOUT
+        self.cursor().execute("BEGIN IMMEDIATE")
@@ -15,6 +15,8 @@ urlpatterns = [
     path("api/", include("api.urls.urls_usuarios")),
     path("api/", include("api.urls.urls_salida_ruta")),
     path("api/", include("api.urls.urls_ajuste_inventario")),
+    path("api/", include("api.urls.urls_inventario")),
+    path("api/", include("api.urls.urls_metricas")),
     # Login
     path("api/token/", views.MyTokenObtainPairView.as_view(), name="token_obtain_pair"),
     path("api/token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
@@ -4,11 +4,28 @@ from api.serializers import (
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rest_framework_simplejwt.views import TokenObtainPairView
 
+from api.models import Empleado
+from api.views.utilis.general import CIUDAD_REGISTRO_DEFAULT
 from api.views.utilis.salida_ruta import getLastSalidaRutaIdValido
 
 
 
 class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+
+        # La ciudad y el rol viajan en el token para detectar tokens emitidos antes de un cambio del empleado (ver EmpleadoJWTAuthentication)
+        # Los claims del refresh token se copian al access token cuando se renueva
+        try:
+            token["ciudad_registro"] = user.empleado.CIUDAD_REGISTRO
+            token["role"] = user.empleado.ROLE
+        except Empleado.DoesNotExist:
+            token["ciudad_registro"] = CIUDAD_REGISTRO_DEFAULT
+            token["role"] = None
+
+        return token
+
     def validate(self, attrs):
         # This calls the parent class's validate method, which performs the necessary checks and creates a token pair
         data = super().validate(attrs)